@@ -0,0 +1,113 @@
+"""
+Route function invocation microbenchmark for *FatihServer*
+
+Compares calling a route function with arguments found by reflection on every
+request (inspect.signature, get_type_hints and a threading.local, as the request
+handler did before invocation plans) with calling it through its InvocationPlan.
+With `--profile` the functions that dominate each variant are printed.
+
+    python -m benchmarks.invocation --number 20000 --profile
+"""
+
+import argparse
+import cProfile
+import inspect
+import pstats
+import threading
+import timeit
+from typing import get_type_hints
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.framework.invocation import InvocationPlan
+from fatihserver.server.request_handler import Request, Session
+
+RESULT = {'method': 'GET',
+          'path': '/users/42',
+          'headers': {'Host': 'localhost'},
+          'raw_body': None,
+          'body': None,
+          'query_params': None,
+          'path_params': {'user_id': 42}}
+
+
+def route(user_id, request: Request, session: Session):
+    # no response, only the invocation is measured
+    return user_id
+
+
+def reflection_call(func=route, result=RESULT):
+    """
+    Baseline: the arguments are found by inspecting the function per request
+    :return:
+    """
+    local = threading.local()
+    local.args = []
+
+    if func.__code__.co_argcount > 0:
+        params = inspect.signature(func).parameters
+        type_hints = get_type_hints(func)
+
+        for param_name, param in params.items():
+            if param_name in result['path_params']:
+                local.args.append(result['path_params'][param_name])
+                continue
+
+            param_type = type_hints.get(param_name)
+            if param_type == Request:
+                local.args.append(Request(method=result['method'],
+                                          path=result['path'],
+                                          headers=result['headers'],
+                                          raw_body=result['raw_body'],
+                                          body=result['body'],
+                                          query_params=result['query_params'],
+                                          path_params=result['path_params']))
+            elif param_type == Session:
+                local.args.append(None)
+            else:
+                local.args.append(None)
+
+    return func(*local.args)
+
+
+def plan_call(plan=InvocationPlan(route, ['user_id']), result=RESULT):
+    return plan.call(result)
+
+
+def profile(func, number):
+    """
+    Print the functions with the most (cumulative) time
+    :param func:
+    :param number:
+    :return:
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(number):
+        func()
+    profiler.disable()
+
+    pstats.Stats(profiler).sort_stats('tottime').print_stats(8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    set_log_level("WARNING")
+
+    baseline = None
+    for name, func in (("Reflection per request", reflection_call),
+                       ("Invocation plan", plan_call)):
+        best = min(timeit.repeat(func, number=args.number, repeat=5)) / args.number
+        baseline = baseline or best
+
+        print(f"{name:<25} {best * 1e6:8.2f} us/call ({baseline / best:.2f}x)")
+
+        if args.profile:
+            profile(func, args.number)
+
+
+if __name__ == "__main__":
+    main()
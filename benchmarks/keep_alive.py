@@ -0,0 +1,91 @@
+"""
+Keep-alive benchmark for *FatihServer*
+
+Sends the same GET request over a fresh TCP connection per request and over
+one persistent (keep-alive) connection, then prints requests/sec for both.
+
+    python -m benchmarks.keep_alive --backend threaded --requests 2000
+"""
+
+import argparse
+import http.client
+import threading
+import time
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+from fatihserver.server.request_handler import Response
+
+router = HttpRouter()
+
+
+@router.get("/bench/keep-alive")
+def index():
+    response = Response(status_code=200, body="Hello World")
+    response.set_content_type("text/plain")
+    return response
+
+
+def run(port, requests, keep_alive):
+    """
+    Send `requests` GET requests and return requests/sec
+    :param port:
+    :param requests:
+    :param keep_alive: reuse one connection for all requests
+    :return:
+    """
+    connection = None
+    start = time.perf_counter()
+
+    for _ in range(requests):
+        if connection is None or not keep_alive:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+
+        headers = {} if keep_alive else {"Connection": "close"}
+        connection.request("GET", "/bench/keep-alive", headers=headers)
+
+        response = connection.getresponse()
+        response.read()
+
+        if not keep_alive:
+            connection.close()
+
+    elapsed = time.perf_counter() - start
+    connection.close()
+
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="threaded", choices=HttpServer.BACKENDS)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    set_log_level("WARNING")
+
+    server = HttpServer(router=router, host="127.0.0.1", port=0, backend=args.backend,
+                        max_keep_alive_requests=args.requests + 1)
+    threading.Thread(target=server.start, daemon=True).start()
+
+    while server.server is None:
+        time.sleep(0.01)
+
+    port = server.server.server_address[1]
+
+    # warm up
+    run(port, 100, True)
+
+    closed = run(port, args.requests, keep_alive=False)
+    persistent = run(port, args.requests, keep_alive=True)
+
+    print(f"backend:                {args.backend}")
+    print(f"connection per request: {closed:10.0f} req/s")
+    print(f"keep-alive:             {persistent:10.0f} req/s ({persistent / closed:.2f}x)")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Middleware chain microbenchmark for *FatihServer*
+
+Measures calling an endpoint through 0 to 8 no-op middlewares (hook style with
+`before`/`after`, and wrap style functions) composed once into a chain, compared
+with iterating over the middleware list on every request (as a loop over the
+hooks in the request handler would). The Request is created once, so only the
+chain is measured; the overhead is printed per middleware, in nanoseconds.
+
+    python -m benchmarks.middleware --number 200000
+"""
+
+import argparse
+import timeit
+
+from fatihserver.framework.middlewares import Middleware, compose
+from fatihserver.server.request_handler import Request
+
+REQUEST = Request(method='GET', path='/users/42', headers={'Host': 'localhost'})
+
+
+class Noop(Middleware):
+    """
+    Hook style middleware that does nothing
+    """
+
+    def before(self, request):
+        return None
+
+    def after(self, request, response):
+        return response
+
+
+def noop(request, call_next):
+    return call_next(request)
+
+
+def endpoint(request):
+    return request
+
+
+def iterated(middlewares):
+    """
+    Baseline: the hooks are called in a loop per request
+    :param middlewares:
+    :return:
+    """
+    def call(request):
+        for middleware in middlewares:
+            response = middleware.before(request)
+            if response is not None:
+                return response
+
+        response = endpoint(request)
+
+        for middleware in reversed(middlewares):
+            response = middleware.after(request, response)
+
+        return response
+
+    return call
+
+
+def composed(middlewares):
+    handler, _ = compose(middlewares, endpoint, False)
+    return handler
+
+
+def measure(call, number):
+    return min(timeit.repeat(lambda: call(REQUEST), number=number, repeat=7)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    base = measure(endpoint, args.number)
+    print(f"{'middlewares':>11} {'variant':<16} {'ns/call':>9} {'ns/middleware':>14}")
+    print(f"{0:>11} {'endpoint only':<16} {base * 1e9:9.0f}")
+
+    for count in (1, 2, 4, 8):
+        for name, call in (("hooks, iterated", iterated([Noop() for _ in range(count)])),
+                           ("hooks, composed", composed([Noop() for _ in range(count)])),
+                           ("wrap, composed", composed([noop] * count))):
+            best = measure(call, args.number)
+            print(f"{count:>11} {name:<16} {best * 1e9:9.0f} {(best - base) / count * 1e9:14.0f}")
+
+
+if __name__ == "__main__":
+    main()
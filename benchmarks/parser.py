@@ -0,0 +1,68 @@
+"""
+Request parser microbenchmark for *FatihServer*
+
+Compares HttpRequestParser (decoded str, line based) with the incremental
+bytes parser, for a typical browser request (one chunk and 64 byte chunks).
+
+    python -m benchmarks.parser --number 20000
+"""
+
+import argparse
+import timeit
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.parsers.http_parser import HttpRequestParser
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser
+
+REQUEST = b"GET /blog/posts?page=2&tag=python HTTP/1.1\r\n" \
+          b"Host: www.website.com\r\n" \
+          b"User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0\r\n" \
+          b"Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8\r\n" \
+          b"Accept-Language: en-US,en;q=0.5\r\n" \
+          b"Accept-Encoding: gzip, deflate, br\r\n" \
+          b"Referer: https://www.website.com/blog\r\n" \
+          b"Connection: keep-alive\r\n" \
+          b"Cookie: session_id=4f1c2a9b; theme=dark; lang=en\r\n" \
+          b"Upgrade-Insecure-Requests: 1\r\n" \
+          b"Sec-Fetch-Dest: document\r\n" \
+          b"Sec-Fetch-Mode: navigate\r\n" \
+          b"Sec-Fetch-Site: same-origin\r\n" \
+          b"\r\n"
+
+CHUNKS = [REQUEST[i:i + 64] for i in range(0, len(REQUEST), 64)]
+
+
+def line_parser():
+    HttpRequestParser().parse(str(REQUEST, 'ascii'))
+
+
+def incremental_parser(parser=IncrementalHttpRequestParser()):
+    parser.feed(REQUEST)
+    parser.next_request()
+
+
+def incremental_parser_chunked(parser=IncrementalHttpRequestParser()):
+    for chunk in CHUNKS:
+        parser.feed(chunk)
+        parser.next_request()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    set_log_level("WARNING")
+
+    baseline = None
+    for name, func in (("HttpRequestParser (str)", line_parser),
+                       ("Incremental (one chunk)", incremental_parser),
+                       ("Incremental (64 byte chunks)", incremental_parser_chunked)):
+        best = min(timeit.repeat(func, number=args.number, repeat=5)) / args.number
+        baseline = baseline or best
+
+        print(f"{name:<30} {best * 1e6:8.2f} us/request ({baseline / best:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Pre-fork scaling benchmark for *FatihServer*
+
+Starts the app with 1, 2, 4, ... workers (up to the number of cores) and loads a
+template route and a static file route with concurrent keep-alive clients
+(one process per client), then prints requests/sec for each worker count.
+
+    python -m benchmarks.prefork --duration 5 --clients 8
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+
+from fatihserver.framework.app import App, set_log_level
+from fatihserver.framework.router import HttpRouter
+from fatihserver.framework.static_files import StaticFiles
+from fatihserver.framework.templates import Templates, TemplateResponse
+
+TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>{{ title }}</title>
+</head>
+<body>
+    {{#items}}<p>{{ name }}</p>{{/items}}
+</body>
+</html>
+"""
+
+
+def serve(port, workers, static_dir):
+    """
+    Run the app (in a child process)
+    :param port:
+    :param workers:
+    :param static_dir:
+    :return:
+    """
+    set_log_level("WARNING")
+    os.chdir(static_dir)
+
+    router = HttpRouter()
+    templates = Templates()
+    templates.add_template_as_text('index', TEMPLATE)
+
+    @router.get("/bench/template")
+    def index():
+        return TemplateResponse(templates, 'index', {'title': 'bench', 'items': [{'name': i} for i in range(50)]})
+
+    static = StaticFiles()
+    static.add_static_dir(directory="static")
+    router.add_static_route(static)
+
+    App(router=router, host="127.0.0.1", port=port, max_keep_alive_requests=10 ** 9).run(workers=workers)
+
+
+def client(port, path, duration, results):
+    """
+    Send requests over one keep-alive connection for `duration` seconds
+    :param port:
+    :param path:
+    :param duration:
+    :param results:
+    :return:
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    deadline = time.perf_counter() + duration
+    count = 0
+
+    while time.perf_counter() < deadline:
+        connection.request("GET", path)
+        connection.getresponse().read()
+        count += 1
+
+    connection.close()
+    results.put(count)
+
+
+def load(port, path, clients, duration):
+    """
+    Run `clients` client processes and return requests/sec
+    :return:
+    """
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(port, path, duration, results)) for _ in range(clients)]
+
+    for process in processes:
+        process.start()
+
+    total = sum(results.get() for _ in processes)
+
+    for process in processes:
+        process.join()
+
+    return total / duration
+
+
+def wait_for(port):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise Exception("Server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=2 * (os.cpu_count() or 1))
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    static_dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(static_dir, "static"))
+    with open(os.path.join(static_dir, "static", "app.css"), "w") as f:
+        f.write("body { color: #333; }\n" * 200)
+
+    worker_counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+
+    print(f"{'workers':>8} {'template req/s':>16} {'static req/s':>14}")
+
+    baseline = None
+    for workers in worker_counts:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        server = multiprocessing.Process(target=serve, args=(port, workers, static_dir))
+        server.start()
+        wait_for(port)
+
+        template = load(port, "/bench/template", args.clients, args.duration)
+        static = load(port, "/static/app.css", args.clients, args.duration)
+
+        os.kill(server.pid, signal.SIGTERM)
+        server.join()
+
+        if baseline is None:
+            baseline = (template, static)
+
+        print(f"{workers:>8} {template:>10.0f} ({template / baseline[0]:.1f}x) {static:>8.0f} ({static / baseline[1]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
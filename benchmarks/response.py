@@ -0,0 +1,110 @@
+"""
+Response serialization microbenchmark for *FatihServer*
+
+Compares the previous serializer (headers concatenated with `+=`, the reason
+phrase found by an if/elif chain and the body copied into the response bytes)
+with the current one (encoded status lines looked up in a table, headers joined
+once, the body passed on as a separate buffer for sendmsg()), for a small text
+response and a 1 MiB binary response.
+
+The 404 responses are compared too: a new Response per request (with a new
+Session, as HttpResult.r404() did before) and the shared canned response.
+
+    python -m benchmarks.response --number 20000
+"""
+
+import argparse
+import timeit
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.server.request_handler import Response, HttpResult, RequestHandler, Session
+
+REASONS = [(200, 'OK'), (201, 'Created'), (204, 'No Content'), (206, 'Partial Content'), (304, 'Not Modified'),
+           (404, 'Not Found'), (405, 'Method Not Allowed'), (403, 'Forbidden'), (501, 'Not Implemented'),
+           (500, 'Internal Server Error'), (400, 'Bad Request'), (503, 'Service Unavailable')]
+
+
+def previous_as_bytes(response):
+    """
+    Baseline: the serializer before the status line table
+    :param response:
+    :return:
+    """
+    body = response.body
+    body = bytes(body) if isinstance(body, (bytes, bytearray)) else bytes(f"{body}", 'utf-8')
+
+    response.headers['Content-Length'] = len(body)
+
+    headers = ""
+    for key, value in response.headers.items():
+        headers += f"{key}: {value}\r\n"
+
+    # the if/elif chain (the position of the code in it matters, 503 is near the end)
+    method_str = 'Unknown'
+    for code, reason in REASONS:
+        if response.status_code == code:
+            method_str = reason
+            break
+
+    return bytes(f"HTTP/1.1 {response.status_code} {method_str}\n"
+                 f"{headers}\r\n", 'utf-8') + body
+
+
+def response(body, status_code):
+    response = Response(status_code=status_code, body=body)
+    response.set_content_type("text/plain")
+    response.set_header("Connection", "keep-alive")
+    return response
+
+
+def fresh_404():
+    """
+    Baseline: a new response (and session) per 404
+    :return:
+    """
+    response = Response(status_code=404, body="Not Found")
+    response.set_header("Content-Type", "text/plain")
+
+    RequestHandler.keep_alive(response, True)
+    return response.as_buffers(True)
+
+
+def canned_404():
+    response = HttpResult.r404()
+
+    RequestHandler.keep_alive(response, True)
+    return response.as_buffers(True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    set_log_level("WARNING")
+
+    print(f"{'response':<18} {'previous':>12} {'current':>12}")
+
+    for name, body, status_code in (("small text, 200", "Hello, World!", 200),
+                                    ("small text, 503", "Hello, World!", 503),
+                                    ("1 MiB binary", bytes(1024 * 1024), 200)):
+        measured = response(body, status_code)
+        number = args.number if len(measured._body_as_bytes()) < 65536 else max(1, args.number // 100)
+
+        previous = min(timeit.repeat(lambda: previous_as_bytes(measured), number=number, repeat=5)) / number
+        current = min(timeit.repeat(lambda: measured.as_buffers(), number=number, repeat=5)) / number
+
+        print(f"{name:<18} {previous * 1e6:9.2f} us {current * 1e6:9.2f} us")
+
+    sessions = len(Session.STORE)
+    fresh = min(timeit.repeat(fresh_404, number=args.number, repeat=5)) / args.number
+    created = len(Session.STORE) - sessions
+
+    canned = min(timeit.repeat(canned_404, number=args.number, repeat=5)) / args.number
+
+    print(f"{'404, new/canned':<18} {fresh * 1e6:9.2f} us {canned * 1e6:9.2f} us "
+          f"({created} sessions created by the new responses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Route lookup microbenchmark for *FatihServer*
+
+Registers 10, 1k and 50k routes (half static, half with path parameters,
+`/api/v{i}/users/{id:int}/posts/{slug}`) and measures the lookup of a static
+and a parameterized path in the route tree, compared with matching the routes
+one after another (a regular expression per route).
+
+    python -m benchmarks.router --number 20000
+"""
+
+import argparse
+import re
+import timeit
+
+from fatihserver.framework.route_tree import RouteTree
+
+
+def route_paths(count):
+    """
+    Route patterns of the benchmark (the last ones are looked up, worst case of a linear scan)
+    :param count:
+    :return:
+    """
+    paths = []
+    for i in range(count // 2):
+        paths.append(f"/api/v{i}/status")
+        paths.append(f"/api/v{i}/users/{{id:int}}/posts/{{slug}}")
+
+    return paths
+
+
+def linear_matcher(paths):
+    """
+    Baseline: a compiled regular expression per route, tried in order
+    :param paths:
+    :return:
+    """
+    patterns = []
+    for path in paths:
+        regex = re.sub(r"\\\{(\w+):int\\\}", r"(?P<\1>[0-9]+)", re.escape(path))
+        regex = re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^/]+)", regex)
+        patterns.append((re.compile(regex + "$"), path))
+
+    def match(path):
+        for pattern, route in patterns:
+            found = pattern.match(path)
+            if found is not None:
+                return route, found.groupdict()
+
+        return None, None
+
+    return match
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'routes':>8} {'lookup':<12} {'route tree':>14} {'linear scan':>14}")
+
+    for count in (10, 1000, 50000):
+        paths = route_paths(count)
+
+        tree = RouteTree()
+        for path in paths:
+            tree.insert(path, path)
+
+        linear = linear_matcher(paths)
+        last = count // 2 - 1
+
+        for name, path in (("static", f"/api/v{last}/status"),
+                           ("parameters", f"/api/v{last}/users/42/posts/hello")):
+            assert tree.match(path)[0] == linear(path)[0]
+
+            tree_time = min(timeit.repeat(lambda: tree.match(path), number=args.number, repeat=5)) / args.number
+
+            # the linear scan is slow with many routes, measure fewer lookups
+            number = max(1, args.number * 10 // count)
+            linear_time = min(timeit.repeat(lambda: linear(path), number=number, repeat=3)) / number
+
+            print(f"{count:>8} {name:<12} {tree_time * 1e6:11.2f} us {linear_time * 1e6:11.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Session store benchmark for *FatihServer*
+
+Creates `--sessions` sessions (clients that come once and never return) and
+uses each of them once more, then prints the time per session, how many
+sessions are still kept and the memory they keep (tracemalloc), for:
+
+    - an unbounded dict (the `Session.ACTIVE` dict before the session stores)
+    - MemorySessionStore with a `--max-entries` cap
+    - MemorySessionStore after its idle timeout has passed and the sweeper has run
+
+    python -m benchmarks.session_store --sessions 200000 --max-entries 10000
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from fatihserver.server.session_store import MemorySessionStore
+
+
+class DictStore:
+    """
+    Sessions in an unbounded dict (baseline)
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def create(self, session_id, data=None, created_at=None):
+        entry = self.entries[session_id] = {'session_id': session_id,
+                                            'data': {} if data is None else data,
+                                            'created_at': datetime.now() if created_at is None else created_at}
+        return entry
+
+    def get(self, session_id):
+        return self.entries.get(session_id)
+
+    def sweep(self):
+        return 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Clock:
+    """
+    Clock that is moved past the idle timeout before the sweep
+    """
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fill(store, sessions, clock=None):
+    """
+    Create and use the sessions, then sweep the store.
+    :param store:
+    :param sessions: number of sessions
+    :param clock: Clock of the store (advanced past the idle timeout before the sweep)
+    :return:
+    """
+    for i in range(sessions):
+        session_id = f"{i:064x}"
+        store.create(session_id)['data']['visits'] = 1
+        store.get(session_id)
+
+    if clock is not None:
+        clock.now += 3600
+    store.sweep()
+
+
+def run(new_store, sessions):
+    """
+    Time a store, then measure the memory it keeps (tracemalloc slows the calls down).
+    :param new_store: function that returns (store, clock)
+    :param sessions: number of sessions
+    :return: (seconds per session, sessions kept, bytes kept)
+    """
+    started = time.perf_counter()
+    store, clock = new_store()
+    fill(store, sessions, clock)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    store, clock = new_store()
+    fill(store, sessions, clock)
+
+    kept = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return elapsed / sessions, len(store), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200000)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    args = parser.parse_args()
+
+    def swept():
+        clock = Clock()
+        return MemorySessionStore(idle_timeout=1800, max_entries=None, clock=clock), clock
+
+    print(f"{'store':<28} {'us/session':>10} {'sessions kept':>14} {'MB kept':>9}")
+
+    for name, new_store in (("dict (unbounded)", lambda: (DictStore(), None)),
+                            (f"memory, max {args.max_entries}",
+                             lambda: (MemorySessionStore(max_entries=args.max_entries), None)),
+                            ("memory, idle timeout swept", swept)):
+        per_session, kept_sessions, kept = run(new_store, args.sessions)
+
+        print(f"{name:<28} {per_session * 1e6:10.2f} {kept_sessions:14} {kept / 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Session allocation benchmark for *FatihServer*
+
+Sends requests through the request handler (a static file, a missing path, a
+route that does not use the session and a route that writes to it, by clients
+without a session cookie) and prints per request: the memory that is still
+allocated afterwards (tracemalloc), how many sessions were created
+(`Session.STORE`) and if the response has a `Set-Cookie` header.
+
+    python -m benchmarks.sessions --number 2000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.framework.router import HttpRouter
+from fatihserver.framework.static_files import StaticFiles
+from fatihserver.server.request_handler import RequestHandler, Response, Session, FileResponse
+
+
+def hello():
+    response = Response(status_code=200, body="Hello, World!")
+    response.set_content_type("text/plain")
+    return response
+
+
+def visit(session: Session):
+    session["visits"] = session.get("visits", 0) + 1
+    return hello()
+
+
+def parsed(path):
+    return {'method': 'GET', 'path': path, 'version': 'HTTP/1.1', 'headers': {'Host': 'localhost'},
+            'raw_body': None, 'body': None, 'query_params': None, 'keep_alive': True}
+
+
+def serve(handler, path):
+    """
+    Process a request and serialize the response (as the connection layer does)
+    :param handler:
+    :param path:
+    :return: response
+    """
+    response = handler.process(parsed(path))
+    RequestHandler.keep_alive(response, True)
+    response.as_buffers(True)
+
+    if isinstance(response, FileResponse):
+        response.close()
+
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    set_log_level("ERROR")
+
+    working_dir = os.getcwd()
+    static_dir = tempfile.mkdtemp()
+    os.chdir(static_dir)
+
+    try:
+        os.mkdir("static")
+        with open("static/site.css", "w") as f:
+            f.write("body { margin: 0; }\n" * 100)
+
+        router = HttpRouter()
+        router.add_route("GET", "/hello", hello)
+        router.add_route("GET", "/visit", visit)
+
+        static = StaticFiles()
+        static.add_static_dir(directory="static")
+        router.add_static_route(static)
+        router.serve_static_files()
+
+        handler = RequestHandler(router, compression_level=0)
+
+        print(f"{'request':<16} {'us/request':>10} {'bytes kept/request':>19} {'sessions/request':>17} {'Set-Cookie':>11}")
+
+        for name, path in (("static file", "/static/site.css"),
+                           ("missing path", "/missing"),
+                           ("route", "/hello"),
+                           ("session write", "/visit")):
+            # warm up (caches, invocation plans)
+            response = serve(handler, path)
+            set_cookie = 'Set-Cookie' in (response.headers or {})
+
+            sessions = len(Session.STORE)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+
+            for _ in range(args.number):
+                serve(handler, path)
+
+            elapsed = time.perf_counter() - started
+            kept = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            print(f"{name:<16} {elapsed / args.number * 1e6:10.1f} {kept / args.number:19.0f} "
+                  f"{(len(Session.STORE) - sessions) / args.number:17.2f} {'yes' if set_cookie else 'no':>11}")
+    finally:
+        os.chdir(working_dir)
+        shutil.rmtree(static_dir)
+
+
+if __name__ == "__main__":
+    main()
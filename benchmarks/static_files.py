@@ -0,0 +1,104 @@
+"""
+Static file benchmark for *FatihServer*
+
+Creates a static directory (`--files` files of `--size` MiB), starts the server
+and downloads every file over one keep-alive connection. Prints the memory
+usage (RSS) of the process after the static files are registered and after
+they are served, and the download throughput.
+
+    python -m benchmarks.static_files --backend threaded --files 16 --size 8
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from fatihserver.framework.app import set_log_level
+from fatihserver.framework.router import HttpRouter
+from fatihserver.framework.static_files import StaticFiles
+from fatihserver.server.http_server import HttpServer
+
+
+def rss():
+    """
+    Current resident set size of the process (MiB, Linux only)
+    :return:
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return float('nan')
+
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="threaded", choices=HttpServer.BACKENDS)
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--size", type=int, default=8, help="size of a file (MiB)")
+    args = parser.parse_args()
+
+    set_log_level("WARNING")
+
+    working_dir = os.getcwd()
+    static_dir = tempfile.mkdtemp()
+    os.chdir(static_dir)
+
+    try:
+        os.mkdir("static")
+        for i in range(args.files):
+            with open(f"static/file{i}.bin", "wb") as f:
+                f.write(os.urandom(args.size * 1024 * 1024))
+
+        before = rss()
+
+        router = HttpRouter()
+        static = StaticFiles()
+        static.add_static_dir(directory="static")
+        router.add_static_route(static)
+
+        server = HttpServer(router=router, host="127.0.0.1", port=0, backend=args.backend)
+        threading.Thread(target=server.start, daemon=True).start()
+
+        while server.server is None:
+            time.sleep(0.01)
+
+        registered = rss()
+
+        connection = http.client.HTTPConnection("127.0.0.1", server.server.server_address[1])
+        total = 0
+        start = time.perf_counter()
+
+        for i in range(args.files):
+            connection.request("GET", f"/static/file{i}.bin")
+            response = connection.getresponse()
+
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                total += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        connection.close()
+
+        print(f"backend:            {args.backend}")
+        print(f"static directory:   {args.files * args.size} MiB")
+        print(f"RSS (registered):   {registered - before:10.1f} MiB")
+        print(f"RSS (after serving): {rss() - before:9.1f} MiB")
+        print(f"throughput:         {total / elapsed / (1024 * 1024):10.1f} MiB/s")
+
+        server.stop()
+    finally:
+        os.chdir(working_dir)
+        shutil.rmtree(static_dir)
+
+
+if __name__ == "__main__":
+    main()
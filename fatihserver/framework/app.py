@@ -3,6 +3,7 @@ import sys
 import loguru
 
 from fatihserver.server.http_server import HttpServer
+from fatihserver.server.prefork import PreforkSupervisor
 
 from loguru import logger
 
@@ -25,18 +26,25 @@ class App:
         - App startup and shutdown hooks (router)
     """
 
-    def __init__(self, app_name=None, router=None, host="localhost", port=8080):
+    def __init__(self, app_name=None, router=None, host="localhost", port=8080, **server_options):
         """
         Initialize App class with app_name.
         :param app_name:
+        :param server_options: passed to HttpServer (backend, keep_alive_timeout, ...)
         """
         self.app_name = app_name
-        self.server = HttpServer(router=router, host=host, port=port)
+        self.server = HttpServer(router=router, host=host, port=port, **server_options)
 
-    def run(self):
+    def run(self, workers=1, reuse_port=False):
         """
         Run the server.
+        :param workers: number of worker processes (more than 1 enables the pre-fork mode)
+        :param reuse_port: pre-fork mode, every worker binds its own socket with SO_REUSEPORT
         :return:
         """
         logger.info("🧞‍♂️ Web app has started. Creating and launching the FatihServer...")
-        self.server.start()
+
+        if workers > 1:
+            PreforkSupervisor(self.server, workers, reuse_port=reuse_port).run()
+        else:
+            self.server.start()
@@ -0,0 +1,247 @@
+"""
+Invocation plans of route functions for *FatihServer*
+
+The parameters of a route function are inspected once, when the route is
+registered, and turned into a tuple of extractors (one per parameter). Calling
+a route function then only runs the extractors on the parsed request, there is
+no reflection (inspect.signature, get_type_hints) per request.
+
+Parameters are filled by name or by type hint:
+    - parameters of the route path (`/users/{user_id:int}`), by name
+    - `Request`: the request
+    - `Session`: the session of the request (LazySession, it is created when data is written to it)
+    - dataclasses: the body of the request (JSON object or url encoded form)
+    - int, float, str, bool, list[X], Optional[X]: the query parameter of the same name
+      (lists are comma separated: `?ids=1,2,3`)
+    - anything else (and parameters without type hints): None
+
+Invalid or missing values raise ValidationError with every error of the request
+(answered with `422 Unprocessable Content`). Parameters with a default value
+(or Optional hints) are optional.
+"""
+
+import dataclasses
+import inspect
+from typing import get_type_hints
+
+from loguru import logger
+
+from fatihserver.framework.validation import ValidationError, converter, is_optional, without_none
+from fatihserver.server.request_handler import Request, Session, LazySession
+
+
+def _request(result):
+    """
+    Request extractor
+    :param result: parsed request
+    :return:
+    """
+    return Request.from_result(result)
+
+
+def _session(result):
+    """
+    Session extractor (created when data is written to it, see LazySession)
+    :param result: parsed request
+    :return:
+    """
+    return LazySession.of_request(result)
+
+
+def _none(result):
+    return None
+
+
+def _path_parameter(name, convert=None):
+    """
+    Extractor of a path parameter (converted by the route tree)
+    :param name:
+    :param convert: converter of the type hint of the parameter
+    :return:
+    """
+    if convert is None:
+        def extract(result):
+            return result['path_params'][name]
+    else:
+        def extract(result):
+            try:
+                return convert(result['path_params'][name])
+            except ValidationError as e:
+                raise e.prefixed('path', name)
+
+    return extract
+
+
+def _query_parameter(name, convert, default):
+    """
+    Extractor of a query parameter
+    :param name:
+    :param convert: converter of the type hint of the parameter
+    :param default: value of a missing parameter (inspect.Parameter.empty if it is required)
+    :return:
+    """
+    def extract(result):
+        query_params = result['query_params']
+
+        if not query_params or name not in query_params:
+            if default is inspect.Parameter.empty:
+                raise ValidationError.single("field required", 'query', name)
+
+            return default
+
+        try:
+            return convert(query_params[name])
+        except ValidationError as e:
+            raise e.prefixed('query', name)
+
+    return extract
+
+
+def _body(convert, default):
+    """
+    Extractor of a dataclass built from the body (JSON object or url encoded form)
+    :param convert: converter of the dataclass
+    :param default: value of a missing body (inspect.Parameter.empty if it is required)
+    :return:
+    """
+    def extract(result):
+        body = result['body']
+
+        if not body:
+            if default is inspect.Parameter.empty:
+                raise ValidationError.single("field required", 'body')
+
+            return default
+
+        if body.get('type') not in ('json', 'url_encoded'):
+            raise ValidationError.single("body is not a valid JSON object", 'body')
+
+        try:
+            return convert(body['data'])
+        except ValidationError as e:
+            raise e.prefixed('body')
+
+    return extract
+
+
+class InvocationPlan:
+    """
+    Extractors of the arguments of a route function (see the module docstring)
+    """
+
+    def __init__(self, func, path_params=()):
+        """
+        Initialize InvocationPlan class with the route function.
+        :param func: route function
+        :param path_params: parameter names of the route path
+        """
+        self.func = func
+        self.path_params = tuple(path_params)
+
+        # resolved on the first request if the type hints cannot be resolved yet
+        # (forward references to classes defined after the route function)
+        self.extractors = None
+        self.keyword_extractors = None
+
+        try:
+            self.compile()
+        except NameError as e:
+            logger.debug(f"Type hints of {func.__qualname__} are resolved on the first request: {e}")
+
+    def compile(self):
+        """
+        Inspect the route function and build the extractors.
+        :return:
+        """
+        # decorators keep the original function in __wrapped__
+        original = inspect.unwrap(self.func)
+        parameters = inspect.signature(self.func).parameters
+        type_hints = get_type_hints(original)
+
+        extractors = []
+        keyword_extractors = []
+
+        for name, parameter in parameters.items():
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                continue
+
+            extractor = self._extractor(name, type_hints.get(name), parameter.default)
+
+            if parameter.kind == parameter.KEYWORD_ONLY:
+                keyword_extractors.append((name, extractor))
+            else:
+                extractors.append(extractor)
+
+        self.keyword_extractors = tuple(keyword_extractors)
+        self.extractors = tuple(extractors)
+
+    def _extractor(self, name, param_type, default):
+        """
+        Extractor of a parameter.
+        :param name:
+        :param param_type: type hint (None if there is none)
+        :param default: default value (inspect.Parameter.empty if there is none)
+        :return:
+        """
+        if name in self.path_params:
+            return _path_parameter(name, converter(param_type) if param_type is not None else None)
+
+        if param_type is Request:
+            return _request
+
+        if param_type is Session:
+            return _session
+
+        convert = converter(param_type) if param_type is not None else None
+
+        if convert is not None:
+            if default is inspect.Parameter.empty and is_optional(param_type):
+                default = None
+
+            if dataclasses.is_dataclass(without_none(param_type)):
+                return _body(convert, default)
+
+            return _query_parameter(name, convert, default)
+
+        if param_type is None:
+            logger.debug(f'The parameter `{name}` of {self.func.__qualname__} does not have any type hints. '
+                         f'It must have type hints; otherwise, the argument will be set as `None`.')
+        else:
+            logger.warning(f"Unknown parameter type - {name} - {param_type}, "
+                           f"the argument of {self.func.__qualname__} will be set as `None`")
+
+        return _none
+
+    def call(self, result):
+        """
+        Call the route function with the arguments of a request.
+        :param result: parsed request
+        :return: return value of the route function
+        """
+        if self.extractors is None:
+            self.compile()
+
+        try:
+            args = [extract(result) for extract in self.extractors]
+            kwargs = {name: extract(result) for name, extract in self.keyword_extractors}
+        except ValidationError:
+            raise self._all_errors(result) from None
+
+        return self.func(*args, **kwargs)
+
+    def _all_errors(self, result):
+        """
+        Run every extractor and collect the errors (the request has at least one).
+        :param result: parsed request
+        :return: ValidationError
+        """
+        errors = []
+        extractors = list(self.extractors) + [extract for _, extract in self.keyword_extractors]
+
+        for extract in extractors:
+            try:
+                extract(result)
+            except ValidationError as e:
+                errors.extend(e.errors)
+
+        return ValidationError(errors)
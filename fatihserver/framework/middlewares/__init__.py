@@ -1 +1 @@
-# TODO: Will be implemented
\ No newline at end of file
+from fatihserver.framework.middlewares.middleware import Middleware, compose
@@ -0,0 +1,227 @@
+"""
+Middlewares for *FatihServer*
+
+A middleware runs around the route functions. It can be written in two styles:
+
+    - hooks: `before(request)` runs before the route function (returning a Response
+      answers the request without calling the route), `after(request, response)`
+      runs after it and returns the response (it can be replaced)
+    - wrap: `dispatch(request, call_next)` calls `call_next(request)` to run the
+      rest of the chain (plain functions with this signature are middlewares too)
+
+Hooks and dispatch can be plain functions or coroutines (`async def`). `response`
+is the return value of the route function (a Response for most routes). A plain
+route function (or plain middleware) inside an async middleware runs in a worker
+thread, so it does not block the event loop the coroutine runs on.
+
+The middlewares of a route are composed into a single callable once (when the
+server starts, see HttpRouter.freeze()), so a request does not iterate over the
+middlewares, it only calls the nested functions. Routes without middlewares
+call the route function directly.
+"""
+
+import asyncio
+import inspect
+
+from fatihserver.server.request_handler import Request
+
+
+class Middleware:
+    """
+    Base class of the middlewares (override the hooks or dispatch, see the module docstring)
+    """
+
+    def before(self, request):
+        """
+        Run before the route function.
+        :param request: Request
+        :return: None to continue, or a Response to answer the request with
+        """
+        return None
+
+    def after(self, request, response):
+        """
+        Run after the route function.
+        :param request: Request
+        :param response: return value of the route function
+        :return: response
+        """
+        return response
+
+    def dispatch(self, request, call_next):
+        """
+        Run the rest of the chain with `call_next(request)` (wrap style). The default
+        passes the request on (compose() skips this layer if it is not overridden).
+        :param request: Request
+        :param call_next:
+        :return: response (an awaitable if call_next returns one)
+        """
+        return call_next(request)
+
+
+def _overrides(middleware, name):
+    """
+    Check if a Middleware subclass overrides a method.
+    :param middleware:
+    :param name:
+    :return:
+    """
+    return getattr(type(middleware), name) is not getattr(Middleware, name)
+
+
+def _is_async(func):
+    return inspect.iscoroutinefunction(inspect.unwrap(func))
+
+
+def _name(middleware):
+    return getattr(middleware, '__qualname__', type(middleware).__qualname__)
+
+
+def _in_executor(func):
+    """
+    Awaitable version of a plain inner handler of an async middleware. The handler
+    runs in a worker thread: the coroutine runs on an event loop (the shared loop of
+    the threaded server), a blocking route function would serialize the requests.
+    :param func: function(request)
+    :return: coroutine function(request)
+    """
+    async def call(request):
+        return await asyncio.get_running_loop().run_in_executor(None, func, request)
+
+    return call
+
+
+def compose(middlewares, endpoint, is_async):
+    """
+    Compose the middlewares around an endpoint (the first middleware is the outermost).
+    :param middlewares: Middleware instances or functions (request, call_next)
+    :param endpoint: function(request) that runs the route function
+    :param is_async: the endpoint returns an awaitable
+    :return: (handler(request), is_async of the handler)
+    """
+    handler = endpoint
+
+    for middleware in reversed(middlewares):
+        if isinstance(middleware, Middleware) and not _overrides(middleware, 'dispatch'):
+            handler, is_async = _hooks(middleware, handler, is_async)
+        elif isinstance(middleware, Middleware) or callable(middleware):
+            dispatch = middleware.dispatch if isinstance(middleware, Middleware) else middleware
+            handler, is_async = _wrap(dispatch, handler, is_async, _name(middleware))
+        else:
+            raise Exception(f"Middleware must be a Middleware or a function (request, call_next): {middleware}")
+
+    return handler, is_async
+
+
+def _wrap(dispatch, call_next, is_async, name):
+    """
+    Layer of a wrap style middleware.
+    :param dispatch: function(request, call_next)
+    :param call_next: inner handler
+    :param is_async: the inner handler returns an awaitable
+    :param name: name of the middleware (errors)
+    :return: (handler, is_async)
+    """
+    if _is_async(dispatch):
+        if not is_async:
+            # the coroutine awaits call_next, so the inner handler must be awaitable too
+            call_next = _in_executor(call_next)
+
+        async def handler(request):
+            return await dispatch(request, call_next)
+
+        return handler, True
+
+    if is_async:
+        raise Exception(f"Middleware {name} is a plain function, it cannot wait for the coroutine "
+                        f"route (or middleware) it wraps. Define it with `async def`.")
+
+    def handler(request):
+        return dispatch(request, call_next)
+
+    return handler, False
+
+
+def _hooks(middleware, call_next, is_async):
+    """
+    Layer of a hook style middleware (only the overridden hooks are called).
+    :param middleware: Middleware
+    :param call_next: inner handler
+    :param is_async: the inner handler returns an awaitable
+    :return: (handler, is_async)
+    """
+    before = middleware.before if _overrides(middleware, 'before') else None
+    after = middleware.after if _overrides(middleware, 'after') else None
+
+    if before is None and after is None:
+        return call_next, is_async
+
+    before_async = before is not None and _is_async(before)
+    after_async = after is not None and _is_async(after)
+
+    if is_async or before_async or after_async:
+        if not is_async:
+            call_next = _in_executor(call_next)
+
+        async def handler(request):
+            if before is not None:
+                response = before(request)
+                if before_async:
+                    response = await response
+                if response is not None:
+                    return response
+
+            response = await call_next(request)
+
+            if after is not None:
+                response = after(request, response)
+                if after_async:
+                    response = await response
+
+            return response
+
+        return handler, True
+
+    # plain functions: a layer without branches per request
+    if after is None:
+        def handler(request):
+            response = before(request)
+            if response is not None:
+                return response
+
+            return call_next(request)
+    elif before is None:
+        def handler(request):
+            return after(request, call_next(request))
+    else:
+        def handler(request):
+            response = before(request)
+            if response is not None:
+                return response
+
+            return after(request, call_next(request))
+
+    return handler, False
+
+
+def chain(middlewares, plan, is_async):
+    """
+    Entry of the composed chain of a route: it is called with the parsed request.
+    :param middlewares: middlewares of the route (the first one is the outermost)
+    :param plan: InvocationPlan of the route function
+    :param is_async: the route function is a coroutine
+    :return: function(result)
+    """
+    if not middlewares:
+        return plan.call
+
+    def endpoint(request):
+        return plan.call(request.result)
+
+    handler, _ = compose(middlewares, endpoint, is_async)
+
+    def call(result):
+        # the route function gets the same Request object (see the `Request` extractor)
+        return handler(Request.from_result(result))
+
+    return call
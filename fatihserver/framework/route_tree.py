@@ -0,0 +1,255 @@
+"""
+Route tree for *FatihServer*
+
+The paths of a router are stored in a tree of path segments, every path holds
+the MethodTable of its routes (see router.py), so finding the routes of a
+request costs O(number of segments of the path), independent of the number of
+registered routes. Paths can have parameters:
+
+    /users/{id:int}/posts/{slug}
+    /files/{rest:path}
+
+Converters: `str` (default, one non-empty segment), `int`, `float` and `path`
+(the rest of the path, it must be the last segment). Parameter values are
+percent-decoded. Static segments are
+matched before parameters, and typed parameters (int, float) before `str`,
+so `/users/me` wins over `/users/{id}` and `/users/{id:int}` over `/users/{name}`.
+"""
+
+import re
+from urllib.parse import unquote
+
+# {name} or {name:converter}
+PARAMETER = re.compile(r'^\{([A-Za-z_][A-Za-z0-9_]*)(?::([a-z]+))?\}$')
+
+FLOAT = re.compile(r'^-?[0-9]+(\.[0-9]+)?$')
+
+
+def path_parameters(path):
+    """
+    Names of the parameters of a path pattern.
+    :param path:
+    :return:
+    """
+    names = []
+    for segment in path.split('/'):
+        match = PARAMETER.match(segment)
+        if match is not None:
+            names.append(match.group(1))
+
+    return names
+
+
+def _to_int(value):
+    if not value.isascii() or not value.isdigit():
+        raise ValueError(value)
+
+    return int(value)
+
+
+def _to_float(value):
+    # float() would also accept ' 1', '1_0', 'nan' and 'inf'
+    if FLOAT.match(value) is None:
+        raise ValueError(value)
+
+    return float(value)
+
+
+def _to_str(value):
+    if not value:
+        raise ValueError(value)
+
+    return value
+
+
+# converter name: (priority, function), lower priorities are tried first
+CONVERTERS = {
+    'int': (0, _to_int),
+    'float': (1, _to_float),
+    'str': (2, _to_str),
+    'path': (3, _to_str),
+}
+
+
+class RouteNode:
+    """
+    Node of the route tree (one path segment)
+    """
+    __slots__ = ('static', 'parameters', 'name', 'converter', 'convert', 'priority', 'route')
+
+    def __init__(self, name=None, converter=None):
+        """
+        Initialize RouteNode class.
+        :param name: parameter name (None for static segments)
+        :param converter: converter name of the parameter
+        """
+        # static segment: child node
+        self.static = {}
+
+        # parameter children, sorted by priority
+        self.parameters = []
+
+        self.name = name
+        self.converter = converter
+        self.priority, self.convert = CONVERTERS[converter] if converter else (None, None)
+
+        # MethodTable of the path that ends here
+        self.route = None
+
+
+class RouteTree:
+    """
+    Tree of the paths of a router (one MethodTable per path)
+
+    Paths without parameters are also kept in a dictionary, so they are found
+    with a single lookup.
+    """
+
+    def __init__(self):
+        self.root = RouteNode()
+        self.static_routes = {}
+        self.count = 0
+        self.frozen = False
+
+    def __len__(self):
+        return self.count
+
+    def insert(self, path, route):
+        """
+        Add the routes of a path (an existing table of the same path is replaced).
+        :param path: path pattern
+        :param route: MethodTable
+        :return:
+        """
+        if self.frozen:
+            raise Exception(f"Route tree is frozen, the route cannot be added: {path}")
+
+        segments = path.split('/')[1:]
+        node = self.root
+        dynamic = False
+
+        for i, segment in enumerate(segments):
+            match = PARAMETER.match(segment)
+
+            if match is None:
+                if '{' in segment or '}' in segment:
+                    raise Exception(f"Invalid path parameter `{segment}` in route: {path}")
+
+                node = node.static.setdefault(segment, RouteNode())
+                continue
+
+            name, converter = match.group(1), match.group(2) or 'str'
+            if converter not in CONVERTERS:
+                raise Exception(f"Unknown path parameter converter `{converter}` in route: {path}. "
+                                f"Available converters: {', '.join(CONVERTERS)}")
+
+            if converter == 'path' and i != len(segments) - 1:
+                raise Exception(f"`path` parameters must be the last segment of the route: {path}")
+
+            dynamic = True
+            node = self._parameter_child(node, name, converter)
+
+        if node.route is None:
+            self.count += 1
+        node.route = route
+
+        if not dynamic:
+            self.static_routes[path] = route
+
+    def freeze(self):
+        """
+        Make the tree read-only (it is only read afterwards, so lookups need no lock).
+        :return:
+        """
+        self.frozen = True
+
+    @staticmethod
+    def _parameter_child(node, name, converter):
+        """
+        Get (create) the parameter child of a node.
+        :param node:
+        :param name:
+        :param converter:
+        :return:
+        """
+        for child in node.parameters:
+            if child.name == name and child.converter == converter:
+                return child
+
+        child = RouteNode(name, converter)
+        node.parameters.append(child)
+        node.parameters.sort(key=lambda parameter: parameter.priority)
+
+        return child
+
+    def match(self, path):
+        """
+        Find the routes of a requested path.
+        :param path: requested path (without the query string)
+        :return: (MethodTable, path parameters) or (None, None)
+        """
+        route = self.static_routes.get(path)
+        if route is not None:
+            return route, {}
+
+        if self.count == len(self.static_routes):
+            # there are no routes with parameters
+            return None, None
+
+        params = {}
+        node = self._match(self.root, path.split('/')[1:], 0, params)
+        if node is None:
+            return None, None
+
+        return node.route, params
+
+    def _match(self, node, segments, index, params):
+        """
+        Match the segments from `index` on below `node` (static children first).
+        :param node:
+        :param segments:
+        :param index:
+        :param params: converted parameters (filled on success)
+        :return: RouteNode of the path or None
+        """
+        count = len(segments)
+
+        while index < count:
+            segment = segments[index]
+            child = node.static.get(segment)
+
+            if not node.parameters:
+                # only static children, nothing to backtrack to
+                if child is None:
+                    return None
+
+                node = child
+                index += 1
+                continue
+
+            if child is not None:
+                found = self._match(child, segments, index + 1, params)
+                if found is not None:
+                    return found
+
+            for child in node.parameters:
+                if child.converter == 'path':
+                    value = '/'.join(segments[index:])
+                    if value and child.route is not None:
+                        params[child.name] = unquote(value)
+                        return child
+                    continue
+
+                try:
+                    value = child.convert(unquote(segment) if '%' in segment else segment)
+                except ValueError:
+                    continue
+
+                found = self._match(child, segments, index + 1, params)
+                if found is not None:
+                    params[child.name] = value
+                    return found
+
+            return None
+
+        return node if node.route is not None else None
@@ -1,46 +1,321 @@
-import functools
+import copy
+import inspect
 import os
 import threading
+from types import MappingProxyType
 
 from fatihserver.framework import static_files
+from fatihserver.framework.invocation import InvocationPlan
+from fatihserver.framework.middlewares.middleware import chain
+from fatihserver.framework.route_tree import RouteTree, path_parameters
+from fatihserver.framework.static_cache import StaticFileCache
 from fatihserver.framework.static_files import StaticFiles
 
 
+class Route:
+    """
+    Registered route (route function and its options)
+
+    Concurrency contract:
+        Route functions run fully concurrently by default (no locks around them).
+        With `max_concurrency`, at most that many requests execute the route at
+        the same time (bulkhead); requests over the limit get `503 Service Unavailable`
+        right away instead of waiting, so a slow route cannot starve the server.
+
+    With `stream=True` the body is not read before the route function is called,
+    the route function reads it with `Request.stream()` (see RequestBody).
+
+    The arguments of the route function are described by `plan` (see InvocationPlan),
+    it is built here so requests do not inspect the function.
+
+    `call(result)` runs the middlewares of the route and the route function. The
+    route's own `middlewares` run inside the middlewares of the router, the router
+    middlewares in `exclude_middlewares` (instances or classes) are skipped. A router
+    can be included by several routers, so the router middlewares are composed into
+    a copy of the route for each mount (see mount()).
+    """
+
+    def __init__(self, method, path, func, max_concurrency=None, stream=False, middlewares=None,
+                 exclude_middlewares=None):
+        """
+        Initialize Route class with method, path, function and options.
+        :param method:
+        :param path:
+        :param func:
+        :param max_concurrency: max. number of concurrent executions (None means unlimited)
+        :param stream: the route function reads the request body itself
+        :param middlewares: middlewares of this route only
+        :param exclude_middlewares: router middlewares (instances or classes) that are not run for this route
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise Exception(f"max_concurrency must be at least 1: {path}")
+
+        self.method = method
+        self.path = path
+        self.func = func
+        self.max_concurrency = max_concurrency
+        self.stream = stream
+        self.plan = InvocationPlan(func, path_parameters(path))
+
+        self.middlewares = tuple(middlewares or ())
+        self.exclude_middlewares = tuple(exclude_middlewares or ())
+        self.call = None
+        self.compose()
+
+        # threading semaphore: it is only acquired without blocking,
+        # so it is safe to use from the event loop too
+        self.semaphore = None
+        if max_concurrency is not None:
+            self.semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def compose(self, router_middlewares=()):
+        """
+        Compose the middlewares of the router and of the route around the route function.
+        :param router_middlewares: middlewares of the router(s) of the route, outermost first
+        :return:
+        """
+        middlewares = [middleware for middleware in router_middlewares if not self._excluded(middleware)]
+        middlewares.extend(self.middlewares)
+
+        self.call = chain(middlewares, self.plan, inspect.iscoroutinefunction(inspect.unwrap(self.func)))
+
+    def mount(self, path, router_middlewares=()):
+        """
+        Copy of the route for a mount point, with the middlewares of the routers that mount it
+        (the copy shares the invocation plan and the concurrency limit of the route).
+        :param path: full path of the route
+        :param router_middlewares: middlewares of the router(s) of the route, outermost first
+        :return: Route
+        """
+        route = copy.copy(self)
+        route.path = path
+        route.compose(router_middlewares)
+
+        return route
+
+    def _excluded(self, middleware):
+        """
+        Check if a router middleware is excluded from the route.
+        :param middleware:
+        :return:
+        """
+        for excluded in self.exclude_middlewares:
+            if middleware is excluded or (isinstance(excluded, type) and isinstance(middleware, excluded)):
+                return True
+
+        return False
+
+    def acquire(self):
+        """
+        Acquire a slot to execute the route (non-blocking).
+        :return: False if the route is at its concurrency limit
+        """
+        if self.semaphore is None:
+            return True
+
+        return self.semaphore.acquire(blocking=False)
+
+    def release(self):
+        """
+        Release the slot acquired by acquire().
+        :return:
+        """
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+class MethodTable:
+    """
+    Routes of a path by method
+
+    HEAD is answered by the GET route (without the body) and OPTIONS by the
+    request handler (with `Allow`), unless they are registered explicitly.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+        # value of the `Allow` header (405 and OPTIONS responses)
+        self.allow = 'OPTIONS'
+
+    def add(self, route):
+        """
+        Add (replace) the route of a method.
+        :param route:
+        :return:
+        """
+        self.routes[route.method] = route
+
+        methods = set(self.routes)
+        if 'GET' in methods:
+            methods.add('HEAD')
+        methods.add('OPTIONS')
+
+        self.allow = ', '.join(method for method in HttpRouter.METHODS if method in methods)
+
+    def freeze(self):
+        """
+        Make the table read-only.
+        :return:
+        """
+        self.routes = MappingProxyType(self.routes)
+
+    def route(self, method):
+        """
+        Route of a method.
+        :param method:
+        :return: Route or None (405, or OPTIONS answered by the request handler)
+        """
+        route = self.routes.get(method)
+
+        if route is None and method == 'HEAD':
+            route = self.routes.get('GET')
+
+        return route
+
+
 class HttpRouter:
     """
     Route class for registering routes.
+
+    Routers are independent objects: an application can have several (e.g. a public
+    and an admin app in one process) and compose them with include(). When the server
+    starts, freeze() flattens the included routers into one lookup structure and makes
+    the route tables read-only, so requests read them without locks.
     """
-    # instance
-    _instance = None
-
-    # lock for thread safety
-    _lock = threading.Lock()
-
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                # Another thread could have created the instance
-                # before we acquired the lock. So check that the
-                # instance is still nonexistent.
-                if not cls._instance:
-                    # Thread-safe dictionary for storing routes (built-in dicts are already thread-safe)
-                    cls.GET_PATHS = {}
-                    cls.POST_PATHS = {}
-                    cls.PATCH_PATHS = {}
-                    cls.PUT_PATHS = {}
-                    cls.DELETE_PATHS = {}
-                    cls.STATIC_PATHS = []
-                    cls.SERVED_STATIC_PATHS = {}
-
-                    cls._instance = super().__new__(cls)
-        return cls._instance
+    # methods that routes can be registered for
+    METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
 
     def __init__(self):
         """
         Initialize the class with empty dictionaries for each HTTP method.
         """
-        pass
+        self.GET_PATHS = {}
+        self.POST_PATHS = {}
+        self.PATCH_PATHS = {}
+        self.PUT_PATHS = {}
+        self.DELETE_PATHS = {}
+
+        # routes of this router: path -> MethodTable
+        self.METHOD_TABLES = {}
+
+        # lookup structure of the routes (see RouteTree): the routes of this router,
+        # replaced by freeze() with the routes of the included routers too
+        self.ROUTES = RouteTree()
+
+        self.STATIC_PATHS = []
+        self.SERVED_STATIC_PATHS = {}
+        self.SERVED_STATIC_DIRS = []
+        self.STATIC_CACHE = StaticFileCache()
+
+        # middlewares of the routes of this router (and of the included routers), outermost first
+        self.middlewares = []
+
+        # (router, prefix) of the included routers
+        self.included = []
+        self.frozen = False
+
+        # a route reads its body itself (stream=True), the request handler only
+        # checks the routes of the requests before their bodies are read if there is one
+        self.has_stream_routes = False
+
+    def add_middleware(self, middleware):
+        """
+        Add a middleware to the routes of the router (see fatihserver.framework.middlewares).
+        Middlewares run in the order they are added, the first one is the outermost.
+        The middlewares of a router also run for the routes of the routers it includes.
+        :param middleware: Middleware instance or function (request, call_next)
+        :return:
+        """
+        if self.frozen:
+            raise Exception("Middlewares cannot be added after the server has started.")
+
+        self.middlewares.append(middleware)
+
+    def include(self, router, prefix=""):
+        """
+        Mount the routes of another router under a path prefix (e.g. "/api").
+        The routes are copied into this router's lookup structure by freeze(), so
+        routes added to `router` until then are included too. Static routes of
+        `router` are not included.
+        :param router: HttpRouter
+        :param prefix: path prefix ('' or starting with '/', without path parameters)
+        :return:
+        """
+        if self.frozen:
+            raise Exception("Routers cannot be included after the server has started.")
+
+        if router is self:
+            raise Exception("A router cannot include itself.")
+
+        if prefix and (not prefix.startswith('/') or prefix.endswith('/')):
+            raise Exception(f"Router prefix must start with '/' and must not end with '/': {prefix}")
+
+        if path_parameters(prefix):
+            raise Exception(f"Router prefix cannot have path parameters: {prefix}")
+
+        self.included.append((router, prefix))
+
+    def freeze(self):
+        """
+        Flatten the included routers into the lookup structure and make the
+        route tables read-only (called when the server starts).
+        :return:
+        """
+        if self.frozen:
+            return
+
+        tables = {}
+        has_stream_routes = False
+        for path, route, middlewares in self.flat_routes():
+            # the middleware chain of the route is composed once, here, on a copy of
+            # the route (the route of an included router can be mounted by other routers)
+            route = route.mount(path, middlewares)
+
+            table = tables.get(path)
+            if table is None:
+                table = tables[path] = MethodTable()
+
+            if route.method in table.routes:
+                raise Exception(f"Route conflicts with another route: {route.method} {path}")
+
+            table.add(route)
+            has_stream_routes = has_stream_routes or route.stream
+
+        tree = RouteTree()
+        for path, table in tables.items():
+            table.freeze()
+            tree.insert(path, table)
+        tree.freeze()
+
+        # the own tables of the router are kept (flat_routes() reads them when the
+        # router is included after it was frozen)
+        for table in self.METHOD_TABLES.values():
+            table.freeze()
+
+        # replaced at once, requests see the old or the new structure
+        self.ROUTES = tree
+        self.has_stream_routes = has_stream_routes
+        self.frozen = True
+
+    def flat_routes(self, prefix="", middlewares=()):
+        """
+        (full path, Route, router middlewares) of the routes of this router and the included routers.
+        :param prefix: prefix of this router
+        :param middlewares: middlewares of the routers that include this router
+        :return:
+        """
+        middlewares = tuple(middlewares) + tuple(self.middlewares)
+
+        for path, table in self.METHOD_TABLES.items():
+            # "/" of an included router is the prefix itself ("/api", not "/api/")
+            full_path = prefix if prefix and path == '/' else prefix + path
 
+            for route in table.routes.values():
+                yield full_path, route, middlewares
+
+        for router, router_prefix in self.included:
+            yield from router.flat_routes(prefix + router_prefix, middlewares)
 
     def add_static_route(self, static: StaticFiles):
         """
@@ -107,203 +382,256 @@ class HttpRouter:
                             "We are not supporting other static file classes at the moment.")
 
 
-    def add_route(self, method, path, func):
+    def add_route(self, method, path, func, max_concurrency=None, stream=False, middlewares=None,
+                  exclude_middlewares=None):
         """
         Add route to router.
         :param method:
         :param path:
         :param func:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
         :return:
         """
-        if method == 'GET':
-            self.GET_PATHS[path] = func
-        elif method == 'POST':
-            self.POST_PATHS[path] = func
-        elif method == 'PATCH':
-            self.PATCH_PATHS[path] = func
-        elif method == 'PUT':
-            self.PUT_PATHS[path] = func
-        elif method == 'DELETE':
-            self.DELETE_PATHS[path] = func
+        self._register(Route(method, path, func, max_concurrency=max_concurrency, stream=stream,
+                             middlewares=middlewares, exclude_middlewares=exclude_middlewares))
 
-    def get(self, path):
+    def _register(self, route):
         """
-        Decorator for registering GET routes.
+        Add a route to the method table of its path.
+        :param route:
+        :return:
+        """
+        if self.frozen:
+            raise Exception(f"Routes cannot be added after the server has started: {route.method} {route.path}")
+
+        if route.method not in self.METHODS:
+            raise Exception(f"Unsupported method `{route.method}` of route: {route.path}. "
+                            f"Supported methods: {', '.join(self.METHODS)}")
+
+        if route.method == 'GET':
+            self.GET_PATHS[route.path] = route
+        elif route.method == 'POST':
+            self.POST_PATHS[route.path] = route
+        elif route.method == 'PATCH':
+            self.PATCH_PATHS[route.path] = route
+        elif route.method == 'PUT':
+            self.PUT_PATHS[route.path] = route
+        elif route.method == 'DELETE':
+            self.DELETE_PATHS[route.path] = route
+
+        table = self.METHOD_TABLES.get(route.path)
+        if table is None:
+            # path parameters are validated here, so invalid routes fail at registration
+            table = MethodTable()
+            self.ROUTES.insert(route.path, table)
+            self.METHOD_TABLES[route.path] = table
+
+        table.add(route)
+
+        if route.stream:
+            self.has_stream_routes = True
+
+    def _decorator(self, method, path, max_concurrency, stream, middlewares, exclude_middlewares):
+        """
+        Decorator that registers the function as the route of `method` (when it is decorated).
+        :param method:
         :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
         :return:
         """
         def decorator(func):
-            @functools.wraps(func)
-            def wrapper(*args, **kwargs):
-                return func(*args, **kwargs)
-
-            self.GET_PATHS[path] = func
-            return wrapper
+            self._register(Route(method, path, func, max_concurrency=max_concurrency, stream=stream,
+                                 middlewares=middlewares, exclude_middlewares=exclude_middlewares))
+            return func
 
         return decorator
 
-    def post(self, path):
+    def get(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
         """
-        Decorator for registering POST routes.
+        Decorator for registering GET routes.
         :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
         :return:
         """
-        def decorator(func):
-            @functools.wraps(func)
-            def wrapper(*args, **kwargs):
-                self.POST_PATHS[path] = wrapper
-                return func(*args, **kwargs)
+        return self._decorator('GET', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-            return wrapper
+    def post(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
+        """
+        Decorator for registering POST routes.
+        :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
+        :return:
+        """
+        return self._decorator('POST', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-        return decorator
+    def put(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
+        """
+        Decorator for registering PUT routes.
+        :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
+        :return:
+        """
+        return self._decorator('PUT', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-    def patch(self, path):
+    def patch(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
         """
         Decorator for registering PATCH routes.
         :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
         :return:
         """
-        def decorator(func):
-            @functools.wraps(func)
-            def wrapper(*args, **kwargs):
-                self.PATCH_PATHS[path] = wrapper
-                return func(*args, **kwargs)
-
-            return wrapper
+        return self._decorator('PATCH', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-        return decorator
-
-    def delete(self, path):
+    def delete(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
         """
         Decorator for registering DELETE routes.
         :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
         :return:
         """
-        def decorator(func):
-            @functools.wraps(func)
-            def wrapper(*args, **kwargs):
-                self.DELETE_PATHS[path] = wrapper
-                return func(*args, **kwargs)
+        return self._decorator('DELETE', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-            return wrapper
+    def head(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
+        """
+        Decorator for registering HEAD routes.
+        :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
+        :return:
+        """
+        return self._decorator('HEAD', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
-        return decorator
+    def options(self, path, max_concurrency=None, stream=False, middlewares=None, exclude_middlewares=None):
+        """
+        Decorator for registering OPTIONS routes.
+        :param path:
+        :param max_concurrency: see Route
+        :param stream: see Route
+        :param middlewares: see Route
+        :param exclude_middlewares: see Route
+        :return:
+        """
+        return self._decorator('OPTIONS', path, max_concurrency, stream, middlewares, exclude_middlewares)
 
     def serve_static_files(self):
         """
-        Returns all static files. (finds all files in STATIC_PATHS)
+        Prepare the registered static routes (STATIC_PATHS) for serving.
+
+        The directories are not walked and the files are not read here: a requested
+        file is looked up when it is requested (see static_path_exists) and cached
+        in STATIC_CACHE, so the startup time and the memory usage do not grow with
+        the static directories and new/changed files are served without a restart.
         :return:
         """
+        self.SERVED_STATIC_PATHS.clear()
+        self.SERVED_STATIC_DIRS.clear()
+        self.STATIC_CACHE.clear()
 
-        # check if path exists in STATIC_PATHS's 'path' key
-        files_path = []
         for static_path in self.STATIC_PATHS:
-            if static_path['is_dir']:
-                # recursively add all files in directory
-                for root, dirs, files in os.walk(static_path['path']):
-                    for file in files:
-                        # absolute system as full path in the system
-                        path = os.path.join(root, file)
-
-                        # remove '.' from path
-                        path = path.replace('./', '')
+            # remove './' from path (requested paths do not have it)
+            path = static_path['path'].replace('./', '')
 
-                        files_path.append(path)
+            if static_path['is_dir']:
+                # (prefix of the requested paths, absolute directory in the system)
+                self.SERVED_STATIC_DIRS.append((path, os.path.abspath(path)))
             else:
                 # absolute path of file in the system
-                files_path.append(static_path['path'])
-
-        # prepare for serving static files
-        for path in files_path:
-            # check if it needs to be read as binary
-            if path.endswith('.css') or path.endswith('.js') or path.endswith('.html'):
-                # read as binary
-                with open(path, 'r', encoding='utf-8') as f:
-                    # read file as binary
-                    data = f.read()
-
-                    # Add to Served Static Paths
-                    self.SERVED_STATIC_PATHS[path] = data
-            # font files are binary format
-            elif path.endswith('.ttf') or path.endswith('.woff') or path.endswith('.woff2')\
-                    or path.endswith('.eot') or path.endswith('.otf'):
-                with open(path, 'rb') as f:
-                    # read file as binary
-                    data = f.read()
-
-                    # Add to Served Static Paths
-                    self.SERVED_STATIC_PATHS[path] = data
-            else:
-                # try reading as utf-8 first
-                # if it fails, read as binary (because it might be an image)
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        # read file as binary
-                        data = f.read()
-
-                        # Add to Served Static Paths
-                        self.SERVED_STATIC_PATHS[path] = data
-                except UnicodeDecodeError:
-                    with open(path, 'rb') as f:
-                        # read file as binary
-                        data = f.read()
-
-                        # Add to Served Static Paths
-                        self.SERVED_STATIC_PATHS[path] = data
-
+                self.SERVED_STATIC_PATHS[path] = os.path.abspath(path)
 
     def process(self):
         # all routes are registered to self.PATHS
         print(self.GET_PATHS.items())
 
-        for path, func in self.GET_PATHS.items():
-            func()
+        for path, route in self.GET_PATHS.items():
+            route.func()
 
     def routes(self):
         """
         Returns all registered routes.
         :return:
         """
-        return self.GET_PATHS, self.POST_PATHS, self.PATCH_PATHS, self.DELETE_PATHS
+        return self.GET_PATHS, self.POST_PATHS, self.PATCH_PATHS, self.PUT_PATHS, self.DELETE_PATHS
 
     def static_path_exists(self, path):
         """
         Check if path exists in registered static routes.
-        :param path:
-        :return:
+        :param path: requested path (without the leading '/')
+        :return: (True, StaticEntry) or (False, None)
         """
-        if path in self.SERVED_STATIC_PATHS:
-            return True, self.SERVED_STATIC_PATHS[path]
-        else:
+        file_path = self.SERVED_STATIC_PATHS.get(path)
+
+        if file_path is None:
+            for prefix, directory in self.SERVED_STATIC_DIRS:
+                if path.startswith(prefix):
+                    file_path = os.path.normpath(os.path.join(directory, path[len(prefix):]))
+
+                    # '..' must not leave the static directory
+                    if not file_path.startswith(directory + os.sep):
+                        return False, None
+                    break
+            else:
+                return False, None
+
+        entry = self.STATIC_CACHE.get(file_path)
+        if entry is None:
             return False, None
 
+        return True, entry
+
     def exist(self, path, method):
         """
         Check if path exists in registered routes.
         :param path:
         :param method:
-        :return:
+        :return: (True, Route) or (False, None)
         """
-        if method == 'GET':
-            if path in self.GET_PATHS:
-                return True, self.GET_PATHS[path]
-            else:
-                return False, None
-        elif method == 'POST':
-            if path in self.POST_PATHS:
-                return True, self.POST_PATHS[path]
-            else:
-                return False, None
-        elif method == 'PATCH':
-            if path in self.PATCH_PATHS:
-                return True, self.PATCH_PATHS[path]
-            else:
-                return False, None
-        elif method == 'DELETE':
-            if path in self.DELETE_PATHS:
-                return True, self.DELETE_PATHS[path]
-            else:
-                return False, None
-        else:
-            return False, None
+        route, _ = self.match(path, method)
+        return route is not None, route
+
+    def match(self, path, method):
+        """
+        Find the route of a request (see RouteTree and MethodTable).
+        :param path: requested path (without the query string)
+        :param method:
+        :return: (Route, path parameters) or (None, None)
+        """
+        table, params = self.ROUTES.match(path)
+        if table is None:
+            return None, None
+
+        route = table.route(method)
+        if route is None:
+            return None, None
+
+        return route, params
+
+    def lookup(self, path):
+        """
+        Find the routes of a requested path (all methods).
+        :param path: requested path (without the query string)
+        :return: (MethodTable, path parameters) or (None, None)
+        """
+        return self.ROUTES.match(path)
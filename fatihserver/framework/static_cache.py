@@ -0,0 +1,360 @@
+"""
+Static file cache for *FatihServer*
+
+Static files are looked up lazily (on the first request) instead of being read
+at startup. Small files are kept in memory (inlined into the response), large
+files are only described here and sent from the disk with sendfile.
+
+Every lookup stats the file, so a changed (mtime/size) or replaced (inode) file
+is picked up without restarting the server and a deleted file is answered 404.
+
+Entries also carry the validators of conditional requests (`ETag`, `Last-Modified`),
+so revalidation (304 Not Modified) does not read the file.
+
+Compressible files (css, js, html, svg, json, ...) get a gzip variant when it is
+first requested: in memory for inlined files, a `.gz` file next to the file
+(precompressed by the build) or a gzip file created in a temporary directory
+for large files.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+
+from loguru import logger
+
+# media types that are worth compressing (images, fonts, videos are already compressed)
+COMPRESSIBLE_TYPES = frozenset(('application/javascript',
+                                'application/json',
+                                'application/xml',
+                                'application/manifest+json',
+                                'image/svg+xml',
+                                'image/x-icon'))
+
+
+def is_compressible(content_type):
+    """
+    Check if a response with the media type `content_type` is worth compressing.
+    :param content_type:
+    :return:
+    """
+    if not content_type:
+        return False
+
+    content_type = content_type.split(';')[0].strip()
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
+
+
+class StaticEntry:
+    """
+    Cached static file (metadata and, for small files, the content)
+    """
+
+    def __init__(self, path, st, data=None):
+        """
+        Initialize StaticEntry class with the path and stat result of the file.
+        :param path: path of the file in the file system
+        :param st: os.stat_result of the file
+        :param data: content of the file (bytes) if it is inlined
+        """
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.inode = st.st_ino
+        self.data = data
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        # HTTP-date has a resolution of seconds
+        self.mtime = int(st.st_mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+        # strong ETag: hash of the content (inlined files) or size + mtime + inode
+        # (large files, they are not read to compute it)
+        if data is not None:
+            self.etag = f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+        else:
+            self.etag = f'"{self.size:x}-{self.mtime_ns:x}-{self.inode:x}"'
+
+        # gzip variant (see StaticFileCache.gzip), it is created on the first request
+        self.compressible = is_compressible(self.content_type)
+        self.gzip_checked = False
+        self.gzip_data = None
+        self.gzip_path = None
+        self.gzip_generated = False
+        self.gzip_etag = self.etag[:-1] + '-gzip"'
+
+    def matches(self, st):
+        """
+        Check if the entry describes the file with the stat result `st`.
+        :param st:
+        :return:
+        """
+        return self.mtime_ns == st.st_mtime_ns \
+            and self.size == st.st_size \
+            and self.inode == st.st_ino
+
+
+class StaticFileCache:
+    """
+    Bounded LRU cache of static files
+
+    `max_size` is the byte budget of the cache: the inlined contents plus
+    `ENTRY_OVERHEAD` bytes per entry (so the number of entries is bounded too).
+    The least recently used entries are evicted when it is exceeded.
+    Files up to `inline_size` bytes are kept in memory, larger files are sent
+    from the disk (see FileResponse).
+    """
+    # approximate memory usage of an entry without content
+    ENTRY_OVERHEAD = 512
+
+    # larger files are not compressed on the fly (a `.gz` file next to them is still used)
+    MAX_COMPRESS_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, max_size=64 * 1024 * 1024, inline_size=64 * 1024):
+        """
+        Initialize StaticFileCache class with the byte budget.
+        :param max_size: byte budget of the cache
+        :param inline_size: files up to this size are kept in memory
+        """
+        self.max_size = max_size
+        self.inline_size = inline_size
+        self.entries = OrderedDict()
+        self.used = 0
+        self._lock = threading.Lock()
+
+        # directory of the gzip files created for large files (created when needed)
+        self.gzip_dir = None
+
+    def get(self, path):
+        """
+        Get the entry of a file (it is loaded or refreshed if needed).
+        :param path: path of the file in the file system
+        :return: StaticEntry or None if the file does not exist
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+
+        if st is None or not stat.S_ISREG(st.st_mode):
+            self._remove(path)
+            return None
+
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.matches(st):
+                self.entries.move_to_end(path)
+                return entry
+
+        # (re)load it without holding the lock
+        entry = self._load(path, st)
+        if entry is None:
+            self._remove(path)
+            return None
+
+        with self._lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self._discard(old)
+
+            self.entries[path] = entry
+            self.used += self._cost(entry)
+            self._evict()
+
+        return entry
+
+    def gzip(self, entry):
+        """
+        Get (create) the gzip variant of a compressible entry.
+        Inlined files are compressed in memory (`gzip_data`), large files
+        use `path.gz` if it is up to date or are compressed to `gzip_dir` (`gzip_path`).
+        :param entry: StaticEntry (returned by get())
+        :return: True if the entry has a gzip variant
+        """
+        if not entry.compressible:
+            return False
+
+        # checked again with the lock held, the first requests can compress it concurrently
+        if entry.gzip_checked:
+            return entry.gzip_data is not None or entry.gzip_path is not None
+
+        if entry.data is not None:
+            # precompression runs once per file, so the best level is used
+            data = gzip.compress(entry.data, compresslevel=9, mtime=0)
+
+            with self._lock:
+                if entry.gzip_checked:
+                    # compressed by a concurrent request meanwhile (it is counted once)
+                    return entry.gzip_data is not None
+
+                if len(data) < len(entry.data):
+                    entry.gzip_data = data
+
+                    if self.entries.get(entry.path) is entry:
+                        self.used += len(data)
+                        self._evict()
+
+                entry.gzip_checked = True
+        else:
+            path = self._gzip_file(entry)
+
+            with self._lock:
+                if entry.gzip_checked:
+                    # a concurrent request found or created the same file
+                    return entry.gzip_path is not None
+
+                entry.gzip_path = path
+                entry.gzip_generated = path is not None and path != entry.path + '.gz'
+                entry.gzip_checked = True
+
+                if self.entries.get(entry.path) is not entry:
+                    # evicted or replaced meanwhile
+                    self._remove_gzip_file(entry)
+                    return False
+
+        return entry.gzip_data is not None or entry.gzip_path is not None
+
+    def clear(self):
+        """
+        Remove all entries.
+        :return:
+        """
+        with self._lock:
+            for entry in self.entries.values():
+                self._remove_gzip_file(entry)
+
+            self.entries.clear()
+            self.used = 0
+
+    def _load(self, path, st):
+        """
+        Create the entry of a file (small files are read).
+        :param path:
+        :param st: stat result from get()
+        :return: StaticEntry or None if the file cannot be read
+        """
+        if st.st_size > self.inline_size:
+            return StaticEntry(path, st)
+
+        try:
+            with open(path, 'rb') as f:
+                # stat of the opened file, the content must match the metadata
+                st = os.fstat(f.fileno())
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"Static file cannot be read: {path} - {e}")
+            return None
+
+        if len(data) != st.st_size:
+            # the file is being written, do not cache a partial content
+            return StaticEntry(path, st)
+
+        return StaticEntry(path, st, data)
+
+    def _gzip_file(self, entry):
+        """
+        Find or create the gzip file of a large entry.
+        :param entry:
+        :return: path of the gzip file or None
+        """
+        # precompressed by the build (it must not be older than the file)
+        precompressed = entry.path + '.gz'
+        try:
+            if os.stat(precompressed).st_mtime_ns >= entry.mtime_ns:
+                return precompressed
+        except OSError:
+            pass
+
+        if entry.size > self.MAX_COMPRESS_SIZE:
+            return None
+
+        with self._lock:
+            if self.gzip_dir is None:
+                self.gzip_dir = tempfile.mkdtemp(prefix='fatihserver-gzip-')
+
+        path = os.path.join(self.gzip_dir, hashlib.blake2b(entry.gzip_etag.encode(), digest_size=16).hexdigest())
+
+        try:
+            # compressed to a temporary file and renamed, so it is never read half written
+            fd, temp_path = tempfile.mkstemp(dir=self.gzip_dir)
+            with open(entry.path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=6, mtime=0) as compressed:
+                    shutil.copyfileobj(source, compressed, 1024 * 1024)
+
+            if os.path.getsize(temp_path) >= entry.size:
+                # not worth it
+                os.remove(temp_path)
+                return None
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Static file cannot be compressed: {entry.path} - {e}")
+            return None
+
+        return path
+
+    def _remove(self, path):
+        """
+        Remove the entry of a file (if any).
+        :param path:
+        :return:
+        """
+        with self._lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                self._discard(entry)
+
+    def _evict(self):
+        """
+        Evict the least recently used entries until the cache fits its budget (lock is held).
+        :return:
+        """
+        while self.used > self.max_size and self.entries:
+            path, entry = self.entries.popitem(last=False)
+            self._discard(entry)
+
+    def _discard(self, entry):
+        """
+        Release the budget (and the gzip file) of a removed entry (lock is held).
+        :param entry:
+        :return:
+        """
+        self.used -= self._cost(entry)
+        self._remove_gzip_file(entry)
+
+    @staticmethod
+    def _remove_gzip_file(entry):
+        """
+        Remove the gzip file created for an entry (lock is held).
+        :param entry:
+        :return:
+        """
+        if entry.gzip_generated:
+            entry.gzip_generated = False
+            try:
+                os.remove(entry.gzip_path)
+            except OSError:
+                pass
+
+    def _cost(self, entry):
+        """
+        Bytes of the budget used by an entry.
+        :param entry:
+        :return:
+        """
+        cost = self.ENTRY_OVERHEAD
+
+        if entry.data is not None:
+            cost += len(entry.data)
+
+        if entry.gzip_data is not None:
+            cost += len(entry.gzip_data)
+
+        return cost
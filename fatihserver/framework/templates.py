@@ -67,9 +67,6 @@ class TemplateResponse(Response):
         # Set server
         self.set_header("Server", "FatihServer")
 
-        # Set connection
-        self.set_header("Connection", "close")
-
 
 class Templates:
     """
@@ -0,0 +1,276 @@
+"""
+Parameter validation for *FatihServer*
+
+Converters turn request values (query strings, path segments, JSON values)
+into the types of the route function's type hints and raise ValidationError
+(answered with `422 Unprocessable Content`) when they cannot. Supported hints:
+
+    int, float, str, bool, list[X], Optional[X] (X | None) and dataclasses
+    (built from a JSON object, fields are converted recursively)
+
+A converter is built once per type hint and cached, so requests only run it.
+"""
+
+import dataclasses
+import functools
+import math
+import re
+import types
+import typing
+
+INTEGER = re.compile(r'^[-+]?[0-9]+$')
+
+TRUE = frozenset(('true', '1', 'yes', 'on'))
+FALSE = frozenset(('false', '0', 'no', 'off'))
+
+
+class ValidationError(Exception):
+    """
+    Invalid request parameters
+
+    `errors` is a list of {'loc': [...], 'msg': '...'}, `loc` is the location
+    of the value (e.g. ['query', 'page'] or ['body', 'items', 2, 'count']).
+    """
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid parameter(s)")
+        self.errors = errors
+
+    @classmethod
+    def single(cls, msg, *loc):
+        """
+        ValidationError with a single error.
+        :param msg:
+        :param loc:
+        :return:
+        """
+        return cls([{'loc': list(loc), 'msg': msg}])
+
+    def prefixed(self, *loc):
+        """
+        Prepend a location to the errors (the value is a part of a larger value).
+        :param loc:
+        :return: self
+        """
+        for error in self.errors:
+            error['loc'][:0] = loc
+
+        return self
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValidationError.single("value is not a valid integer")
+
+    if isinstance(value, int):
+        return value
+
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+
+    if isinstance(value, str) and INTEGER.match(value) is not None:
+        return int(value)
+
+    raise ValidationError.single("value is not a valid integer")
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValidationError.single("value is not a valid number")
+
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValidationError.single("value is not a valid number") from None
+    else:
+        raise ValidationError.single("value is not a valid number")
+
+    if not math.isfinite(number):
+        raise ValidationError.single("value is not a finite number")
+
+    return number
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+
+    raise ValidationError.single("value is not a valid string")
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+
+    if isinstance(value, str):
+        lowered = value.lower()
+        if lowered in TRUE:
+            return True
+        if lowered in FALSE:
+            return False
+
+    raise ValidationError.single("value is not a valid boolean")
+
+
+SCALARS = {
+    int: _to_int,
+    float: _to_float,
+    str: _to_str,
+    bool: _to_bool,
+}
+
+
+def is_optional(hint):
+    """
+    Check if a type hint allows None (Optional[X], X | None).
+    :param hint:
+    :return:
+    """
+    return typing.get_origin(hint) in (typing.Union, types.UnionType) and type(None) in typing.get_args(hint)
+
+
+def converter(hint):
+    """
+    Converter of a type hint (cached).
+    :param hint:
+    :return: function(value) -> converted value, or None if the hint is not supported
+    """
+    try:
+        return _converter(hint)
+    except TypeError:
+        # unhashable hints (e.g. Annotated with a list) are not supported
+        return None
+
+
+def without_none(hint):
+    """
+    X of Optional[X] (other hints are returned as they are).
+    :param hint:
+    :return:
+    """
+    if is_optional(hint):
+        others = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        if len(others) == 1:
+            return others[0]
+
+    return hint
+
+
+@functools.lru_cache(maxsize=None)
+def _converter(hint):
+    """
+    Build the converter of a type hint (see converter()).
+    :param hint:
+    :return:
+    """
+    if hint in SCALARS:
+        return SCALARS[hint]
+
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+
+    if origin is list and len(args) == 1:
+        item = converter(args[0])
+        return None if item is None else _list_converter(item)
+
+    if is_optional(hint):
+        inner = without_none(hint)
+        if inner is hint:
+            # Union of several types
+            return None
+
+        inner = converter(inner)
+        return None if inner is None else _optional_converter(inner)
+
+    if dataclasses.is_dataclass(hint) and isinstance(hint, type):
+        return _dataclass_converter(hint)
+
+    return None
+
+
+def _list_converter(item):
+    """
+    Converter of list[X]: a JSON array or comma separated values (query strings).
+    :param item: converter of X
+    :return:
+    """
+    def convert(value):
+        if isinstance(value, str):
+            value = value.split(',') if value else []
+        elif not isinstance(value, list):
+            raise ValidationError.single("value is not a valid list")
+
+        items = []
+        errors = []
+        for i, element in enumerate(value):
+            try:
+                items.append(item(element))
+            except ValidationError as e:
+                errors.extend(e.prefixed(i).errors)
+
+        if errors:
+            raise ValidationError(errors)
+
+        return items
+
+    return convert
+
+
+def _optional_converter(inner):
+    def convert(value):
+        return None if value is None else inner(value)
+
+    return convert
+
+
+def _dataclass_converter(cls):
+    """
+    Converter of a dataclass: its fields are converted from a JSON object
+    (or url encoded form). Unknown keys are ignored.
+    :param cls:
+    :return:
+    """
+    type_hints = typing.get_type_hints(cls)
+
+    # (name, converter, required)
+    fields = []
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+
+        field_converter = converter(type_hints.get(field.name))
+        if field_converter is None:
+            raise Exception(f"Unsupported type of the field `{field.name}` of {cls.__qualname__}: "
+                            f"{type_hints.get(field.name)}")
+
+        required = field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+        fields.append((field.name, field_converter, required))
+
+    fields = tuple(fields)
+
+    def convert(value):
+        if not isinstance(value, dict):
+            raise ValidationError.single("value is not a valid object")
+
+        kwargs = {}
+        errors = []
+        for name, field_converter, required in fields:
+            if name not in value:
+                if required:
+                    errors.append({'loc': [name], 'msg': "field required"})
+                continue
+
+            try:
+                kwargs[name] = field_converter(value[name])
+            except ValidationError as e:
+                errors.extend(e.prefixed(name).errors)
+
+        if errors:
+            raise ValidationError(errors)
+
+        return cls(**kwargs)
+
+    return convert
@@ -149,63 +149,85 @@ class HttpRequestParser:
             else:
                 body = '\r\n'.join(lines)
 
-            # save raw body
-            self.raw_body = body
-
-            # parse body by 'Content-Type' header
-            if 'Content-Type' in self.headers:
-                try:
-                    if self.headers['Content-Type'] == 'application/y-www-form-urlencoded':
-                        # parse body as url encoded
-                        body = {
-                            "type": "url_encoded",
-                            "data": self._parse_url_encoded(body)
-                        }
-                    elif self.headers['Content-Type'] == 'application/json':
-                        # parse body as json
-                        body = {
-                            "type": "json",
-                            "data": self._parse_json(body)
-                        }
-                    elif self.headers['Content-Type'] == 'text/plain':
-                        # parse body as text
-                        body = {
-                            "type": "text",
-                            "data": self._parse_text(body)
-                        }
-                    elif 'multipart/form-data' in self.headers['Content-Type']:
-                        # parse body as multipart
-                        body = {
-                            "type": "multipart",
-                            "data": self._parse_text(body)
-                        }
-
-                        logger.warning('Multipart form data is not supported yet')
-                        #boundary = self.headers['Content-Type'].split(';')[1].split('=')[1]
-                        #body = self._parse_multipart(body, boundary)
-                    else:
-                        # parse body as text
-                        body = {
-                            "type": "text",
-                            "data": self._parse_text(body)
-                        }
-                except Exception as e:
-                    logger.error(e)
+            body = self._decode_body(body)
+        else:
+            body = None
+
+        self.body = body
+        return self._result()
+
+    def _decode_body(self, body):
+        """
+        Decode body by 'Content-Type' header (and save the raw body)
+
+        :param body:
+        :return:
+        """
+        # save raw body
+        self.raw_body = body
+
+        # parse body by 'Content-Type' header
+        if 'Content-Type' in self.headers:
+            # media type without parameters (e.g. '; charset=utf-8')
+            content_type = self.headers['Content-Type'].split(';')[0].strip().lower()
+
+            try:
+                if content_type == 'application/y-www-form-urlencoded':
+                    # parse body as url encoded
+                    body = {
+                        "type": "url_encoded",
+                        "data": self._parse_url_encoded(body)
+                    }
+                elif content_type == 'application/json':
+                    # parse body as json
+                    body = {
+                        "type": "json",
+                        "data": self._parse_json(body)
+                    }
+                elif content_type == 'text/plain':
                     # parse body as text
                     body = {
-                            "type": "text",
-                            "data": self._parse_text(body)
+                        "type": "text",
+                        "data": self._parse_text(body)
                     }
-            else:
+                elif content_type == 'multipart/form-data':
+                    # parse body as multipart
+                    body = {
+                        "type": "multipart",
+                        "data": self._parse_text(body)
+                    }
+
+                    logger.warning('Multipart form data is not supported yet')
+                    #boundary = self.headers['Content-Type'].split(';')[1].split('=')[1]
+                    #body = self._parse_multipart(body, boundary)
+                else:
+                    # parse body as text
+                    body = {
+                        "type": "text",
+                        "data": self._parse_text(body)
+                    }
+            except Exception as e:
+                logger.error(e)
                 # parse body as text
                 body = {
-                    "type": "text",
-                    "data": self._parse_text(body)
+                        "type": "text",
+                        "data": self._parse_text(body)
                 }
         else:
-            body = None
+            # parse body as text
+            body = {
+                "type": "text",
+                "data": self._parse_text(body)
+            }
 
-        self.body = body
+        return body
+
+    def _result(self):
+        """
+        Result of the parsed request
+
+        :return:
+        """
         return {
             'method': self.request_method['method'],
             'path': self.request_method['path'],
@@ -0,0 +1,432 @@
+import re
+from urllib.parse import unquote_plus
+
+from fatihserver.parsers.http_parser import HttpRequestParser
+
+
+class HttpParserError(Exception):
+    """
+    Raised when a request cannot be parsed.
+    `status_code` is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# headers the parser itself needs (lower case)
+_SPECIAL_HEADERS = frozenset(('content-length', 'connection', 'cookie', 'transfer-encoding', 'expect',
+                              'content-type'))
+
+# chunk size (hex digits only)
+_HEX = re.compile(rb'[0-9A-Fa-f]+')
+
+# states of the chunked transfer coding decoder
+_CHUNK_SIZE = 0
+_CHUNK_DATA = 1
+_CHUNK_DATA_END = 2
+_CHUNK_TRAILER = 3
+
+
+class IncrementalHttpRequestParser(HttpRequestParser):
+    """
+    Incremental (bytes level) HTTP request parser
+
+    One parser per connection: it is fed with the raw chunks (bytes, bytearray or
+    memoryview) as they arrive from the socket and hands out the requests once they
+    are complete. Pipelined requests stay in the buffer for the next call.
+
+        parser = IncrementalHttpRequestParser()
+        parser.feed(chunk)
+        result = parser.next_request()   # NEED_MORE_DATA until a request is complete
+
+    The request line and the headers are parsed in a single pass over the head,
+    the result has the same keys as HttpRequestParser.parse() plus `keep_alive`
+    and `body_bytes`.
+
+    The body is read according to `Content-Length` or decoded from the chunked
+    transfer coding. Heads over `max_header_size` bytes raise HttpParserError(431)
+    and bodies over `max_body_size` bytes raise HttpParserError(413).
+
+    Streaming: if `stream_body(result)` returns True for a request, next_request()
+    returns as soon as the head is parsed (`body` is None) and `streaming` is set.
+    Then the body must be read with read_body() until it is done, before the
+    next request can be parsed.
+    """
+    NEED_MORE_DATA = None
+
+    def __init__(self, max_header_size=65536, max_body_size=10 * 1024 * 1024, stream_body=None):
+        """
+        Initialize IncrementalHttpRequestParser class with size limits.
+        :param max_header_size: max. size of request line + headers (bytes)
+        :param max_body_size: max. size of the (decoded) body (bytes)
+        :param stream_body: callable, decides (by the parsed head) if the body is streamed
+        """
+        super().__init__()
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.stream_body = stream_body
+        self.buffer = bytearray()
+
+        # the body of the current request is read with read_body()
+        self.streaming = False
+
+        # where to continue searching for the end of the head
+        self._scan_from = 0
+
+        # the client waits for `100 Continue` before it sends the body
+        self.continue_expected = False
+
+        # head of the current request, when we are waiting for its body
+        self._head = None
+        self._content_length = None
+        self._chunked = False
+        self._keep_alive = False
+
+        # chunked transfer coding
+        self._chunk_state = _CHUNK_SIZE
+        self._chunk_left = 0
+        self._chunked_body = bytearray()
+        self._body_size = 0
+
+    def reset(self):
+        """
+        Forget the current request (the buffered data of the next requests is kept).
+        :return:
+        """
+        self.headers = {}
+        self.request_method = None
+        self.body = None
+        self.raw_body = None
+        self.query_params = None
+        self.continue_expected = False
+        self.streaming = False
+        self._head = None
+        self._content_length = None
+        self._chunked = False
+        self._keep_alive = False
+        self._chunk_state = _CHUNK_SIZE
+        self._chunk_left = 0
+        self._chunked_body = bytearray()
+        self._body_size = 0
+
+    def feed(self, data):
+        """
+        Add received data to the buffer.
+        :param data: bytes, bytearray or memoryview
+        :return:
+        """
+        self.buffer += data
+
+    def next_request(self):
+        """
+        Parse the next complete request in the buffer.
+        :return: the parsed request (dict) or NEED_MORE_DATA
+        """
+        if self._content_length is None:
+            if not self._parse_head():
+                return self.NEED_MORE_DATA
+
+            if self.stream_body is not None:
+                # completed with the body below if it is not streamed
+                result = self._head = self._result()
+                result['keep_alive'] = self._keep_alive
+
+                if self.stream_body(result):
+                    # the caller reads the body with read_body()
+                    self.streaming = True
+                    return result
+
+        if self._chunked:
+            if not self._parse_chunks(self._chunked_body):
+                return self.NEED_MORE_DATA
+
+            body = bytes(self._chunked_body)
+        else:
+            if len(self.buffer) < self._content_length:
+                return self.NEED_MORE_DATA
+
+            body = bytes(self.buffer[:self._content_length])
+            del self.buffer[:self._content_length]
+
+        self.body = self._decode_body(body.decode('utf-8', errors='replace')) if body else None
+
+        result = self._head
+        if result is None:
+            result = self._result()
+            result['keep_alive'] = self._keep_alive
+        else:
+            # the head was already given to stream_body (it can keep data in it, e.g. the route)
+            result['body'] = self.body
+            result['raw_body'] = self.raw_body
+
+        # undecoded body (binary uploads, Request.stream())
+        result['body_bytes'] = body
+
+        self.reset()
+        return result
+
+    def read_body(self):
+        """
+        Read the (decoded) body of a streamed request as it arrives.
+        :return: (chunk, done) - chunk is the data available now (it can be empty),
+            done is True when the body is complete (then the parser is reset)
+        """
+        if self._chunked:
+            chunk = bytearray()
+            done = self._parse_chunks(chunk)
+        else:
+            size = min(self._content_length, len(self.buffer))
+            chunk = self.buffer[:size]
+            del self.buffer[:size]
+
+            self._content_length -= size
+            done = self._content_length == 0
+
+        if done:
+            self.reset()
+
+        return bytes(chunk), done
+
+    def _parse_head(self):
+        """
+        Parse the request line and headers once the head is complete.
+        :return: False if the head is not complete yet
+        """
+        # clients may send empty lines between requests (RFC 7230, 3.5)
+        while self.buffer.startswith(b'\r\n'):
+            del self.buffer[:2]
+
+        end = self.buffer.find(b'\r\n\r\n', self._scan_from)
+        if end == -1:
+            if len(self.buffer) > self.max_header_size:
+                raise HttpParserError("Request header fields too large", 431)
+
+            # the terminator can be split between two chunks
+            self._scan_from = max(0, len(self.buffer) - 3)
+            return False
+
+        if end > self.max_header_size:
+            raise HttpParserError("Request header fields too large", 431)
+
+        head = self.buffer[:end].decode('latin-1')
+        del self.buffer[:end + 4]
+        self._scan_from = 0
+
+        request_line, _, header_lines = head.partition('\r\n')
+
+        # request line: method, request-target and version
+        parts = request_line.split(' ')
+        if len(parts) == 3:
+            method, target, version = parts
+        elif len(parts) == 2:
+            method, target = parts
+            version = ''
+        else:
+            raise HttpParserError(f"Invalid request line: {request_line!r}")
+
+        path = self._parse_target(target)
+
+        self.request_method = {
+            'method': method,
+            'path': path,
+            'version': version
+        }
+
+        content_length = None
+        transfer_encoding = None
+        connection = ''
+
+        # headers (single pass, every line is split only once)
+        if header_lines:
+            for line in header_lines.split('\r\n'):
+                key, separator, value = line.partition(':')
+                if not separator:
+                    raise HttpParserError(f"Invalid header line: {line!r}")
+
+                value = value.strip()
+
+                lower_key = key.lower()
+                if lower_key in _SPECIAL_HEADERS:
+                    if lower_key == 'content-length':
+                        # isdigit() alone also accepts non-ASCII digits ('²')
+                        if not value.isascii() or not value.isdigit():
+                            raise HttpParserError(f"Invalid Content-Length: {value!r}")
+
+                        # a proxy that reads another one of the values would frame the body differently
+                        if content_length is not None and content_length != int(value):
+                            raise HttpParserError("Conflicting Content-Length headers")
+                        content_length = int(value)
+                    elif lower_key == 'connection':
+                        connection = value.lower()
+                    elif lower_key == 'transfer-encoding':
+                        transfer_encoding = value.lower()
+                    elif lower_key == 'expect':
+                        self.continue_expected = value.lower() == '100-continue'
+                    elif lower_key == 'content-type':
+                        # header names are case-insensitive (HTTP/2 proxies send them lowercased),
+                        # the body is decoded by `Content-Type`
+                        key = 'Content-Type'
+                    else:
+                        # cookies are added to headers as a dictionary
+                        key = 'Cookie'
+                        value = self._parse_cookies(value)
+
+                self.headers[key] = value
+
+        # HTTP/1.1 connections are persistent unless the client says otherwise,
+        # HTTP/1.0 connections are closed unless the client asks for keep-alive
+        if version == 'HTTP/1.1':
+            self._keep_alive = connection != 'close'
+        else:
+            self._keep_alive = connection == 'keep-alive'
+
+        if transfer_encoding is not None:
+            # both headers: the request could be interpreted differently
+            # by a proxy in front of us (request smuggling), so reject it
+            if content_length is not None:
+                raise HttpParserError("Both Content-Length and Transfer-Encoding are set")
+
+            if transfer_encoding != 'chunked':
+                raise HttpParserError(f"Transfer-Encoding is not supported: {transfer_encoding}", 501)
+
+            self._chunked = True
+            content_length = 0
+        elif content_length is None:
+            content_length = 0
+        elif content_length > self.max_body_size:
+            raise HttpParserError("Request body too large", 413)
+
+        self._content_length = content_length
+        return True
+
+    def _parse_chunks(self, body):
+        """
+        Decode the chunked transfer coding (as much as the buffer has).
+        :param body: bytearray, the decoded data is appended to it
+        :return: False if the body is not complete yet
+        """
+        buffer = self.buffer
+
+        while True:
+            if self._chunk_state == _CHUNK_SIZE:
+                end = buffer.find(b'\r\n')
+                if end == -1:
+                    if len(buffer) > 1024:
+                        raise HttpParserError("Invalid chunk size line")
+                    return False
+
+                # chunk extensions (';name=value') are ignored
+                size, _, extensions = bytes(buffer[:end]).partition(b';')
+                del buffer[:end + 2]
+
+                if extensions:
+                    # whitespace is allowed before the extensions
+                    size = size.rstrip(b' \t')
+
+                # only hex digits: int(size, 16) would also accept '0x5', '+5', '1_0' and
+                # whitespace, a proxy in front of us could find another end of the body
+                if _HEX.fullmatch(size) is None:
+                    raise HttpParserError(f"Invalid chunk size: {size!r}")
+
+                self._chunk_left = int(size, 16)
+
+                if self._chunk_left == 0:
+                    self._chunk_state = _CHUNK_TRAILER
+                else:
+                    self._body_size += self._chunk_left
+                    if self._body_size > self.max_body_size:
+                        raise HttpParserError("Request body too large", 413)
+
+                    self._chunk_state = _CHUNK_DATA
+
+            elif self._chunk_state == _CHUNK_DATA:
+                if not buffer:
+                    return False
+
+                size = min(self._chunk_left, len(buffer))
+                body += buffer[:size]
+                del buffer[:size]
+                self._chunk_left -= size
+
+                if self._chunk_left == 0:
+                    self._chunk_state = _CHUNK_DATA_END
+
+            elif self._chunk_state == _CHUNK_DATA_END:
+                if len(buffer) < 2:
+                    return False
+
+                if buffer[:2] != b'\r\n':
+                    raise HttpParserError("Invalid chunk terminator")
+
+                del buffer[:2]
+                self._chunk_state = _CHUNK_SIZE
+
+            else:
+                # trailer fields are ignored, the body ends with an empty line
+                end = buffer.find(b'\r\n')
+                if end == -1:
+                    if len(buffer) > self.max_header_size:
+                        raise HttpParserError("Request header fields too large", 431)
+                    return False
+
+                del buffer[:end + 2]
+
+                if end == 0:
+                    return True
+
+    def _parse_target(self, target):
+        """
+        Parse request-target into path and query parameters.
+        :param target:
+        :return: path
+        """
+        # absolute uri (e.g. 'https://website.com/index'), keep the path only
+        if target.startswith(('http://', 'https://')):
+            slash = target.find('/', target.index('//') + 2)
+            target = target[slash:] if slash != -1 else '/'
+
+        path, _, query_string = target.partition('?')
+
+        if query_string:
+            self.query_params = self._parse_query_string(query_string)
+
+        return path or '/'
+
+    @staticmethod
+    def _parse_query_string(query_string):
+        """
+        Parse query string into a dictionary (values are url decoded).
+        :param query_string:
+        :return:
+        """
+        query_params = {}
+        for query in query_string.split('&'):
+            if not query:
+                continue
+
+            key, _, value = query.partition('=')
+
+            # decoding is slow, only do it when it is needed
+            if '%' in query or '+' in query:
+                key = unquote_plus(key)
+                value = unquote_plus(value)
+
+            query_params[key] = value
+
+        return query_params
+
+    @staticmethod
+    def _parse_cookies(value):
+        """
+        Parse 'Cookie' header into a dictionary.
+        :param value:
+        :return:
+        """
+        cookies = {}
+        for cookie in value.split(';'):
+            cookie_key, _, cookie_val = cookie.partition('=')
+            cookies[cookie_key.strip()] = cookie_val.strip()
+
+        return cookies
@@ -0,0 +1,510 @@
+"""
+Event-loop (asyncio) server for *FatihServer*
+
+ThreadedTCPServer spawns a thread for every connection, which does not scale
+beyond a few hundred clients. This server multiplexes all connections on a
+single asyncio event loop (Protocol/transport based) and drives the same
+RequestHandler, parser and router as the threaded server.
+
+`async def` route functions are awaited on the loop. Plain functions run
+inline on the loop, so they should not block for long.
+"""
+
+import asyncio
+import inspect
+import socket
+
+from loguru import logger
+
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser, HttpParserError
+from fatihserver.server.request_body import RequestBody
+from fatihserver.server.request_handler import RequestHandler, StreamingResponse, FileResponse
+
+
+class HttpProtocol(asyncio.Protocol):
+    """
+    asyncio protocol for one client connection
+
+    An idle connection only costs this object and its parser (small buffer),
+    so we can keep many keep-alive connections open.
+    """
+    # reading is paused while a streamed body has this many unread bytes
+    body_high_water = 256 * 1024
+
+    def __init__(self,
+                 router,
+                 keep_alive_timeout=5,
+                 max_keep_alive_requests=100,
+                 connections=None,
+                 max_header_size=65536,
+                 max_body_size=10 * 1024 * 1024,
+                 spill_threshold=RequestBody.SPILL_THRESHOLD,
+                 compression_level=6,
+                 compression_min_size=1024):
+        """
+        Initialize HttpProtocol class with router.
+        :param router:
+        :param keep_alive_timeout: idle connections are closed after this many seconds
+        :param max_keep_alive_requests: the connection is closed after this many requests
+        :param connections: set of open connections (of the server), the protocol adds/removes itself
+        :param max_header_size: see IncrementalHttpRequestParser
+        :param max_body_size: see IncrementalHttpRequestParser
+        :param spill_threshold: see RequestBody
+        :param compression_level: see RequestHandler
+        :param compression_min_size: see RequestHandler
+        """
+        self.router = router
+        self.connections = connections
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.handler = None
+        self.transport = None
+        self.parser = IncrementalHttpRequestParser(max_header_size=max_header_size, max_body_size=max_body_size)
+        self.spill_threshold = spill_threshold
+        self.compression_level = compression_level
+        self.compression_min_size = compression_min_size
+        self.requests = 0
+        self.idle_timer = None
+
+        # streamed request body: the route function waits for data
+        self.body_waiter = None
+        self.reading_paused = False
+
+        # response of an `async def` route function (or a streaming response) that is still running
+        self.pending = None
+
+        # flow control of streaming responses (see pause_writing)
+        self.drain_waiter = None
+
+    def connection_made(self, transport):
+        """
+        Called by the event loop when a client connects.
+        :param transport:
+        :return:
+        """
+        self.transport = transport
+
+        if self.connections is not None:
+            self.connections.add(self)
+
+        # One handler per connection (same as the threaded server)
+        self.handler = RequestHandler(self.router,
+                                      await_coroutines=True,
+                                      compression_level=self.compression_level,
+                                      compression_min_size=self.compression_min_size)
+        self.handler.client_address = transport.get_extra_info('peername')
+        self.handler.setup()
+
+        self.parser.stream_body = self.handler.stream_body_callback()
+
+        self._reset_idle_timer()
+
+    def connection_lost(self, exc):
+        """
+        Called by the event loop when the connection is closed.
+        :param exc:
+        :return:
+        """
+        self.transport = None
+        self.parser = None
+
+        if self.connections is not None:
+            self.connections.discard(self)
+
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+        self._wake_body()
+        self.resume_writing()
+
+    def pause_writing(self):
+        """
+        Called by the transport when its write buffer is full.
+        :return:
+        """
+        if self.drain_waiter is None:
+            self.drain_waiter = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        """
+        Called by the transport when its write buffer is drained.
+        :return:
+        """
+        if self.drain_waiter is not None:
+            if not self.drain_waiter.done():
+                self.drain_waiter.set_result(None)
+            self.drain_waiter = None
+
+    def _reset_idle_timer(self):
+        """
+        (Re)start the keep-alive idle timer.
+        :return:
+        """
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+
+        loop = asyncio.get_running_loop()
+        self.idle_timer = loop.call_later(self.keep_alive_timeout, self._idle_timeout)
+
+    def _idle_timeout(self):
+        """
+        Close the connection if it is idle (a running route function is not idle).
+        :return:
+        """
+        self.idle_timer = None
+
+        if self.transport is None:
+            return
+
+        if self.pending is not None:
+            self._reset_idle_timer()
+            return
+
+        logger.debug(f"Closing idle connection {self.handler.client_address}")
+        self.transport.close()
+
+    def data_received(self, data):
+        """
+        Called by the event loop whenever data arrives on the socket.
+        :param data:
+        :return:
+        """
+        self._reset_idle_timer()
+
+        self.parser.feed(data)
+
+        if self.parser.streaming:
+            # a route function is reading the body (see _receive_body)
+            self._wake_body()
+
+            if len(self.parser.buffer) > self.body_high_water and not self.reading_paused:
+                # the route function is slower than the client
+                self.reading_paused = True
+                self.transport.pause_reading()
+            return
+
+        # requests are answered in order, so pipelined requests
+        # wait until the pending coroutine handler is done
+        if self.pending is None:
+            self._process_buffer()
+
+    def _process_buffer(self):
+        """
+        Answer every complete request in the buffer (in order).
+        :return:
+        """
+        while self.transport is not None:
+            try:
+                result = self.parser.next_request()
+            except HttpParserError as e:
+                # we cannot tell where the request ends, so the connection is closed
+                self._write(self.handler.parser_error(e), False)
+                return
+
+            if result is self.parser.NEED_MORE_DATA:
+                if self.parser.continue_expected:
+                    # the client waits for our go before it sends the body
+                    self.parser.continue_expected = False
+                    self.transport.write(RequestHandler.CONTINUE)
+
+                # wait for more data
+                return
+
+            keep_alive = result['keep_alive']
+            version = result['version']
+
+            self.requests += 1
+            if self.requests >= self.max_keep_alive_requests:
+                keep_alive = False
+
+            body = None
+            if self.parser.streaming:
+                # the route function reads the body as it arrives (Request.stream())
+                body = RequestBody(self.parser, self._receive_body, self.spill_threshold)
+                result['body_stream'] = body
+
+            response = self.handler.process(result)
+
+            if inspect.isawaitable(response):
+                # `async def` route function, await it without blocking the loop
+                self.pending = asyncio.ensure_future(self._write_when_done(response, keep_alive, body, version))
+                return
+
+            if body is not None:
+                # the body is not read (e.g. 503), we cannot wait for it here
+                keep_alive = False
+
+            if not self._write(response, keep_alive, version):
+                return
+
+    async def _write_when_done(self, response, keep_alive, body=None, version='HTTP/1.1'):
+        """
+        Await the response of a coroutine route function, write it and
+        continue with the buffered (pipelined) requests.
+        :param response:
+        :param keep_alive:
+        :param body: RequestBody of a streamed request
+        :param version: HTTP version of the request
+        :return:
+        """
+        response = await response
+
+        # the unread part of the body is skipped (or the connection is closed)
+        if body is not None and not await body.adiscard():
+            keep_alive = False
+
+        if self.reading_paused and self.transport is not None:
+            self.reading_paused = False
+            self.transport.resume_reading()
+
+        self.pending = None
+
+        if self.transport is None:
+            # the client is gone, the open file of the response is not sent
+            if isinstance(response, FileResponse):
+                response.close()
+            return
+
+        if self._write(response, keep_alive, version):
+            self._process_buffer()
+
+    async def _receive_body(self):
+        """
+        Wait for more data of a streamed request body (RequestBody calls it).
+        :return: False if the connection is closed (or idle for too long)
+        """
+        if self.transport is None:
+            return False
+
+        if self.parser.continue_expected:
+            # the client waits for our go before it sends the body
+            self.parser.continue_expected = False
+            self.transport.write(RequestHandler.CONTINUE)
+
+        if self.reading_paused:
+            self.reading_paused = False
+            self.transport.resume_reading()
+
+        self.body_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.body_waiter, self.keep_alive_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.body_waiter = None
+
+        return self.transport is not None
+
+    def _wake_body(self):
+        """
+        Wake up the route function waiting in _receive_body.
+        :return:
+        """
+        if self.body_waiter is not None and not self.body_waiter.done():
+            self.body_waiter.set_result(None)
+
+    def _write(self, response, keep_alive, version='HTTP/1.1'):
+        """
+        Write the response and close the connection if needed.
+        :param response:
+        :param keep_alive:
+        :param version: HTTP version of the request
+        :return: True if the connection is still open (and the next request can be answered)
+        """
+        keep_alive = RequestHandler.keep_alive(response, keep_alive, version)
+
+        if isinstance(response, (StreamingResponse, FileResponse)):
+            # written as it is generated (or sent), the next requests wait for it
+            self.pending = asyncio.ensure_future(self._write_stream(response, keep_alive))
+            return False
+
+        # transports that support it write the buffers with sendmsg()
+        self.transport.writelines(response.as_buffers(keep_alive))
+
+        if not keep_alive:
+            self.transport.close()
+            return False
+
+        return True
+
+    async def _write_stream(self, response, keep_alive):
+        """
+        Write a StreamingResponse chunk by chunk (or send a FileResponse) and
+        continue with the buffered (pipelined) requests.
+        :param response:
+        :param keep_alive:
+        :return:
+        """
+        try:
+            self.transport.write(response.head_as_bytes())
+
+            if isinstance(response, FileResponse):
+                for part_head, offset, length in response.parts:
+                    if self.transport is None:
+                        raise ConnectionError("Connection is closed")
+
+                    if part_head:
+                        self.transport.write(part_head)
+
+                    if length > 0:
+                        # zero-copy with os.sendfile (asyncio falls back to reading the file)
+                        await asyncio.get_running_loop().sendfile(self.transport, response.file, offset, length)
+            else:
+                async for frame in response.aframes():
+                    if self.transport is None:
+                        raise ConnectionError("Connection is closed")
+
+                    self.transport.write(frame)
+
+                    # wait while the client is slower than the generator
+                    if self.drain_waiter is not None:
+                        await self.drain_waiter
+        except Exception as e:
+            # the head is already sent, so we cannot answer 500 anymore
+            logger.error(f"Streaming response is aborted: {e}")
+            keep_alive = False
+        finally:
+            self.pending = None
+
+            if isinstance(response, FileResponse):
+                response.close()
+
+        if self.transport is None:
+            return
+
+        if not keep_alive:
+            self.transport.close()
+            return
+
+        self._process_buffer()
+
+
+class AsyncTCPServer:
+    """
+    Event-loop based TCP server (alternative to ThreadedTCPServer)
+
+    It provides the parts of the socketserver.TCPServer API that HttpServer
+    uses (server_address, serve_forever, shutdown, server_close, context manager).
+    """
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    allow_reuse_port = False
+
+    # Persistent connections (HttpServer overrides them)
+    keep_alive_timeout = 5
+    max_keep_alive_requests = 100
+
+    # seconds to wait for running coroutine route functions on shutdown
+    graceful_timeout = 30
+
+    # request size limits (HttpServer overrides them)
+    max_header_size = 65536
+    max_body_size = 10 * 1024 * 1024
+
+    # streamed request bodies: spool() keeps this many bytes in memory
+    spill_threshold = 1024 * 1024
+
+    # compression of dynamic responses (HttpServer overrides them)
+    compression_level = 6
+    compression_min_size = 1024
+
+    def __init__(self, server_address, router):
+        """
+        Initialize AsyncTCPServer class with server address and router.
+        The socket is bound right away (like TCPServer does).
+        :param server_address:
+        :param router:
+        """
+        self.router = router
+        self.loop = None
+        self.connections = set()
+        self._stop = None
+        self._shutdown_request = False
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        if self.allow_reuse_address:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        if self.allow_reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        self.socket.bind(server_address)
+        self.socket.listen(self.request_queue_size)
+        self.socket.setblocking(False)
+
+        self.server_address = self.socket.getsockname()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self):
+        """
+        Run the event loop until shutdown() is called.
+        :return:
+        """
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """
+        Serve connections on the running event loop.
+        :return:
+        """
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+
+        if self._shutdown_request:
+            return
+
+        server = await self.loop.create_server(self._create_protocol, sock=self.socket)
+
+        async with server:
+            await self._stop.wait()
+
+        # Graceful shutdown: the listening socket is closed,
+        # wait for the running coroutine route functions ...
+        pending = [connection.pending for connection in self.connections if connection.pending is not None]
+        if pending:
+            await asyncio.wait(pending, timeout=self.graceful_timeout)
+
+        # ... and close the (idle) connections
+        for connection in list(self.connections):
+            if connection.transport is not None:
+                connection.transport.close()
+
+    def _create_protocol(self):
+        """
+        Protocol factory for the event loop.
+        :return:
+        """
+        return HttpProtocol(self.router,
+                            self.keep_alive_timeout,
+                            self.max_keep_alive_requests,
+                            self.connections,
+                            self.max_header_size,
+                            self.max_body_size,
+                            self.spill_threshold,
+                            self.compression_level,
+                            self.compression_min_size)
+
+    def shutdown(self):
+        """
+        Stop serve_forever() (thread-safe).
+        :return:
+        """
+        self._shutdown_request = True
+
+        if self.loop is not None and self._stop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+
+    def server_close(self):
+        """
+        Close the listening socket.
+        :return:
+        """
+        self.socket.close()
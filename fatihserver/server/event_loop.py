@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+from loguru import logger
+
+
+class SharedEventLoop:
+    """
+    A long-lived asyncio event loop running in a background (daemon) thread.
+
+    The threaded server uses it to execute `async def` route handlers:
+    worker threads submit the coroutine to this loop instead of creating
+    a new loop per request (`asyncio.run`), so all coroutines share one loop.
+    """
+    # instance
+    _instance = None
+
+    # lock for thread safety
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                # Another thread could have created the instance
+                # before we acquired the lock. So check that the
+                # instance is still nonexistent.
+                if not cls._instance:
+                    instance = super().__new__(cls)
+                    instance.loop = asyncio.new_event_loop()
+                    instance.thread = threading.Thread(target=instance._run,
+                                                       name="FatihServer-EventLoop",
+                                                       daemon=True)
+                    instance.thread.start()
+
+                    cls._instance = instance
+        return cls._instance
+
+    def _run(self):
+        """
+        Run the loop forever (in the background thread).
+        :return:
+        """
+        asyncio.set_event_loop(self.loop)
+        logger.debug("Shared event loop has started")
+        self.loop.run_forever()
+
+    def run(self, coroutine):
+        """
+        Run the coroutine on the shared loop and wait for its result.
+        (must not be called from the loop thread itself)
+        :param coroutine:
+        :return:
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
@@ -1,7 +1,8 @@
 import threading
 
-from fatihserver.server.tcp import ThreadedTCPServer
-from fatihserver.server.request_handler import RequestHandler
+from fatihserver.server.tcp import ThreadedTCPServer, PooledTCPServer
+from fatihserver.server.async_server import AsyncTCPServer
+from fatihserver.server.request_handler import RequestHandler, HttpResult, Session
 
 from fatihserver.framework.router import HttpRouter
 
@@ -16,25 +17,106 @@ class HttpServer:
         TODO: Add support for HTTPS
         TODO: Add more HTTP methods
         TODO: Add static file serving
-        TODO: Add support for middlewares
         (Also, there are TODOs in the request_handler.py)
+
+    Backends:
+        - "threaded": socketserver based, one thread per connection (default)
+        - "pool": socketserver based, bounded pool of worker threads with a bounded
+                  connection queue (503 when the queue is full)
+        - "asyncio": asyncio event loop, all connections on a single thread
     """
-    def __init__(self, router=None, host="localhost", port=8080):
+    BACKENDS = ('threaded', 'pool', 'asyncio')
+
+    def __init__(self,
+                 router=None,
+                 host="localhost",
+                 port=8080,
+                 backend="threaded",
+                 keep_alive_timeout=5,
+                 max_keep_alive_requests=100,
+                 min_workers=4,
+                 max_workers=64,
+                 queue_size=128,
+                 reuse_port=False,
+                 graceful_timeout=30,
+                 max_header_size=65536,
+                 max_body_size=10 * 1024 * 1024,
+                 spill_threshold=1024 * 1024,
+                 static_cache_size=64 * 1024 * 1024,
+                 static_inline_size=64 * 1024,
+                 compression_level=6,
+                 compression_min_size=1024,
+                 error_pages=None,
+                 session_store=None,
+                 session_sweep_interval=60):
         """
         Initialize HttpServer class with router, host and port.
         :param router:
         :param host:
         :param port:
+        :param backend: "threaded" or "asyncio"
+        :param keep_alive_timeout: idle persistent connections are closed after this many seconds
+        :param max_keep_alive_requests: a persistent connection is closed after this many requests
+        :param min_workers: "pool" backend, workers that are always running
+        :param max_workers: "pool" backend, upper bound of worker threads
+        :param queue_size: "pool" backend, max. number of connections waiting for a worker
+        :param reuse_port: bind with SO_REUSEPORT (several processes can listen on the same port)
+        :param graceful_timeout: on stop(), seconds to wait for the requests in progress
+        :param max_header_size: requests with bigger heads get `431 Request Header Fields Too Large`
+        :param max_body_size: requests with bigger bodies get `413 Content Too Large`
+        :param spill_threshold: streamed request bodies (see RequestBody.spool) bigger than
+            this are spilled to a temporary file
+        :param static_cache_size: byte budget of the static file cache (see StaticFileCache)
+        :param static_inline_size: static files up to this size are kept in memory,
+            larger files are sent from the disk
+        :param compression_level: gzip level of dynamic responses (1-9, 0 disables it),
+            static files are compressed once with the best level
+        :param compression_min_size: dynamic responses smaller than this are not compressed
+        :param error_pages: custom bodies of the error responses by status code (see HttpResult.compile()),
+            they are set for the whole process when the server starts (servers of a process share them)
+        :param session_store: SessionStore of the sessions (None: the default MemorySessionStore,
+            sessions expire after 30 minutes without requests or 24 hours, at most 100000 sessions),
+            it is set for the whole process when the server starts
+        :param session_sweep_interval: expired sessions are removed every this many seconds
         """
+        if backend not in self.BACKENDS:
+            raise Exception(f"Unknown server backend: {backend}. Available backends: {', '.join(self.BACKENDS)}")
+
+        if not 0 <= compression_level <= 9:
+            raise Exception(f"Compression level must be between 0 and 9: {compression_level}")
+
         self.host = host
         self.port = port
+        self.backend = backend
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.reuse_port = reuse_port
+        self.graceful_timeout = graceful_timeout
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.spill_threshold = spill_threshold
+        self.compression_level = compression_level
+        self.compression_min_size = compression_min_size
+        self.error_pages = error_pages
+        self.session_store = session_store
+        self.session_sweep_interval = session_sweep_interval
         self.server = None
 
+        # stop() was called before serve() set `server` (e.g. SIGTERM while a pre-fork worker starts)
+        self._stop_requested = False
+        self._stop_lock = threading.Lock()
+
         if router is None:
             self.router = HttpRouter()
         else:
             self.router = router
 
+        self.router.STATIC_CACHE.max_size = static_cache_size
+        self.router.STATIC_CACHE.inline_size = static_inline_size
+
     def add_route(self, path, handler):
         """
         Add route to router.
@@ -44,45 +126,120 @@ class HttpServer:
         """
         self.router.add_route(path, handler)
 
-    def start(self):
+    def create_server(self):
         """
-        Start the server.
+        Create the server of the configured backend (the listening socket is bound here).
         :return:
         """
-        self.router.serve_static_files()
+        if self.backend == 'asyncio':
+            AsyncTCPServer.allow_reuse_port = self.reuse_port
+
+            server = AsyncTCPServer((self.host, self.port), self.router)
+
+            # per server (several servers can run in one process)
+            server.compression_level = self.compression_level
+            server.compression_min_size = self.compression_min_size
+        elif self.backend == 'pool':
+            PooledTCPServer.allow_reuse_address = True
+            PooledTCPServer.allow_reuse_port = self.reuse_port
+
+            server = PooledTCPServer((self.host, self.port), self._request_handler(),
+                                     min_workers=self.min_workers,
+                                     max_workers=self.max_workers,
+                                     queue_size=self.queue_size)
+        else:
+            # We need to set allow_reuse_address to True because we want to be able to restart the server
+            ThreadedTCPServer.allow_reuse_address = True
+            ThreadedTCPServer.allow_reuse_port = self.reuse_port
+
+            server = ThreadedTCPServer((self.host, self.port), self._request_handler())
 
-        # We need to set allow_reuse_address to True because we want to be able to restart the server
-        ThreadedTCPServer.allow_reuse_address = True
+        server.keep_alive_timeout = self.keep_alive_timeout
+        server.max_keep_alive_requests = self.max_keep_alive_requests
+        server.graceful_timeout = self.graceful_timeout
+        server.max_header_size = self.max_header_size
+        server.max_body_size = self.max_body_size
+        server.spill_threshold = self.spill_threshold
 
-        # Create server
-        server = ThreadedTCPServer((self.host, self.port), RequestHandler(self.router))
+        return server
+
+    def _request_handler(self):
+        """
+        RequestHandler of the socketserver based backends.
+        :return:
+        """
+        return RequestHandler(self.router,
+                              compression_level=self.compression_level,
+                              compression_min_size=self.compression_min_size)
 
+    def serve(self, server):
+        """
+        Serve with a server created by create_server() (blocks until stop() is called).
+        :param server:
+        :return:
+        """
         # Get server address
         ip, port = server.server_address
-        logger.info("🚀 FatihServer has launched at http://{}:{}".format(ip, port))
+        logger.info("🚀 FatihServer has launched at http://{}:{} ({})".format(ip, port, self.backend))
 
         # Set server
-        self.server = server
+        with self._stop_lock:
+            self.server = server
+            stop_requested, self._stop_requested = self._stop_requested, False
+
+        if stop_requested:
+            server.server_close()
+            logger.info("Server stopped")
+            return
+
+        # Expired sessions are removed in the background (in every process of the pre-fork mode),
+        # the sweeper of a store shared by several servers runs until the last of them stops
+        store = Session.STORE
+        store.start_sweeper(self.session_sweep_interval)
+
+        # Serve forever (returns after stop() when the requests in progress are answered)
+        try:
+            with server:
+                server.serve_forever()
+        finally:
+            store.stop_sweeper()
 
-        # Serve forever
-        with server:
-            # Start a thread with the server -- that thread will then start one
-            # more thread for each request
-            server_thread = threading.Thread(target=server.serve_forever())
+    def start(self):
+        """
+        Start the server.
+        :return:
+        """
+        self.prepare()
 
-            # Exit the server thread when the main thread terminates
-            server_thread.daemon = True
+        self.serve(self.create_server())
 
-            # Start the server thread
-            server_thread.start()
+    def prepare(self):
+        """
+        Prepare the router and the responses for serving (the route tables are frozen,
+        the error responses are encoded).
+        :return:
+        """
+        self.router.freeze()
+        self.router.serve_static_files()
 
-            logger.info("Spawned Thread: ", server_thread.name)
+        # the sessions are shared by the process like the error pages (set only if a store is given)
+        if self.session_store is not None:
+            Session.STORE = self.session_store
 
+        # the canned responses are shared by the process, a server without error pages resets them
+        HttpResult.compile(self.error_pages)
 
     def stop(self):
         """
         Stop the server.
         :return:
         """
-        self.server.shutdown()
+        with self._stop_lock:
+            server = self.server
+            if server is None:
+                # not serving yet, serve() returns at once
+                self._stop_requested = True
+                return
+
+        server.shutdown()
         logger.info("Server stopped")
@@ -0,0 +1,170 @@
+"""
+Pre-fork (multi-process) mode for *FatihServer*
+
+Because of the GIL, one process can only use one CPU core. The supervisor
+forks N worker processes that serve the same port, either by sharing the
+listening socket created before fork() or by binding their own socket with
+SO_REUSEPORT (then the kernel balances the connections between them).
+
+The supervisor restarts crashed workers and forwards SIGTERM/SIGINT to the
+workers, which stop accepting connections and answer the requests in progress
+before they exit (graceful drain).
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from traceback import print_exc
+
+from loguru import logger
+
+
+class PreforkSupervisor:
+    """
+    Supervisor of the pre-forked worker processes
+    """
+    # A worker that crashes within this many seconds after it has started
+    # is restarted with a delay (so a broken app does not fork in a loop)
+    min_worker_lifetime = 1
+    restart_delay = 1
+
+    def __init__(self, http_server, workers, reuse_port=False):
+        """
+        Initialize PreforkSupervisor class with the server and number of workers.
+        :param http_server: HttpServer instance (it is not started yet)
+        :param workers: number of worker processes
+        :param reuse_port: every worker binds its own socket with SO_REUSEPORT
+            (otherwise the listening socket is created once and shared)
+        """
+        if not hasattr(os, 'fork'):
+            raise Exception("Pre-fork mode needs os.fork(), it is only available on POSIX systems.")
+
+        if workers < 1:
+            raise Exception(f"Number of workers must be at least 1: {workers}")
+
+        if reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+            raise Exception("SO_REUSEPORT is not supported on this platform.")
+
+        self.http_server = http_server
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.server = None
+        self.children = {}
+        self.stopping = False
+
+    def run(self):
+        """
+        Fork the workers and supervise them until SIGTERM/SIGINT.
+        :return:
+        """
+        # Loaded once in the supervisor, workers share the memory (copy-on-write)
+        self.http_server.prepare()
+
+        if self.reuse_port:
+            self.http_server.reuse_port = True
+        else:
+            # one listening socket, inherited by every worker
+            self.server = self.http_server.create_server()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        logger.info(f"Supervisor {os.getpid()} is starting {self.workers} workers")
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        while self.children:
+            if self.stopping:
+                logger.info("Supervisor is stopping the workers")
+
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            started_at = self.children.pop(pid, None)
+            if started_at is None:
+                continue
+
+            if self.stopping:
+                logger.info(f"Worker {pid} has stopped")
+                continue
+
+            logger.warning(f"Worker {pid} has died (status: {status}), restarting it")
+
+            if time.monotonic() - started_at < self.min_worker_lifetime:
+                time.sleep(self.restart_delay)
+
+            if not self.stopping:
+                self._spawn()
+
+        if self.server is not None:
+            self.server.server_close()
+
+        logger.info("Supervisor has stopped")
+
+    def _spawn(self):
+        """
+        Fork a worker process.
+        :return:
+        """
+        pid = os.fork()
+
+        if pid == 0:
+            self._worker()
+        else:
+            self.children[pid] = time.monotonic()
+            logger.info(f"Worker {pid} has started")
+
+    def _worker(self):
+        """
+        Worker process: serve until SIGTERM, then exit (it never returns).
+        :return:
+        """
+        exit_code = 0
+
+        try:
+            self.children = {}
+
+            # stop() blocks until serve_forever returns,
+            # so it cannot be called from the signal handler itself
+            signal.signal(signal.SIGTERM,
+                          lambda signum, frame: threading.Thread(target=self.http_server.stop).start())
+
+            # Ctrl+C reaches every process of the group, the supervisor forwards it as SIGTERM
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+            server = self.server
+            if server is None:
+                server = self.http_server.create_server()
+
+            self.http_server.serve(server)
+        except Exception:
+            print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _stop(self, signum, frame):
+        """
+        Signal handler of the supervisor, forwards SIGTERM to the workers.
+        :param signum:
+        :param frame:
+        :return:
+        """
+        if self.stopping:
+            return
+
+        self.stopping = True
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
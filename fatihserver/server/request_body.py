@@ -0,0 +1,229 @@
+"""
+Streaming request bodies for *FatihServer*
+
+By default the body of a request is read completely before the route function
+is called (`Request.body` / `Request.raw_body`). Routes registered with
+`stream=True` get the body as it arrives from the socket instead, so uploads
+can be written to disk or hashed with constant memory:
+
+    @router.post("/upload", stream=True)
+    def upload(request: Request):
+        with open("upload.bin", "wb") as f:
+            for chunk in request.stream():
+                f.write(chunk)
+
+On the asyncio backend the route function must be `async def` and read the
+body with `async for chunk in request.stream()`.
+"""
+
+import asyncio
+import tempfile
+
+from fatihserver.parsers.incremental_parser import HttpParserError
+
+
+class RequestBody:
+    """
+    Body of a streamed request (chunks are yielded as they arrive)
+
+    The body can only be read once. spool() reads the whole body into a
+    SpooledTemporaryFile, which is kept in memory up to `spill_threshold` bytes
+    and spilled to a temporary file above that.
+    """
+    # default of `spill_threshold` (HttpServer overrides it)
+    SPILL_THRESHOLD = 1024 * 1024
+
+    def __init__(self, parser, receive, spill_threshold=SPILL_THRESHOLD):
+        """
+        Initialize RequestBody class with the parser of the connection.
+        :param parser: IncrementalHttpRequestParser in `streaming` state
+        :param receive: feeds more data to the parser, returns False if the
+            connection is closed (a coroutine function on the asyncio backend)
+        :param spill_threshold: spool() keeps this many bytes in memory
+        """
+        self.parser = parser
+        self.receive = receive
+        self.spill_threshold = spill_threshold
+        self.is_async = receive is not None and asyncio.iscoroutinefunction(receive)
+
+        self.started = False
+        self.done = False
+        self.error = None
+
+    def __iter__(self):
+        if self.is_async:
+            raise Exception("The request body must be read with `async for` on the asyncio backend.")
+
+        self._start()
+
+        while not self.done:
+            chunk = self._read()
+            if chunk:
+                yield chunk
+
+    async def __aiter__(self):
+        self._start()
+
+        if self.is_async:
+            while not self.done:
+                chunk = await self._aread()
+                if chunk:
+                    yield chunk
+        else:
+            # threaded server: the socket is blocking, read it in the executor
+            # so the (shared) event loop is not blocked
+            loop = asyncio.get_running_loop()
+
+            while not self.done:
+                chunk = await loop.run_in_executor(None, self._read)
+                if chunk:
+                    yield chunk
+
+    def spool(self):
+        """
+        Read the whole body into a file object (rewound).
+        :return: SpooledTemporaryFile
+        """
+        file = tempfile.SpooledTemporaryFile(max_size=self.spill_threshold)
+
+        for chunk in self:
+            file.write(chunk)
+
+        file.seek(0)
+        return file
+
+    async def aspool(self):
+        """
+        Read the whole body into a file object (rewound), see spool().
+        :return: SpooledTemporaryFile
+        """
+        file = tempfile.SpooledTemporaryFile(max_size=self.spill_threshold)
+
+        async for chunk in self:
+            file.write(chunk)
+
+        file.seek(0)
+        return file
+
+    def discard(self):
+        """
+        Skip the unread part of the body, so the next request of the connection can be parsed.
+        A client that waits for `100 Continue` is not asked to send a body nobody reads
+        (e.g. the route is rejected with 503), the connection is closed after the response.
+        :return: False if the body cannot be read (then the connection must be closed)
+        """
+        if self.error is not None or self.parser.continue_expected:
+            return False
+
+        try:
+            while not self.done:
+                self._read()
+        except (HttpParserError, ConnectionError):
+            return False
+
+        return True
+
+    async def adiscard(self):
+        """
+        Skip the unread part of the body, see discard().
+        :return: False if the body cannot be read (then the connection must be closed)
+        """
+        if self.error is not None or self.parser.continue_expected:
+            return False
+
+        try:
+            while not self.done:
+                await self._aread()
+        except (HttpParserError, ConnectionError):
+            return False
+
+        return True
+
+    def _start(self):
+        """
+        Check that the body is read only once.
+        :return:
+        """
+        if self.started:
+            raise Exception("The request body can only be read once.")
+
+        self.started = True
+
+    def _parse(self):
+        """
+        Take the decoded body data that the parser has (no I/O).
+        :return:
+        """
+        if self.error is not None:
+            raise self.error
+
+        try:
+            chunk, self.done = self.parser.read_body()
+        except HttpParserError as e:
+            self.error = e
+            raise
+
+        return chunk
+
+    def _read(self):
+        """
+        Take the available body data or wait for more (blocking).
+        :return:
+        """
+        chunk = self._parse()
+
+        if not chunk and not self.done and not self.receive():
+            self._connection_closed()
+
+        return chunk
+
+    async def _aread(self):
+        """
+        Take the available body data or wait for more.
+        :return:
+        """
+        chunk = self._parse()
+
+        if not chunk and not self.done and not await self.receive():
+            self._connection_closed()
+
+        return chunk
+
+    def _connection_closed(self):
+        self.error = ConnectionError("Connection closed before the request body was received")
+        raise self.error
+
+
+class BufferedRequestBody(RequestBody):
+    """
+    Body of a request that is already read (routes without `stream=True`),
+    it is yielded as a single chunk
+    """
+
+    def __init__(self, data, spill_threshold=RequestBody.SPILL_THRESHOLD):
+        """
+        Initialize BufferedRequestBody class with the body.
+        :param data: bytes
+        :param spill_threshold:
+        """
+        super().__init__(None, None, spill_threshold)
+        self.data = data
+        self.done = True
+
+    def __iter__(self):
+        self._start()
+
+        if self.data:
+            yield self.data
+
+    async def __aiter__(self):
+        self._start()
+
+        if self.data:
+            yield self.data
+
+    def discard(self):
+        return True
+
+    async def adiscard(self):
+        return True
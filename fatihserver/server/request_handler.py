@@ -9,51 +9,143 @@ Note: This is a simple web server that I developed for my own website (for fun a
 """
 
 import asyncio
+import gzip
 import json
+import mmap
+import os
+import secrets
+import socket
 import socketserver
 import sys
-from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from types import MappingProxyType
+from http import HTTPStatus
 from socketserver import BaseRequestHandler
 import threading
-from hashlib import sha256
 from traceback import print_exc
 import inspect
-from typing import get_type_hints
 
-from fatihserver.parsers.http_parser import HttpRequestParser
-import mimetypes
+from fatihserver.framework.static_cache import is_compressible
+from fatihserver.framework.validation import ValidationError
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser, HttpParserError
+from fatihserver.server.request_body import RequestBody, BufferedRequestBody
+from fatihserver.server.event_loop import SharedEventLoop
+from fatihserver.server.session_store import MemorySessionStore
 
 from loguru import logger
 
+# reason phrases of RFC 9110 (HTTPStatus has older ones for these codes)
+REASON_PHRASES = {
+    413: 'Content Too Large',
+    416: 'Range Not Satisfiable',
+    422: 'Unprocessable Content',
+}
+
+# encoded status lines of the standard status codes (the serializer only looks them up)
+STATUS_LINES = {
+    status.value: f"HTTP/1.1 {status.value} {REASON_PHRASES.get(status.value, status.phrase)}\r\n".encode('latin-1')
+    for status in HTTPStatus
+}
+
+
+def status_line(status_code):
+    """
+    Encoded status line of a status code.
+    :param status_code:
+    :return:
+    """
+    line = STATUS_LINES.get(status_code)
+    if line is None:
+        line = f"HTTP/1.1 {status_code} Unknown\r\n".encode('latin-1')
+
+    return line
+
 
 class HttpResult:
     """
     HttpResult class for FatihServer
 
     Contains status code, headers and body for many HTTP status codes
+
+    The error responses are CannedResponses: they are encoded once (see compile())
+    and shared by the requests, so answering an error does not create a Response
+    (nor a Session). They cannot be changed, use `copy()` to get a Response.
     """
+    # status codes of the canned error responses
+    ERROR_CODES = (400, 403, 404, 405, 413, 431, 500, 501, 503)
 
-    @staticmethod
-    def r404():
-        response = Response(status_code=404, body="Not Found")
-        response.set_header("Content-Type", "text/plain")
+    # status code: CannedResponse (see compile())
+    CANNED = {}
 
-        return response
+    # (status code, `Allow` header): CannedResponse (405 and OPTIONS responses)
+    ALLOWED = {}
 
-    @staticmethod
-    def r500():
-        response = Response(status_code=500, body="Internal Server Error")
-        response.set_header("Content-Type", "text/plain")
+    @classmethod
+    def compile(cls, error_pages=None):
+        """
+        Build the canned error responses (called when the server starts). They are class
+        attributes, so the error pages are per process: the last started server sets them.
+        :param error_pages: custom bodies by status code, {404: "<h1>Not Found</h1>"} (text/html)
+            or {404: (body, content_type)}; the other codes answer their reason phrase (text/plain)
+        :return:
+        """
+        error_pages = error_pages or {}
 
-        return response
+        for status_code in error_pages:
+            if status_code not in cls.ERROR_CODES:
+                raise Exception(f"Error pages can be set for these status codes: "
+                                f"{', '.join(map(str, cls.ERROR_CODES))}, not {status_code}")
 
-    @staticmethod
-    def r501():
-        response = Response(status_code=501, body="Not Implemented")
-        response.set_header("Content-Type", "text/plain")
+        canned = {}
+        for status_code in cls.ERROR_CODES:
+            body = error_pages.get(status_code)
+            content_type = 'text/html'
+
+            if isinstance(body, tuple):
+                body, content_type = body
+            elif body is None:
+                body, content_type = REASON_PHRASES.get(status_code, HTTPStatus(status_code).phrase), 'text/plain'
+
+            headers = {'Retry-After': 1} if status_code == 503 else None
+            canned[status_code] = CannedResponse(status_code, body, content_type, headers)
+
+        # replaced at once (requests may use them meanwhile)
+        cls.CANNED = canned
+        cls.ALLOWED = {}
+
+    @classmethod
+    def _allowed(cls, status_code, allow):
+        """
+        Canned response with an `Allow` header (built on the first use, the
+        values of `Allow` are the ones of the route tables).
+        :param status_code: 405 or 204 (OPTIONS)
+        :param allow:
+        :return:
+        """
+        response = cls.ALLOWED.get((status_code, allow))
+
+        if response is None:
+            if status_code == 204:
+                response = CannedResponse(204, headers={'Allow': allow})
+            else:
+                response = cls.CANNED[status_code].with_headers({'Allow': allow})
+
+            cls.ALLOWED[(status_code, allow)] = response
 
         return response
 
+    @classmethod
+    def r404(cls):
+        return cls.CANNED[404]
+
+    @classmethod
+    def r500(cls):
+        return cls.CANNED[500]
+
+    @classmethod
+    def r501(cls):
+        return cls.CANNED[501]
+
     @staticmethod
     def r200():
         response = Response(status_code=200, body="OK")
@@ -61,41 +153,66 @@ class HttpResult:
 
         return response
 
-    @staticmethod
-    def r400():
-        response = Response(status_code=400, body="Bad Request")
-        response.set_header("Content-Type", "text/plain")
+    @classmethod
+    def r400(cls):
+        return cls.CANNED[400]
 
-        return response
+    @classmethod
+    def r403(cls):
+        return cls.CANNED[403]
+
+    @classmethod
+    def r405(cls, allow=None):
+        if allow is None:
+            return cls.CANNED[405]
+
+        return cls._allowed(405, allow)
+
+    @classmethod
+    def options(cls, allow):
+        return cls._allowed(204, allow)
 
     @staticmethod
-    def r403():
-        response = Response(status_code=403, body="Forbidden")
+    def r301():
+        response = Response(status_code=301, body="Moved Permanently")
         response.set_header("Content-Type", "text/plain")
 
         return response
 
     @staticmethod
-    def r405():
-        response = Response(status_code=405, body="Method Not Allowed")
+    def r302(self):
+        response = Response(status_code=302, body="Found")
         response.set_header("Content-Type", "text/plain")
 
         return response
 
+    @classmethod
+    def r503(cls):
+        return cls.CANNED[503]
+
+    @classmethod
+    def r413(cls):
+        return cls.CANNED[413]
+
     @staticmethod
-    def r301():
-        response = Response(status_code=301, body="Moved Permanently")
-        response.set_header("Content-Type", "text/plain")
+    def r422(errors):
+        response = Response(status_code=422, body=json.dumps({"detail": errors}))
+        response.set_header("Content-Type", "application/json")
 
         return response
 
     @staticmethod
-    def r302(self):
-        response = Response(status_code=302, body="Found")
+    def r416(size):
+        response = Response(status_code=416, body="Range Not Satisfiable")
         response.set_header("Content-Type", "text/plain")
+        response.set_header("Content-Range", f"bytes */{size}")
 
         return response
 
+    @classmethod
+    def r431(cls):
+        return cls.CANNED[431]
+
     @staticmethod
     def r201():
         response = Response(status_code=201, body="Created")
@@ -123,13 +240,25 @@ class Request:
     Request class for FatihServer
     """
 
-    def __init__(self, method=None, path=None, raw_body=None, headers=None, body=None, query_params=None):
+    def __init__(self,
+                 method=None,
+                 path=None,
+                 raw_body=None,
+                 headers=None,
+                 body=None,
+                 query_params=None,
+                 body_stream=None,
+                 path_params=None,
+                 result=None):
         """
         Initialize Request class with method, path, headers, body and query parameters.
         :param method:
         :param path:
         :param headers:
         :param body:
+        :param body_stream: RequestBody of a streamed request (`stream=True` routes)
+        :param path_params: parameters of the route path (`/users/{id:int}`)
+        :param result: parsed request it was created from (see from_result())
         """
         self.method = method
         self.path = path
@@ -137,12 +266,69 @@ class Request:
         self.body = body
         self.raw_body = raw_body
         self.query_params = query_params
+        self.body_stream = body_stream
+        self.path_params = {} if path_params is None else path_params
+        self.result = result
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        Request of a parsed request, created once per request (middlewares and the
+        route function share it, so middlewares can attach data to it).
+        :param result: parsed request (see IncrementalHttpRequestParser)
+        :return:
+        """
+        request = result.get('request')
+
+        if request is None:
+            request = cls(method=result['method'],
+                          path=result['path'],
+                          headers=result['headers'],
+                          raw_body=result['raw_body'],
+                          body=result['body'],
+                          query_params=result['query_params'],
+                          body_stream=result.get('body_stream') or
+                          BufferedRequestBody(result.get('body_bytes') or b''),
+                          path_params=result.get('path_params'),
+                          result=result)
+            result['request'] = request
+
+        return request
+
+    def stream(self):
+        """
+        Body chunks as they arrive (`for chunk in request.stream()`, or
+        `async for` on the asyncio backend). See RequestBody.
+        :return:
+        """
+        if self.body_stream is None:
+            # the body is already read, it is yielded at once
+            data = self.raw_body.encode('utf-8') if self.raw_body else b''
+            self.body_stream = BufferedRequestBody(data)
+
+        return self.body_stream
+
+    def spool(self):
+        """
+        The whole body as a file object (spilled to a temporary file when it is large).
+        :return:
+        """
+        return self.stream().spool()
+
+    async def aspool(self):
+        """
+        The whole body as a file object, see spool().
+        :return:
+        """
+        return await self.stream().aspool()
 
 
 class Response:
     """
     Response class for FatihServer
     """
+    # response to a HEAD request: the headers of the response are sent without the body
+    head_only = False
 
     def __init__(self,
                  status_code=200,
@@ -163,12 +349,12 @@ class Response:
         self.headers = headers
         self.body = body
         self.content_type = content_type
-        self.session = session
-
-        if self.session is None:
-            self.session = Session()
 
-        self.set_session(self.session)
+        # responses do not have a session unless one is given (or the route
+        # function has created one, see LazySession)
+        self.session = None
+        if session is not None:
+            self.set_session(session)
 
     def set_cookie(self, key, value):
         """
@@ -258,77 +444,474 @@ class Response:
         """
         self.body = body
 
+    def _body_as_bytes(self):
+        """
+        Encode body as bytes (binary bodies are returned as they are, without a copy)
+        :return:
+        """
+        if self.body is None:
+            return b''
+
+        if isinstance(self.body, (bytes, bytearray)):
+            # binary (images, fonts, etc.)
+            return self.body
+
+        if self.content_type == 'application/json':
+            return json.dumps(self.body).encode('utf-8')
+
+        return f"{self.body}".encode('utf-8')
+
     def as_bytes(self):
         """
         String representation of Response class *FatihServer*
         :return:
         """
-        headers = ""
-        if self.headers is not None:
-            for key, value in self.headers.items():
-                headers += f"{key}: {value}\r\n"
-
-        method_str = ""
-        if self.status_code == 200:
-            method_str = 'OK'
-        elif self.status_code == 201:
-            method_str = 'Created'
-        elif self.status_code == 204:
-            method_str = 'No Content'
-        elif self.status_code == 404:
-            method_str = 'Not Found'
-        elif self.status_code == 405:
-            method_str = 'Method Not Allowed'
-        elif self.status_code == 403:
-            method_str = 'Forbidden'
-        elif self.status_code == 501:
-            method_str = 'Not Implemented'
-        elif self.status_code == 500:
-            method_str = 'Internal Server Error'
-        elif self.status_code == 400:
-            method_str = 'Bad Request'
+        return b"".join(self.as_buffers())
+
+    def as_buffers(self, keep_alive=None):
+        """
+        The response as a list of buffers (head and body), so the connection
+        layer can write them with one sendmsg() without copying the body.
+        :param keep_alive: used by CannedResponse (the `Connection` header of
+            other responses is set by RequestHandler.keep_alive())
+        :return:
+        """
+        body = self._body_as_bytes()
+
+        # Content-Length must match the encoded body, otherwise clients
+        # keeping the connection alive cannot find the end of the response
+        if self.headers is None:
+            self.headers = {}
+
+        if self.status_code in (204, 304):
+            # 204 No Content and 304 Not Modified have no body (and no Content-Length of their own)
+            self.headers.pop('Content-Length', None)
+            return [self._head_as_bytes()]
+
+        self.headers['Content-Length'] = len(body)
+
+        if self.head_only or not body:
+            # HEAD: the Content-Length of the body that GET would send
+            return [self._head_as_bytes()]
+
+        return [self._head_as_bytes(), body]
+
+    def _head_as_bytes(self):
+        """
+        Status line and headers of the response
+        :return:
+        """
+        # every header line ends with CRLF, one more CRLF ends the head
+        headers = "".join([f"{key}: {value}\r\n" for key, value in self.headers.items()])
+
+        return b"".join((status_line(self.status_code), headers.encode('utf-8'), b"\r\n"))
+
+
+class StreamingResponse(Response):
+    """
+    StreamingResponse class for FatihServer
+
+    The body is an iterable (e.g. a generator) or an async iterable (e.g. an async
+    generator) of bytes/str. It is not buffered: the chunks are written as they are
+    generated, with `Transfer-Encoding: chunked` (HTTP/1.0 clients get the raw body
+    and the connection is closed after it).
+
+        def export():
+            yield "id,name\n"
+            for user in users:
+                yield f"{user.id},{user.name}\n"
+
+        return StreamingResponse(export(), content_type="text/csv")
+
+    Note: every chunk is a separate write, so yield reasonably sized chunks.
+    """
+
+    def __init__(self, body, status_code=200, content_type=None, headers=None, session=None):
+        """
+        Initialize StreamingResponse class with the body iterable.
+        :param body: iterable or async iterable of bytes/str
+        :param status_code:
+        :param content_type:
+        :param headers:
+        :param session:
+        """
+        super().__init__(status_code=status_code, session=session, headers=headers, body=body)
+
+        if content_type is not None:
+            self.set_content_type(content_type)
+
+        # the connection layer turns it off for HTTP/1.0 clients
+        self.chunked = True
+
+    def head_as_bytes(self):
+        """
+        Status line and headers (without Content-Length, the length is not known)
+        :return:
+        """
+        if self.headers is None:
+            self.headers = {}
+
+        self.headers.pop('Content-Length', None)
+
+        if self.chunked:
+            self.headers['Transfer-Encoding'] = 'chunked'
         else:
-            method_str = 'Unknown'
-
-        if self.content_type is not None:
-            if self.content_type == 'application/json':
-                return bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" \
-                             f"{headers} \r\n\r\n" \
-                             f"{json.dumps(self.body)}", 'utf-8')
-            elif self.content_type == 'text/html':
-                return bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" \
-                             f"{headers} \r\n\r\n" \
-                             f"{self.body}", 'utf-8')
-            elif self.content_type == 'text/plain':
-                return bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" \
-                             f"{headers} \r\n\r\n" \
-                             f"{self.body}", 'utf-8')
-            elif self.content_type == 'image/png' \
-                    or self.content_type == 'image/jpeg' \
-                    or self.content_type == 'image/jpg' \
-                    or self.content_type == 'image/gif' \
-                    or self.content_type == '.otf' \
-                    or self.content_type == '.woff' \
-                    or self.content_type == '.ttf' \
-                    or self.content_type == '.woff2' \
-                    or self.content_type == '.eot':
-                # binary
-                pack = bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" f"{headers} \r\n\r\n", 'utf-8')
-                data = self.body
-
-                return pack + data
-            else:
-                return bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" \
-                             f"{headers} \r\n\r\n" \
-                             f"{self.body}", 'utf-8')
+            self.headers.pop('Transfer-Encoding', None)
+
+        return self._head_as_bytes()
+
+    def frames(self):
+        """
+        Generate the body and encode it for the connection (blocking).
+        Async iterables are iterated on the shared event loop.
+        :return:
+        """
+        if self.head_only:
+            return
+
+        body = self.body
+
+        if hasattr(body, '__aiter__'):
+            iterator = body.__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = SharedEventLoop().run(iterator.__anext__())
+                    except StopAsyncIteration:
+                        break
+
+                    frame = self._encode(chunk)
+                    if frame:
+                        yield frame
+            finally:
+                if hasattr(iterator, 'aclose'):
+                    SharedEventLoop().run(iterator.aclose())
         else:
-            return bytes(f"HTTP/1.1 {self.status_code} {method_str}\n" \
-                         f"{headers} \r\n\r\n" \
-                         f"{self.body}", 'utf-8')
+            iterator = iter(body)
+            try:
+                for chunk in iterator:
+                    frame = self._encode(chunk)
+                    if frame:
+                        yield frame
+            finally:
+                if hasattr(iterator, 'close'):
+                    iterator.close()
+
+        if self.chunked:
+            # last-chunk
+            yield b"0\r\n\r\n"
+
+    async def aframes(self):
+        """
+        Generate the body and encode it for the connection (event-loop server).
+        Plain iterables are iterated inline, so they should not block for long.
+        :return:
+        """
+        if self.head_only:
+            return
+
+        body = self.body
+
+        if hasattr(body, '__aiter__'):
+            iterator = body.__aiter__()
+            try:
+                async for chunk in iterator:
+                    frame = self._encode(chunk)
+                    if frame:
+                        yield frame
+            finally:
+                if hasattr(iterator, 'aclose'):
+                    await iterator.aclose()
+        else:
+            for frame in self.frames():
+                yield frame
+            return
+
+        if self.chunked:
+            # last-chunk
+            yield b"0\r\n\r\n"
+
+    def as_bytes(self):
+        """
+        The whole response (buffered), the connection layer uses head_as_bytes() and frames()
+        :return:
+        """
+        return self.head_as_bytes() + b"".join(self.frames())
+
+    def as_buffers(self, keep_alive=None):
+        return [self.as_bytes()]
+
+    def _encode(self, chunk):
+        """
+        Encode a chunk of the body (an empty chunk would end the chunked body, so it is skipped).
+        :param chunk:
+        :return:
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+
+        if not chunk:
+            return b""
+
+        if not self.chunked:
+            return bytes(chunk)
+
+        return b"%x\r\n" % len(chunk) + bytes(chunk) + b"\r\n"
+
+
+class FileResponse(Response):
+    """
+    FileResponse class for FatihServer
+
+    The body is (a part of) a file. It is not read into memory: the connection
+    layer sends it with sendfile() (zero-copy, the kernel copies the file to the
+    socket) and falls back to slices of a memory-mapped file where sendfile()
+    is not available.
+
+    The file is opened when the response is created (so a missing file can still
+    be answered with 404) and closed by close() after it is sent.
+
+    Several `ranges` are sent as `multipart/byteranges` (206 Partial Content):
+    the part headers are small buffers, the ranges themselves are still sent
+    from the file with sendfile().
+    """
+    # size of the slices of the mmap fallback
+    SLICE_SIZE = 256 * 1024
+
+    def __init__(self, path, status_code=200, content_type=None, headers=None, session=None, offset=0, length=None,
+                 ranges=None):
+        """
+        Initialize FileResponse class with the path of the file.
+        :param path: path of the file in the file system
+        :param status_code:
+        :param content_type:
+        :param headers:
+        :param session:
+        :param offset: first byte of the file to send
+        :param length: number of bytes to send (None means until the end of the file)
+        :param ranges: list of (offset, length) to send as multipart/byteranges
+        """
+        super().__init__(status_code=status_code, session=session, headers=headers)
+
+        if content_type is not None:
+            self.set_content_type(content_type)
+
+        self.path = path
+        self.file = open(path, 'rb')
+
+        # size of the opened file (it does not change if the path is replaced meanwhile)
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.offset = offset
+        self.length = self.size - offset if length is None else length
+
+        # (bytes sent before the range, offset, length) of each part of the body
+        self.parts = [(b'', self.offset, self.length)]
+
+        if ranges is not None:
+            self._set_ranges(ranges, content_type or 'application/octet-stream')
+
+        for _, offset, length in self.parts:
+            if offset < 0 or length < 0 or offset + length > self.size:
+                self.file.close()
+                raise OSError(f"Range is outside of the file: {path}")
+
+    def _set_ranges(self, ranges, content_type):
+        """
+        Build the parts of a multipart/byteranges body.
+        :param ranges: list of (offset, length)
+        :param content_type: media type of the file
+        :return:
+        """
+        boundary = secrets.token_hex(16)
+
+        # replaces the media type of the file (set_header() would append to it)
+        if self.headers:
+            self.headers.pop('Content-Type', None)
+        self.set_content_type(f"multipart/byteranges; boundary={boundary}")
+
+        self.parts = []
+        for offset, length in ranges:
+            # the CRLF before a delimiter belongs to the delimiter
+            head = f"--{boundary}\r\n" \
+                   f"Content-Type: {content_type}\r\n" \
+                   f"Content-Range: bytes {offset}-{offset + length - 1}/{self.size}\r\n\r\n"
+            if self.parts:
+                head = "\r\n" + head
+
+            self.parts.append((head.encode('latin-1'), offset, length))
+
+        # closing delimiter
+        self.parts.append((f"\r\n--{boundary}--\r\n".encode('latin-1'), 0, 0))
+
+        self.length = sum(len(head) + length for head, _, length in self.parts)
+
+    def head_as_bytes(self):
+        """
+        Status line and headers
+        :return:
+        """
+        if self.headers is None:
+            self.headers = {}
+
+        self.headers['Content-Length'] = self.length
+
+        return self._head_as_bytes()
+
+    def mmap_slices(self, offset=None, length=None):
+        """
+        Slices of the memory-mapped file (fallback of sendfile, nothing is copied).
+        The slices are only valid until the generator is closed.
+        :param offset: first byte (default: `offset` of the response)
+        :param length: number of bytes (default: `length` of the response)
+        :return:
+        """
+        if offset is None:
+            offset, length = self.offset, self.length
+
+        if length == 0:
+            return
+
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                end = offset + length
+                for start in range(offset, end, self.SLICE_SIZE):
+                    part = view[start:min(start + self.SLICE_SIZE, end)]
+                    try:
+                        yield part
+                    finally:
+                        part.release()
+            finally:
+                view.release()
+
+    def as_bytes(self):
+        """
+        The whole response (buffered), the connection layer uses head_as_bytes() and sendfile()
+        :return:
+        """
+        data = [self.head_as_bytes()]
+        for head, offset, length in self.parts:
+            self.file.seek(offset)
+            data.append(head)
+            data.append(self.file.read(length))
+
+        return b"".join(data)
+
+    def as_buffers(self, keep_alive=None):
+        return [self.as_bytes()]
+
+    def close(self):
+        """
+        Close the file.
+        :return:
+        """
+        self.file.close()
+
+
+class CannedResponse(Response):
+    """
+    CannedResponse class for FatihServer
+
+    An immutable response that is encoded once and shared by the requests (e.g. the
+    error responses of HttpResult). It does not have a session, so answering with
+    it does not create one. The bytes are prepared for both values of the
+    `Connection` header and for HEAD requests (`head_response`).
+
+    Changing it raises an exception, change a copy() instead.
+    """
+
+    def __init__(self, status_code, body=None, content_type='text/plain', headers=None, head_only=False):
+        """
+        Initialize CannedResponse class with status code, body and headers.
+        :param status_code:
+        :param body: str or bytes (None: no body)
+        :param content_type: media type of the body
+        :param headers: other headers
+        :param head_only: response to HEAD requests (see head_response)
+        """
+        self.status_code = status_code
+        self.method = None
+        self.body = body
+        self.content_type = content_type
+        self.session = None
+        self.head_only = head_only
+        self.extra_headers = dict(headers or {})
+
+        data = b''
+        all_headers = {}
+        if body is not None:
+            data = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+            all_headers['Content-Type'] = content_type
+
+        all_headers.update(self.extra_headers)
+
+        if status_code not in (204, 304):
+            all_headers['Content-Length'] = len(data)
+
+        self.headers = MappingProxyType(all_headers)
+
+        head = status_line(status_code) + "".join([f"{key}: {value}\r\n"
+                                                   for key, value in all_headers.items()]).encode('utf-8')
+        if head_only:
+            data = b''
+
+        # keep_alive: encoded response
+        self.encoded = {True: head + b"Connection: keep-alive\r\n\r\n" + data,
+                        False: head + b"Connection: close\r\n\r\n" + data}
+
+        self.head_response = self if head_only else CannedResponse(status_code, body, content_type, headers, True)
+
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('frozen'):
+            raise Exception(f"Canned responses are shared and cannot be changed ({self.status_code}), "
+                            f"change a copy() of it.")
+
+        super().__setattr__(name, value)
+
+    def set_header(self, key, value):
+        raise Exception(f"Canned responses are shared and cannot be changed ({self.status_code}), "
+                        f"change a copy() of it.")
+
+    def as_buffers(self, keep_alive=None):
+        """
+        The encoded response.
+        :param keep_alive: value of the `Connection` header (None means keep-alive)
+        :return:
+        """
+        return [self.encoded[keep_alive is not False]]
+
+    def with_headers(self, headers):
+        """
+        Canned response with more headers.
+        :param headers:
+        :return:
+        """
+        return CannedResponse(self.status_code, self.body, self.content_type, {**self.extra_headers, **headers})
+
+    def copy(self):
+        """
+        A Response with the same status code, headers and body (that can be changed).
+        :return:
+        """
+        headers = {key: value for key, value in self.headers.items() if key != 'Content-Length'}
+        return Response(status_code=self.status_code, headers=headers, content_type=self.content_type, body=self.body)
+
+
+HttpResult.compile()
 
 
 class Session:
-    ACTIVE = {}
+    """
+    Session of a client, identified by the `session_id` cookie
+
+    The data of the sessions is kept in `STORE` (a SessionStore, the sessions expire and
+    their number is bounded, see session_store.py).
+    `Session()` creates a new session, `Session(session_id)` refers to an existing one.
+    The data is read and written like a dictionary (`session["user"]`, `session.get("cart")`).
+    """
+    STORE = MemorySessionStore()
 
     def __init__(self, session_id=None, data=None, created_at=None):
         """
@@ -337,16 +920,86 @@ class Session:
         :param data:
         :param created_at:
         """
+        # a new session was created (its cookie must be sent)
+        self.created = False
+
         if session_id is not None:
             self.session_id = session_id
         else:
             # Generate session id
+            self._create(data, created_at)
+
+    def _create(self, data=None, created_at=None):
+        """
+        Create a new session (and its session id).
+        :param data:
+        :param created_at:
+        :return: entry of the session in STORE
+        """
+        while True:
             self.session_id = Session.generate_session_id()
-            Session.ACTIVE[self.session_id] = {
-                'session_id': self.session_id,
-                'data': {} if data is None else data,
-                'created_at': datetime.now() if created_at is None else created_at
-            }
+
+            entry = Session.STORE.create(self.session_id, data, created_at)
+            if entry is not None:
+                break
+
+        self.created = True
+
+        return entry
+
+    def _entry(self, create):
+        """
+        Entry of the session in STORE.
+        :param create: create the session if it does not exist (or has expired) (writes)
+        :return: entry or None
+        """
+        entry = Session.STORE.get(self.session_id) if self.session_id is not None else None
+
+        if entry is None and create:
+            entry = self._create()
+
+        return entry
+
+    @property
+    def exists(self):
+        """
+        Check if the session exists (reading it does not create it).
+        :return:
+        """
+        return self._entry(False) is not None
+
+    @property
+    def data(self):
+        """
+        Data of the session (the session is created if it does not exist, the dictionary can be changed)
+        :return:
+        """
+        return self._entry(True)['data']
+
+    def get(self, key, default=None):
+        entry = self._entry(False)
+        return default if entry is None else entry['data'].get(key, default)
+
+    def __getitem__(self, key):
+        entry = self._entry(False)
+        if entry is None:
+            raise KeyError(key)
+
+        return entry['data'][key]
+
+    def __contains__(self, key):
+        entry = self._entry(False)
+        return entry is not None and key in entry['data']
+
+    def __setitem__(self, key, value):
+        self._entry(True)['data'][key] = value
+
+    def __delitem__(self, key):
+        entry = self._entry(False)
+        if entry is None:
+            raise KeyError(key)
+
+        del entry['data'][key]
 
     def __repr__(self):
         return f"{self.session_id}"
@@ -361,10 +1014,7 @@ class Session:
         :param session_id:
         :return:
         """
-        if session_id in Session.ACTIVE:
-            return Session.ACTIVE[session_id]
-        else:
-            return None
+        return Session.STORE.get(session_id)
 
     @staticmethod
     def check_session_id_is_valid(session_id):
@@ -373,26 +1023,53 @@ class Session:
         :param session_id:
         :return:
         """
-        if session_id in Session.ACTIVE:
-            return True
-        else:
-            return False
+        return session_id in Session.STORE
 
     @staticmethod
     def generate_session_id():
         """
-        Generate a session id
+        Generate a session id (256 random bits, it cannot be guessed)
 
         :return:
         """
-        # Generate a random string
-        random_string = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        return secrets.token_urlsafe(32)
 
-        # Hash the string
-        hashed_string = sha256(random_string.encode()).hexdigest()
 
-        # Return the hashed string
-        return hashed_string
+class LazySession(Session):
+    """
+    Session of a request (the `Session` parameter of route functions)
+
+    Nothing is created until data is written to it: a client without a (valid)
+    session cookie reads an empty session, the first write creates the session and
+    the response sends its cookie. So static files, errors and routes that do not
+    write to the session do not create sessions (nor send `Set-Cookie`).
+    """
+
+    def __init__(self, session_id=None):
+        """
+        Initialize LazySession class with the session id of the request.
+        :param session_id: value of the `session_id` cookie (None if there is none)
+        """
+        self.created = False
+        self.session_id = session_id
+
+    @classmethod
+    def of_request(cls, result):
+        """
+        Session of a parsed request (created once per request).
+        :param result: parsed request
+        :return:
+        """
+        session = result.get('session')
+
+        if session is None:
+            headers = result['headers']
+            cookies = headers.get('Cookie') if headers else None
+            session_id = cookies.get('session_id') if isinstance(cookies, dict) else None
+
+            session = result['session'] = cls(session_id)
+
+        return session
 
 
 class RequestHandler(BaseRequestHandler):
@@ -400,12 +1077,37 @@ class RequestHandler(BaseRequestHandler):
     Currently, I use socketserver. So I need to use this class to handle requests
     But I will implement my TCP server in the future (I hope so - if I have time)
     """
+    # interim response for clients that send `Expect: 100-continue`
+    CONTINUE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+    # more ranges (after merging) are answered with the whole file
+    MAX_RANGES = 16
+
+    # methods of static files (`Allow` header)
+    STATIC_ALLOW = 'GET, HEAD, OPTIONS'
+
+    # smaller bodies are copied after the head (cheaper than the sendmsg() bookkeeping)
+    SENDMSG_MIN_SIZE = 16 * 1024
+
+    def __init__(self, router=None, await_coroutines=False, compression_level=6, compression_min_size=1024):
+        """
+        Initialize RequestHandler class with router.
+        :param router:
+        :param await_coroutines: True when an event-loop server drives this handler.
+            Then `async def` route functions are returned as awaitables (see process())
+            instead of being executed on the shared event loop.
+        :param compression_level: gzip level of dynamic responses (1-9, 0 disables it)
+        :param compression_min_size: smaller dynamic responses are not compressed
+        """
+        if not 0 <= compression_level <= 9:
+            raise Exception(f"Compression level must be between 0 and 9: {compression_level}")
 
-    def __init__(self, router=None):
         self.parser = None
         # get the router from args
         self.router = router
-        self.lock = None
+        self.await_coroutines = await_coroutines
+        self.compression_level = compression_level
+        self.compression_min_size = compression_min_size
 
     def __call__(self, request, client_address, server):
         """
@@ -416,68 +1118,327 @@ class RequestHandler(BaseRequestHandler):
         :param server:
         :return:
         """
-        h = RequestHandler(self.router)
+        h = RequestHandler(self.router, self.await_coroutines, self.compression_level, self.compression_min_size)
         socketserver.BaseRequestHandler.__init__(h, request, client_address, server)
 
     def setup(self) -> None:
-        self.lock = threading.Lock()
-
         logger.debug(f"New connection from {self.client_address}")
 
     def handle(self):
-        # Get data from client
-        data = str(self.request.recv(1024), 'ascii')
+        """
+        Per-connection read loop (HTTP/1.1 persistent connections)
 
-        # Create a new HttpRequestParser (I know it is not efficient)
-        # FIXME: Make it efficient (instance for each request is not efficient)
-        http_parser = HttpRequestParser()
+        Requests are answered in order (pipelining) until the client asks to close
+        the connection, the connection is idle for `keep_alive_timeout` seconds or
+        `max_keep_alive_requests` requests were answered.
+        :return:
+        """
+        # Idle connections are closed after `keep_alive_timeout` seconds
+        self.request.settimeout(self.server.keep_alive_timeout)
+
+        # One parser per connection, it keeps the data of pipelined requests
+        parser = IncrementalHttpRequestParser(max_header_size=self.server.max_header_size,
+                                              max_body_size=self.server.max_body_size,
+                                              stream_body=self.stream_body_callback())
+        requests = 0
+
+        # Preallocated receive buffer (recv_into does not allocate per read)
+        self.recv_buffer = bytearray(65536)
+        self.recv_view = memoryview(self.recv_buffer)
+
+        while True:
+            try:
+                result = parser.next_request()
+            except HttpParserError as e:
+                # we cannot tell where the request ends, so the connection is closed
+                result = self.parser_error(e)
+                self.keep_alive(result, False)
+                return self._send_buffers(result.as_buffers(False))
+
+            if result is parser.NEED_MORE_DATA:
+                # Get (more) data from client
+                if not self._receive(parser):
+                    return
+                continue
+
+            keep_alive = result['keep_alive']
+
+            requests += 1
+            if requests >= self.server.max_keep_alive_requests or self.server.draining:
+                keep_alive = False
+
+            body = None
+            if parser.streaming:
+                # the route function reads the body from the socket (Request.stream())
+                body = RequestBody(parser, lambda: self._receive(parser), self.server.spill_threshold)
+                result['body_stream'] = body
+
+            version = result['version']
+
+            self.server.request_started()
+            try:
+                # Dispatch the request
+                result = self.process(result)
+
+                # the unread part of the body is skipped (or the connection is closed)
+                if body is not None and not body.discard():
+                    keep_alive = False
+
+                keep_alive = self.keep_alive(result, keep_alive, version)
+
+                cur_thread = threading.current_thread()
+                logger.debug(f"{cur_thread}: {result.headers} - {result.body}")
+
+                if isinstance(result, StreamingResponse):
+                    if not self._send_stream(result):
+                        return
+                elif isinstance(result, FileResponse):
+                    if not self._send_file(result):
+                        return
+                else:
+                    self._send_buffers(result.as_buffers(keep_alive))
+            finally:
+                self.server.request_finished()
+
+            if not keep_alive:
+                return
+
+    def _send_buffers(self, buffers):
+        """
+        Write buffers with sendmsg() (scatter-gather: the head and the body are
+        written together without copying them into one buffer).
+        :param buffers:
+        :return:
+        """
+        if len(buffers[-1]) < self.SENDMSG_MIN_SIZE or not hasattr(self.request, 'sendmsg'):
+            return self.request.sendall(b"".join(buffers))
+
+        views = [memoryview(buffer) for buffer in buffers]
+        while views:
+            sent = self.request.sendmsg(views)
+
+            # drop what is sent, sendmsg() may write only a part of the buffers
+            while views and sent >= views[0].nbytes:
+                sent -= views[0].nbytes
+                views.pop(0)
+
+            if sent:
+                views[0] = views[0][sent:]
+
+    def _send_stream(self, response):
+        """
+        Write a StreamingResponse chunk by chunk (as it is generated).
+        :param response:
+        :return: False if the body could not be written completely (the connection must be closed)
+        """
+        # small chunks (e.g. progress events) must not wait for the ACK of the previous one
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         try:
-            # Parse data
-            result = http_parser.parse(data)
+            self.request.sendall(response.head_as_bytes())
+
+            for frame in response.frames():
+                self.request.sendall(frame)
         except Exception as e:
-            logger.error(e)
+            # the head is already sent, so we cannot answer 500 anymore
+            logger.error(f"Streaming response is aborted: {e}")
+            return False
 
-            print_exc()
+        return True
+
+    def _send_file(self, response):
+        """
+        Write a FileResponse with sendfile() (or mmap slices where it is not available).
+        :param response:
+        :return: False if the file could not be sent completely (the connection must be closed)
+        """
+        try:
+            head = response.head_as_bytes()
 
-            # 400 Bad Request (if we cannot parse the request)
-            result = HttpResult.r400()
+            for part_head, offset, length in response.parts:
+                # the head of the response (or of a multipart part) is sent with the next write
+                head += part_head
+                if length == 0:
+                    continue
 
-            # Send data to client
-            return self.request.sendall(result.as_bytes())
+                self.request.sendall(head)
+                head = b""
+
+                if hasattr(os, 'sendfile'):
+                    # zero-copy, the kernel sends the file
+                    self.request.sendfile(response.file, offset, length)
+                else:
+                    for part in response.mmap_slices(offset, length):
+                        self.request.sendall(part)
+
+            if head:
+                self.request.sendall(head)
+        except OSError as e:
+            logger.error(f"Sending file is aborted: {e}")
+            return False
+        finally:
+            response.close()
+
+        return True
+
+    def _receive(self, parser):
+        """
+        Receive more data from the client and feed it to the parser.
+        :param parser:
+        :return: False if the connection is closed (or idle for too long)
+        """
+        if parser.continue_expected:
+            # the client waits for our go before it sends the body
+            parser.continue_expected = False
+            self.request.sendall(self.CONTINUE)
+
+        try:
+            size = self.request.recv_into(self.recv_buffer)
+        except (socket.timeout, ConnectionError):
+            return False
+
+        if not size:
+            # client closed the connection
+            return False
+
+        parser.feed(self.recv_view[:size])
+        return True
+
+    def stream_body_callback(self):
+        """
+        `stream_body` callback of the parser (None if no route streams its body,
+        then the requests do not pay for it).
+        :return:
+        """
+        return self.streams_body if self.router.has_stream_routes else None
+
+    def streams_body(self, result):
+        """
+        Parser callback: is the body of this request streamed to the route function?
+        The routes of the path are kept in the result, so the request is not looked up again.
+        :param result: parsed head of the request
+        :return:
+        """
+        table, _ = result['lookup'] = self.router.lookup(result['path'])
+
+        route = table.route(result['method']) if table is not None else None
+        if route is None or not route.stream:
+            return False
+
+        # on an event-loop server a plain function cannot wait for the body
+        # (it would block the loop), so its body is read before it is called
+        return not self.await_coroutines or inspect.iscoroutinefunction(inspect.unwrap(route.func))
+
+    @staticmethod
+    def parser_error(error):
+        """
+        Response for a request that cannot be parsed
+        :param error: HttpParserError
+        :return:
+        """
+        logger.error(error)
+
+        if error.status_code == 413:
+            return HttpResult.r413()
+        elif error.status_code == 431:
+            return HttpResult.r431()
+        elif error.status_code == 501:
+            return HttpResult.r501()
+
+        # 400 Bad Request (if we cannot parse the request)
+        return HttpResult.r400()
+
+    @staticmethod
+    def keep_alive(response, keep_alive, version='HTTP/1.1'):
+        """
+        Decide if the connection stays open after `response` and set the `Connection` header.
+        (a route function can still close the connection with `Connection: close`)
+        :param response:
+        :param keep_alive: what the client asked for
+        :param version: HTTP version of the request
+        :return: True if the connection stays open
+        """
+        if isinstance(response, CannedResponse):
+            # the `Connection` header is chosen when it is written (see as_buffers())
+            return keep_alive
 
+        if response.headers is None:
+            response.headers = {}
+
+        if isinstance(response, StreamingResponse) and version != 'HTTP/1.1':
+            # HTTP/1.0 clients do not know the chunked encoding,
+            # the end of the connection is the end of the body
+            response.chunked = False
+            keep_alive = False
+
+        if str(response.headers.get('Connection', '')).lower() == 'close':
+            keep_alive = False
+
+        response.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+        return keep_alive
+
+    def process(self, result):
+        """
+        Dispatch a parsed request to the router and return the response.
+        It does not touch the socket, so both the threaded and the event-loop
+        servers share it.
+
+        If `await_coroutines` is set and the route function is a coroutine,
+        an awaitable that resolves to the Response is returned instead.
+        :param result: parsed request (see IncrementalHttpRequestParser)
+        :return:
+        """
         # Get method
         method = result['method']
 
-        # Check if method is supported (GET, POST, PUT, DELETE, OPTIONS, HEAD)
-        # Still not implemented all of them (not standardized responses)
+        # Check if method is supported (GET, HEAD, POST, PUT, PATCH, DELETE, OPTIONS)
         try:
-            if method == 'GET' \
-                    or method == 'POST' \
-                    or method == 'PUT' \
-                    or method == 'DELETE' \
-                    or method == 'OPTIONS' \
-                    or method == 'HEAD':
-
+            if method in self.router.METHODS:
                 if (method == 'GET' or method == 'OPTIONS') \
                         and result['body'] is not None:
                     # GET and OPTIONS should not have body (RFC 7231)
                     # https://www.rfc-editor.org/rfc/rfc7231#section-4.3.1
-                    result = HttpResult.r400()
-                    return self.request.sendall(result.as_bytes())
+                    return HttpResult.r400()
 
                 result = self._handle_method(result)
             else:
                 logger.warning(f"Method not supported - {result['method']} - {result['path']}")
-                result = HttpResult.r400()
+                result = HttpResult.r501()
         except Exception as e:
+            # the route function (or the framework) failed
             logger.error(e)
             print_exc()
-            result = HttpResult.r405()
+            result = HttpResult.r500()
+
+        if method == 'HEAD':
+            result = self._head(result)
+
+        return result
+
+    @classmethod
+    def _head(cls, response):
+        """
+        Drop the body of the response to a HEAD request (the headers are the ones of GET).
+        :param response: Response or an awaitable of it
+        :return:
+        """
+        if inspect.isawaitable(response):
+            async def head():
+                return cls._head(await response)
+
+            return head()
+
+        if isinstance(response, CannedResponse):
+            return response.head_response
+
+        response.head_only = True
 
-        cur_thread = threading.current_thread()
-        logger.debug(f"{cur_thread}: {result.headers} - {result.body}")
-        self.request.sendall(result.as_bytes())
+        if isinstance(response, FileResponse):
+            # only the head is sent (and the file is closed)
+            response.parts = []
+
+        return response
 
     def _handle_method(self, result):
         """
@@ -494,129 +1455,164 @@ class RequestHandler(BaseRequestHandler):
             if 'User-Agent' in result['headers']:
                 user_agent = result['headers']['User-Agent']
 
-        cookies = None
-        if result['headers'] is not None:
-            if 'Cookie' in result['headers']:
-                cookies = result['headers']['Cookie']
+        accept_gzip = self._accepts_gzip(result['headers'])
 
-        # Check if path exists in router and get function to execute
-        exists, func = self.router.exist(path, result['method'])
+        # Check if path exists in router and get the route to execute
+        # (it is already looked up if the router has streamed routes, see streams_body)
+        lookup = result.get('lookup')
+        table, result['path_params'] = lookup if lookup is not None else self.router.lookup(path)
 
-        # If path exists, execute function
-        if exists:
-            # Lock the thread
-            self.lock.acquire()
+        route = None
+        if table is not None:
+            route = table.route(result['method'])
 
-            func, args = self._handle_func_args(func, result)
+            if route is None:
+                # the path exists, but not for this method
+                if result['method'] == 'OPTIONS':
+                    return HttpResult.options(table.allow)
 
-            # check if function is a coroutine
-            if asyncio.iscoroutinefunction(func):
-                logger.debug("Function is a coroutine")
+                logger.warning(f"Method not allowed - {result['method']} - {path}")
+                return HttpResult.r405(table.allow)
 
-            # Execute function
-            result = func(*args)
-
-            # Release the thread
-            self.lock.release()
-
-            if isinstance(result, Response):
-                if cookies is None or 'session_id' not in cookies:
-                    # Add session id to cookies
-                    result.set_session(Session())
-                else:
-                    # Check session id is valid
-                    session_id = cookies['session_id']
-
-                    if Session.check_session_id_is_valid(session_id):
-                        # Set session id to cookies
-                        result.set_session(Session(session_id=session_id))
-                    else:
-                        # Add session id to cookies
-                        result.set_session(Session())
-
-                return result
-            else:
-                # Check if session id exists
-                if cookies is not None and 'session_id' in cookies:
-                    # Session id exists, set it from cookies
-                    session_id = cookies['session_id']
-
-                    # Create response. result is not 'Response' instance
-                    if not isinstance(result, str):
-                        result = str(result)
-
-                    # we create a respone for raw-text
-                    response = Response(status_code=200, body=result)
-
-                    # Content-Type is Text-plain
-                    response.set_header('Content-Type', 'text/plain')
-
-                    # Set session id to cookies
-                    response.set_session(Session(session_id=session_id))
-                else:
-                    # Create response
-                    response = HttpResult.r200()
-
-                # Set session id to cookies
-                return response
+        # If path exists, execute function
+        if route is not None:
+            # Route functions run concurrently, unless the route has a
+            # concurrency limit (then we reject the requests over the limit)
+            if not route.acquire():
+                logger.warning(f"Route is at its concurrency limit ({route.max_concurrency}) - "
+                               f"{result['method']} - {path}")
+                return HttpResult.r503()
+
+            release = True
+            try:
+                # Execute function (through its middlewares, with the arguments
+                # described by its invocation plan)
+                try:
+                    response = route.call(result)
+
+                    # `async def` handlers (and middlewares) return a coroutine
+                    if asyncio.iscoroutine(response):
+                        if self.await_coroutines:
+                            # event-loop server: it awaits the response natively
+                            # (and the route is released when the coroutine is done)
+                            release = False
+                            return self._await_route(route, response, result, accept_gzip)
+
+                        # threaded server: run it on the shared loop
+                        response = SharedEventLoop().run(response)
+                except ValidationError as e:
+                    logger.info(f"Invalid parameters - {result['method']} - {path} - {e.errors}")
+                    return HttpResult.r422(e.errors)
+
+            finally:
+                if release:
+                    route.release()
+
+            return self._compress(self._route_response(response, result), accept_gzip)
         else:
             # it would be static file
 
             # To adapt the path to static path, '/' should be removed
             path = path[1:]
 
-            # Check if static file exists and get it
+            # Check if static file exists and get it (from the static file cache)
             exists, static_file = self.router.static_path_exists(path)
 
             logger.debug(f"Static file exists: {exists}")
             logger.debug(f"Path {path}")
 
+            if exists and result['method'] not in ('GET', 'HEAD'):
+                # static files are read-only
+                if result['method'] == 'OPTIONS':
+                    return HttpResult.options(self.STATIC_ALLOW)
+
+                return HttpResult.r405(self.STATIC_ALLOW)
+
             if exists:
                 # Check if static file exists
                 if static_file is not None:
-                    # Get file extension
-                    file_extension = path.split('.')[-1]
-
-                    # Create response
-                    response = Response(status_code=200)
-
-                    # check if it's a mime-type
-                    if f'.{file_extension}' in mimetypes.types_map:
-                        # Get content type
-                        content_type = mimetypes.types_map[f".{file_extension}"]
-
-                        # Set content type
-                        response.set_content_type(content_type)
+                    # byte ranges of the file (resumed downloads, media seeking)
+                    ranges = None
+                    if result['method'] == 'GET':
+                        ranges = self._byte_ranges(static_file.etag, static_file.mtime, static_file.size,
+                                                   result['headers'])
+
+                    # gzip variant (created on the first request, see StaticFileCache.gzip),
+                    # ranges always refer to the file itself
+                    gzip_variant = ranges is None and accept_gzip and self.router.STATIC_CACHE.gzip(static_file)
+                    etag = static_file.gzip_etag if gzip_variant else static_file.etag
+
+                    if self._not_modified(etag, static_file.mtime, result['headers']):
+                        # the client (or the CDN) has the current version
+                        response = Response(status_code=304)
+                    elif ranges == []:
+                        # none of the ranges overlaps the file
+                        response = HttpResult.r416(static_file.size)
+                    elif ranges is not None:
+                        # the ranges are sent from the file (also for inlined files)
+                        try:
+                            if len(ranges) == 1:
+                                offset, length = ranges[0]
+                                response = FileResponse(static_file.path,
+                                                        status_code=206,
+                                                        content_type=static_file.content_type,
+                                                        offset=offset,
+                                                        length=length)
+                                response.set_header('Content-Range',
+                                                    f"bytes {offset}-{offset + length - 1}/{static_file.size}")
+                            else:
+                                response = FileResponse(static_file.path,
+                                                        status_code=206,
+                                                        content_type=static_file.content_type,
+                                                        ranges=ranges)
+                        except OSError:
+                            logger.warning(f"Static file cannot be opened - {result['method']} - {path}")
+                            return HttpResult.r404()
+                    elif static_file.data is not None:
+                        # small file, it is kept in memory
+                        data = static_file.gzip_data if gzip_variant else static_file.data
+                        response = Response(status_code=200, body=data)
+                        response.set_content_type(static_file.content_type)
                     else:
-                        response.set_content_type(f'.{file_extension}')
-
-                    # Set content length
-                    response.set_content_length(len(static_file))
+                        # large file, it is sent with sendfile (it is not read)
+                        response = None
+
+                        if gzip_variant:
+                            try:
+                                response = FileResponse(static_file.gzip_path,
+                                                        status_code=200,
+                                                        content_type=static_file.content_type)
+                            except OSError:
+                                # evicted (and removed) since gzip() returned, the file itself is sent
+                                gzip_variant = False
+                                etag = static_file.etag
+
+                        if response is None:
+                            try:
+                                response = FileResponse(static_file.path,
+                                                        status_code=200,
+                                                        content_type=static_file.content_type)
+                            except OSError:
+                                logger.warning(f"Static file cannot be opened - {result['method']} - {path}")
+                                return HttpResult.r404()
+
+                    if gzip_variant:
+                        response.set_header('Content-Encoding', 'gzip')
+
+                    if static_file.compressible:
+                        # the response depends on Accept-Encoding (for caches)
+                        response.set_header('Vary', 'Accept-Encoding')
+
+                    # Validators for conditional requests
+                    response.set_header('Accept-Ranges', 'bytes')
+                    response.set_header('ETag', etag)
+                    response.set_header('Last-Modified', static_file.last_modified)
 
                     # Set cache control
                     response.set_cache_control('max-age=3600')
 
-                    # Set body
-                    response.set_body(static_file)
-
                     # Set date
-                    response.set_date(datetime.now())
-
-                    # Check if session id exists
-                    if cookies is None or 'session_id' not in cookies:
-                        # Set session id to cookies
-                        response.set_session(Session())
-                    else:
-                        # Session id exists, set it from cookies
-                        session_id = cookies['session_id']
-
-                        # Check session id is valid
-                        if Session.check_session_id_is_valid(session_id):
-                            # Set session id to cookies
-                            response.set_session(Session(session_id=session_id))
-                        else:
-                            # Add session id to cookies
-                            response.set_session(Session())
+                    response.set_date(formatdate(usegmt=True))
 
                     # Return response
                     return response
@@ -630,69 +1626,280 @@ class RequestHandler(BaseRequestHandler):
         logger.warning(f"Path does not exist - {result['method']} - {path}")
         return HttpResult.r404()
 
-    def _handle_func_args(self, func, result):
+    @staticmethod
+    def _not_modified(current_etag, mtime, headers):
         """
-        Handle arguments of router function
-        :param func:
+        Check the conditional request headers (RFC 9110, 13.1.2 and 13.1.3)
+        :param current_etag: ETag of the selected representation
+        :param mtime: modification time of the file (seconds)
+        :param headers: request headers
+        :return: True if `304 Not Modified` can be answered
+        """
+        if not headers:
+            return False
+
+        if_none_match = None
+        if_modified_since = None
+        for key, value in headers.items():
+            key = key.lower()
+            if key == 'if-none-match':
+                if_none_match = value
+            elif key == 'if-modified-since':
+                if_modified_since = value
+
+        # If-None-Match takes precedence (weak comparison, 'W/' is ignored)
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+
+            for etag in if_none_match.split(','):
+                etag = etag.strip()
+                if etag.startswith('W/'):
+                    etag = etag[2:]
+
+                if etag == current_etag:
+                    return True
+
+            return False
+
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                # invalid dates are ignored
+                return False
+
+            if since is None or since.tzinfo is None:
+                return False
+
+            return mtime <= since.timestamp()
+
+        return False
+
+    @classmethod
+    def _byte_ranges(cls, etag, mtime, size, headers):
+        """
+        Parse the Range header of a request (RFC 9110, 14.2 and 13.1.5)
+        Overlapping and adjacent ranges are merged, so a part is never sent twice.
+        :param etag: ETag of the file
+        :param mtime: modification time of the file (seconds)
+        :param size: size of the file
+        :param headers: request headers
+        :return: None to send the whole file, otherwise a list of (offset, length)
+            (empty if none of the ranges can be satisfied)
+        """
+        if not headers:
+            return None
+
+        range_header = None
+        if_range = None
+        for key, value in headers.items():
+            key = key.lower()
+            if key == 'range':
+                range_header = value
+            elif key == 'if-range':
+                if_range = value
+
+        if range_header is None:
+            return None
+
+        # If-Range: the ranges are only sent if the client has the current version
+        if if_range is not None:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                # strong comparison, weak ETags never match
+                if if_range != etag:
+                    return None
+            else:
+                try:
+                    date = parsedate_to_datetime(if_range)
+                except (TypeError, ValueError):
+                    return None
+
+                if date is None or date.tzinfo is None or date.timestamp() != mtime:
+                    return None
+
+        unit, _, specs = range_header.partition('=')
+        if unit.strip().lower() != 'bytes':
+            # unknown range units are ignored
+            return None
+
+        ranges = []
+        for spec in specs.split(','):
+            spec = spec.strip()
+            if not spec:
+                continue
+
+            first, separator, last = spec.partition('-')
+            first = first.strip()
+            last = last.strip()
+
+            if not separator or not cls._is_digits(first) or not cls._is_digits(last):
+                # invalid Range headers are ignored
+                return None
+
+            if not first:
+                if not last:
+                    return None
+
+                # suffix range: the last bytes of the file
+                length = min(int(last), size)
+                if length > 0:
+                    ranges.append((size - length, size))
+                continue
+
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+
+            if start < size:
+                ranges.append((start, min(end, size)))
+
+        if not ranges:
+            return []
+
+        ranges.sort()
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        if len(merged) > cls.MAX_RANGES:
+            # too many parts, the whole file is cheaper
+            return None
+
+        return [(start, end - start) for start, end in merged]
+
+    @staticmethod
+    def _is_digits(value):
+        """
+        Check if a range position is empty (open range) or an ASCII decimal number.
+        :param value:
+        :return:
+        """
+        return not value or (value.isascii() and value.isdigit())
+
+    def _route_response(self, result, request):
+        """
+        Turn the return value of a route function into a Response
         :param result:
+        :param request: parsed request (its session, if the route function has created one)
+        :return:
+        """
+        if isinstance(result, CannedResponse):
+            # shared (e.g. `return HttpResult.r404()`), it does not get a session
+            return result
+
+        if not isinstance(result, Response):
+            if result is None:
+                result = HttpResult.r200()
+            else:
+                # we create a respone for raw-text
+                result = Response(status_code=200, body=result if isinstance(result, str) else str(result))
+
+                # Content-Type is Text-plain
+                result.set_header('Content-Type', 'text/plain')
+
+        # the session is created lazily (see LazySession), its cookie is only sent when it is new
+        session = request.get('session')
+        if session is not None and session.created and result.session is None:
+            result.set_session(session)
+
+        return result
+
+    async def _await_route(self, route, coroutine, request, accept_gzip=False):
+        """
+        Await a coroutine route function (event-loop server) and turn its
+        return value into a Response
+        :param route:
+        :param coroutine:
+        :param request: parsed request
+        :param accept_gzip: the client accepts gzip responses
         :return:
         """
-        # Get cookies
         try:
-            cookies = result['headers']['Cookie']
-        except KeyError:
-            cookies = None
+            result = await coroutine
+        except ValidationError as e:
+            logger.info(f"Invalid parameters - {route.method} - {route.path} - {e.errors}")
+            return HttpResult.r422(e.errors)
+        except Exception as e:
+            logger.error(e)
+            print_exc()
+            return HttpResult.r500()
+        finally:
+            route.release()
 
-        method = result['method']
+        return self._compress(self._route_response(result, request), accept_gzip)
 
-        # Create local thread for arguments
-        local = threading.local()
-        local.args = []
+    def _compress(self, response, accept_gzip):
+        """
+        Compress the body of a dynamic response with gzip (if it is worth it).
+        :param response:
+        :param accept_gzip: the client accepts gzip responses
+        :return:
+        """
+        if not self.compression_level or isinstance(response, (StreamingResponse, FileResponse, CannedResponse)):
+            return response
 
-        # check if func has parameters
-        if func.__code__.co_argcount > 0:
-            # get parameters of function
-            params = inspect.signature(func).parameters
+        if response.status_code in (204, 304) or response.headers is None:
+            return response
 
-            # get type hints of function
-            type_hints = get_type_hints(func)
+        if 'Content-Encoding' in response.headers \
+                or not is_compressible(response.headers.get('Content-Type', response.content_type)):
+            return response
 
-            # TODO: Add more types?
-            # TODO: Query parameters will be added
-            for param_name, param in params.items():
-                # get type of parameter
-                try:
-                    param_type = type_hints[param_name]
-                except KeyError:
-                    param_names = func.__code__.co_varnames
-                    logger.debug(f'The parameter `{param_names}` does not have any type hints. '
-                                 f'It must have type hints; otherwise, the arguments of the route '
-                                 f'function will be set as `None`.')
-                    local.args.append(None)
-                    continue
+        body = response._body_as_bytes()
+        if len(body) < self.compression_min_size:
+            return response
 
-                # check the name of type of parameter
-                if param_type == Request:
-                    # Request type, add the request
-                    request = Request(method=result['method'],
-                                      path=result['path'],
-                                      headers=result['headers'],
-                                      raw_body=result['raw_body'],
-                                      body=result['body'],
-                                      query_params=result['query_params'])
-
-                    local.args.append(request)
-                elif param_type == Session:
-                    if cookies is not None and 'session_id' in cookies:
-                        # Session id exists, get the session
-                        session_id = cookies['session_id']
-
-                        # Add the session to the arguments
-                        local.args.append(Session.get_session(session_id))
-                else:
-                    logger.warning(f"Unknown parameter type - {param_name} - {param_type}")
-                    logger.warning(f"Probably we don't support this type yet but we need to add as argument")
-                    local.args.append(None)
+        # the response depends on Accept-Encoding (for caches)
+        vary = response.headers.get('Vary')
+        response.headers['Vary'] = f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'
+
+        if accept_gzip:
+            response.body = gzip.compress(body, compresslevel=self.compression_level)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            # already encoded, so it is not encoded again
+            response.body = body
+
+        return response
 
-        # return the function and the arguments
-        return func, local.args
+    @staticmethod
+    def _accepts_gzip(headers):
+        """
+        Check if the client accepts gzip responses (`Accept-Encoding`).
+        :param headers: request headers
+        :return:
+        """
+        if not headers:
+            return False
+
+        accept_encoding = headers.get('Accept-Encoding')
+        if accept_encoding is None:
+            for key, value in headers.items():
+                if key.lower() == 'accept-encoding':
+                    accept_encoding = value
+                    break
+            else:
+                return False
+
+        for coding in accept_encoding.split(','):
+            name, _, params = coding.partition(';')
+            name = name.strip().lower()
+
+            if name in ('gzip', 'x-gzip', '*'):
+                # 'gzip;q=0' means "not acceptable"
+                params = params.replace(' ', '')
+                if params.startswith('q='):
+                    try:
+                        if float(params[2:]) == 0:
+                            continue
+                    except ValueError:
+                        pass
+                return True
+
+        return False
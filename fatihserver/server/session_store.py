@@ -0,0 +1,305 @@
+"""
+Session stores for *FatihServer*
+
+A session store keeps the data of the sessions by session id. Sessions expire:
+
+    - idle timeout: the session was not used for `idle_timeout` seconds
+    - absolute timeout: the session was created `absolute_timeout` seconds ago
+
+and the store holds at most `max_entries` sessions, the least recently used
+session is evicted to make room for a new one.
+
+Expired sessions are never returned (get() checks the deadlines), and a
+background thread (see SessionStore.start_sweeper()) removes them, so the
+memory of abandoned sessions is released even if they are never requested again.
+
+MemorySessionStore is the default store (in the memory of the process, so the
+workers of the pre-fork mode do not share sessions). Other backends implement
+the methods of SessionStore.
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from loguru import logger
+
+
+class SessionStore:
+    """
+    Base class of the session stores
+
+    Entries are dictionaries: {'session_id', 'data', 'created_at'}, `data` is the
+    dictionary of the session (it is changed in place).
+    """
+
+    def __init__(self, idle_timeout=30 * 60, absolute_timeout=24 * 60 * 60, max_entries=100000):
+        """
+        Initialize SessionStore class with the limits.
+        :param idle_timeout: seconds a session is kept without requests (None: no idle timeout)
+        :param absolute_timeout: seconds a session is kept after its creation (None: no absolute timeout)
+        :param max_entries: max. number of sessions (None: unlimited)
+        """
+        if max_entries is not None and max_entries < 1:
+            raise Exception(f"Session store must hold at least one session: {max_entries}")
+
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+        self.max_entries = max_entries
+
+        self._sweeper = None
+        self._stop_sweeper = None
+
+        # number of start_sweeper() calls without stop_sweeper() (servers using the store)
+        self._sweeper_users = 0
+        self._sweeper_lock = threading.Lock()
+
+    def get(self, session_id):
+        """
+        Get the entry of a session (using the session resets its idle timeout).
+        :param session_id:
+        :return: entry or None if the session does not exist or has expired
+        """
+        raise NotImplementedError
+
+    def create(self, session_id, data=None, created_at=None):
+        """
+        Add a new session (an existing session is never replaced).
+        :param session_id:
+        :param data: dictionary of the session
+        :param created_at: datetime of the creation
+        :return: entry or None if the session id is already in use
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """
+        Remove a session.
+        :param session_id:
+        :return: True if the session existed
+        """
+        raise NotImplementedError
+
+    def sweep(self):
+        """
+        Remove the expired sessions.
+        :return: number of removed sessions
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Remove every session.
+        :return:
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def start_sweeper(self, interval=60):
+        """
+        Sweep the store every `interval` seconds in a background (daemon) thread.
+        It is started by the server (in every worker process of the pre-fork mode).
+        Every call must be paired with stop_sweeper(), the thread runs until the
+        last server that uses the store stops.
+        :param interval:
+        :return:
+        """
+        with self._sweeper_lock:
+            self._sweeper_users += 1
+
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+
+            stop = self._stop_sweeper = threading.Event()
+            self._sweeper = threading.Thread(target=self._sweep_forever, args=(interval, stop),
+                                             name="FatihServer-SessionSweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        """
+        Stop the background thread of start_sweeper() (when no other server uses it).
+        :return:
+        """
+        with self._sweeper_lock:
+            self._sweeper_users = max(self._sweeper_users - 1, 0)
+
+            if self._sweeper is None or self._sweeper_users:
+                return
+
+            self._stop_sweeper.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def _sweep_forever(self, interval, stop):
+        """
+        Loop of the sweeper thread.
+        :param interval:
+        :param stop: Event that stops the loop
+        :return:
+        """
+        while not stop.wait(interval):
+            try:
+                removed = self.sweep()
+            except Exception as e:
+                logger.error(f"Expired sessions could not be removed: {e}")
+                continue
+
+            if removed:
+                logger.debug(f"{removed} expired session(s) removed, {len(self)} left")
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Session store in the memory of the process
+
+    The sessions are kept in an OrderedDict in the order of their last use (for
+    the LRU eviction), the deadlines are kept in a heap. The heap is not updated
+    when a session is used: the sweeper pops the passed deadlines and pushes the
+    session again with its new deadline if it was used in the meantime, so a
+    request costs O(1) and a sweep O(log n) per popped deadline.
+    """
+
+    def __init__(self, idle_timeout=30 * 60, absolute_timeout=24 * 60 * 60, max_entries=100000,
+                 clock=time.monotonic):
+        """
+        Initialize MemorySessionStore class (see SessionStore).
+        :param idle_timeout:
+        :param absolute_timeout:
+        :param max_entries:
+        :param clock: function that returns the current time in seconds (monotonic)
+        """
+        super().__init__(idle_timeout, absolute_timeout, max_entries)
+
+        self.clock = clock
+
+        # session id: [entry, created (clock), last use (clock)]
+        self.entries = OrderedDict()
+
+        # (deadline, session id), a deadline can be older than the deadline of the session
+        self.deadlines = []
+
+        self._lock = threading.Lock()
+
+    def _deadline(self, created, used):
+        """
+        Time the session expires at.
+        :param created:
+        :param used:
+        :return: deadline or None if the session does not expire
+        """
+        idle_timeout, absolute_timeout = self.idle_timeout, self.absolute_timeout
+
+        if idle_timeout is None:
+            return None if absolute_timeout is None else created + absolute_timeout
+
+        if absolute_timeout is None:
+            return used + idle_timeout
+
+        return min(used + idle_timeout, created + absolute_timeout)
+
+    def get(self, session_id):
+        now = self.clock()
+
+        with self._lock:
+            item = self.entries.get(session_id)
+            if item is None:
+                return None
+
+            deadline = self._deadline(item[1], item[2])
+            if deadline is not None and deadline <= now:
+                del self.entries[session_id]
+                return None
+
+            item[2] = now
+            self.entries.move_to_end(session_id)
+
+            return item[0]
+
+    def create(self, session_id, data=None, created_at=None):
+        now = self.clock()
+
+        entry = {
+            'session_id': session_id,
+            'data': {} if data is None else data,
+            'created_at': datetime.now() if created_at is None else created_at
+        }
+
+        with self._lock:
+            if session_id in self.entries:
+                return None
+
+            self.entries[session_id] = [entry, now, now]
+
+            deadline = self._deadline(now, now)
+            if deadline is not None:
+                heapq.heappush(self.deadlines, (deadline, session_id))
+
+            if self.max_entries is not None:
+                while len(self.entries) > self.max_entries:
+                    # the least recently used session (its deadline stays in the heap until it is compacted)
+                    self.entries.popitem(last=False)
+
+                self._compact()
+
+        return entry
+
+    def delete(self, session_id):
+        with self._lock:
+            return self.entries.pop(session_id, None) is not None
+
+    def sweep(self):
+        now = self.clock()
+        removed = 0
+
+        with self._lock:
+            deadlines = self.deadlines
+
+            while deadlines and deadlines[0][0] <= now:
+                _, session_id = heapq.heappop(deadlines)
+
+                item = self.entries.get(session_id)
+                if item is None:
+                    # deleted or evicted
+                    continue
+
+                deadline = self._deadline(item[1], item[2])
+                if deadline <= now:
+                    del self.entries[session_id]
+                    removed += 1
+                else:
+                    # used since the deadline was pushed
+                    heapq.heappush(deadlines, (deadline, session_id))
+
+            if removed > len(self.entries):
+                # dictionaries do not shrink when their items are removed
+                self.entries = OrderedDict(self.entries)
+
+            self._compact()
+
+        return removed
+
+    def _compact(self):
+        """
+        Drop the deadlines of deleted and evicted sessions when they are the majority
+        of the heap (so it is rebuilt once per O(n) evictions). Called with the lock held.
+        :return:
+        """
+        if len(self.deadlines) > 2 * len(self.entries) + 64:
+            self.deadlines = [(deadline, session_id) for deadline, session_id in self.deadlines
+                              if session_id in self.entries]
+            heapq.heapify(self.deadlines)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.deadlines.clear()
+
+    def __len__(self):
+        return len(self.entries)
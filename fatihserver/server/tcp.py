@@ -1,8 +1,237 @@
+import queue
 import socket
 import threading
+import time
 from socketserver import BaseRequestHandler, ThreadingMixIn, TCPServer
 
+from fatihserver.server.request_handler import HttpResult
+
+from loguru import logger
+
+
+class GracefulShutdownMixin:
+    """
+    Graceful shutdown for socketserver based servers
+
+    After shutdown(), serve_forever() stops accepting connections but only returns
+    when the requests in progress are answered (or `graceful_timeout` seconds passed).
+    Keep-alive connections are closed after their current request.
+    """
+    # seconds to wait for the requests in progress (HttpServer overrides it)
+    graceful_timeout = 30
+
+    # request size limits (HttpServer overrides them)
+    max_header_size = 65536
+    max_body_size = 10 * 1024 * 1024
+
+    # streamed request bodies: spool() keeps this many bytes in memory
+    spill_threshold = 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        self.draining = False
+        self._active_requests = 0
+        self._active_requests_lock = threading.Lock()
+
+        super().__init__(*args, **kwargs)
+
+    def request_started(self):
+        """
+        Called by the request handler before it processes a request.
+        :return:
+        """
+        with self._active_requests_lock:
+            self._active_requests += 1
+
+    def request_finished(self):
+        """
+        Called by the request handler after the response is sent.
+        :return:
+        """
+        with self._active_requests_lock:
+            self._active_requests -= 1
+
+    def serve_forever(self, poll_interval=0.5):
+        super().serve_forever(poll_interval)
+
+        # wait for the requests in progress
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._active_requests > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def shutdown(self):
+        self.draining = True
+        super().shutdown()
+
 
 # TODO: We will implement our own TCP Server in the future
-class ThreadedTCPServer(ThreadingMixIn, TCPServer):
-    pass
+class ThreadedTCPServer(GracefulShutdownMixin, ThreadingMixIn, TCPServer):
+    # Threads of idle keep-alive connections must not keep the process alive
+    daemon_threads = True
+
+    # Persistent connections (HttpServer overrides them)
+    keep_alive_timeout = 5
+    max_keep_alive_requests = 100
+
+
+class PooledTCPServer(GracefulShutdownMixin, TCPServer):
+    """
+    TCPServer with a bounded pool of worker threads (instead of a thread per connection)
+
+    Accepted connections are put into a bounded queue and served by the workers.
+    The pool grows from `min_workers` up to `max_workers` when there is no idle
+    worker and shrinks back when workers are idle for `worker_idle_timeout` seconds.
+    When the queue is full, the connection is answered with the canned
+    `503 Service Unavailable` of HttpResult (with `Retry-After` and the custom
+    error page if there is one) and closed right away.
+
+    Note: a worker serves a connection until it is closed, so idle keep-alive
+    connections also hold a worker (keep `keep_alive_timeout` short).
+    """
+    # Persistent connections (HttpServer overrides them)
+    keep_alive_timeout = 5
+    max_keep_alive_requests = 100
+
+    # Workers above `min_workers` exit after being idle for this many seconds
+    worker_idle_timeout = 30
+
+    def __init__(self,
+                 server_address,
+                 RequestHandlerClass,
+                 min_workers=4,
+                 max_workers=64,
+                 queue_size=128,
+                 bind_and_activate=True):
+        """
+        Initialize PooledTCPServer class.
+        :param server_address:
+        :param RequestHandlerClass:
+        :param min_workers: workers that are always running
+        :param max_workers: upper bound of worker threads
+        :param queue_size: max. number of accepted connections waiting for a worker
+        :param bind_and_activate:
+        """
+        if min_workers < 0 or max_workers < 1 or min_workers > max_workers:
+            raise Exception(f"Invalid worker pool size: min_workers={min_workers}, max_workers={max_workers}")
+
+        if queue_size < 1:
+            raise Exception(f"Invalid queue size: {queue_size}")
+
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.connections = queue.Queue(maxsize=queue_size)
+
+        self._workers_lock = threading.Lock()
+        self._workers = 0
+        self._idle_workers = 0
+
+    def serve_forever(self, poll_interval=0.5):
+        # Workers are started here and not in __init__, because
+        # threads do not survive fork() (pre-fork mode)
+        for _ in range(self.min_workers):
+            self._spawn_worker()
+
+        super().serve_forever(poll_interval)
+
+    def _spawn_worker(self):
+        """
+        Start a new worker thread (caller makes sure we are below `max_workers`).
+        :return:
+        """
+        with self._workers_lock:
+            self._workers += 1
+            self._idle_workers += 1
+
+        thread = threading.Thread(target=self._worker, name=f"FatihServer-Worker-{self._workers}", daemon=True)
+        thread.start()
+
+    def _worker(self):
+        """
+        Worker loop: serve queued connections until the server is closed.
+        :return:
+        """
+        while True:
+            try:
+                connection = self.connections.get(timeout=self.worker_idle_timeout)
+            except queue.Empty:
+                with self._workers_lock:
+                    if self._workers > self.min_workers:
+                        # shrink the pool
+                        self._workers -= 1
+                        self._idle_workers -= 1
+                        return
+                continue
+
+            if connection is None:
+                # server is closed
+                return
+
+            with self._workers_lock:
+                self._idle_workers -= 1
+
+            request, client_address = connection
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+            with self._workers_lock:
+                self._idle_workers += 1
+
+    def process_request(self, request, client_address):
+        """
+        Queue the connection for the workers (called by serve_forever).
+        :param request:
+        :param client_address:
+        :return:
+        """
+        try:
+            self.connections.put_nowait((request, client_address))
+        except queue.Full:
+            logger.warning(f"Connection queue is full, rejecting {client_address}")
+            self._reject(request)
+            return
+
+        with self._workers_lock:
+            grow = self._idle_workers < self.connections.qsize() and self._workers < self.max_workers
+
+        if grow:
+            self._spawn_worker()
+
+    def _reject(self, request):
+        """
+        Answer 503 and close the connection without blocking the accept loop.
+        :param request:
+        :return:
+        """
+        try:
+            request.setblocking(False)
+            # pre-encoded, so rejecting a connection costs (almost) nothing
+            request.send(HttpResult.r503().as_buffers(False)[0])
+
+            # read what the client has sent so far, so closing the
+            # socket does not reset the connection before the 503 arrives
+            request.recv(65536)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        """
+        Close the listening socket and stop the workers.
+        :return:
+        """
+        super().server_close()
+
+        with self._workers_lock:
+            workers = self._workers
+
+        for _ in range(workers):
+            try:
+                self.connections.put_nowait(None)
+            except queue.Full:
+                break
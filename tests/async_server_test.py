@@ -0,0 +1,133 @@
+import asyncio
+import http.client
+import time
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+from fatihserver.server.request_handler import Response, FileResponse
+from server_helpers import ServerTestMixin
+
+router = HttpRouter()
+
+
+@router.get("/async-server-test")
+def index():
+    response = Response(status_code=200, body="Hello from the event loop")
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/async-server-test/coroutine")
+async def coroutine_index():
+    await asyncio.sleep(0.01)
+
+    response = Response(status_code=200, body="Hello from a coroutine")
+    response.set_content_type("text/plain")
+    return response
+
+
+# FileResponses of /async-server-test/file (the test checks that they are closed)
+file_responses = []
+
+
+@router.get("/async-server-test/file")
+async def file_index():
+    # the client closes the connection meanwhile
+    await asyncio.sleep(0.2)
+
+    response = FileResponse(__file__, content_type="text/plain")
+    file_responses.append(response)
+    return response
+
+
+class TestAsyncServer(ServerTestMixin, unittest.TestCase):
+    """
+    Test class for the asyncio backend
+    """
+    router = router
+    backend = "asyncio"
+
+    def test_get(self):
+        """
+        Simple GET request
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/async-server-test")
+        response = connection.getresponse()
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), b"Hello from the event loop")
+        connection.close()
+
+    def test_keep_alive(self):
+        """
+        Several requests over the same connection
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for _ in range(3):
+            connection.request("GET", "/async-server-test")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), b"Hello from the event loop")
+
+        connection.close()
+
+    def test_coroutine_handler(self):
+        """
+        Coroutine route functions are awaited and answered in order
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path, body in (("/async-server-test/coroutine", b"Hello from a coroutine"),
+                           ("/async-server-test", b"Hello from the event loop")):
+            connection.request("GET", path)
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), body)
+
+        connection.close()
+
+    def test_closed_before_response(self):
+        """
+        The file of a response is closed if the client is gone when the coroutine returns it
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(b"GET /async-server-test/file HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        sock.close()
+
+        deadline = time.monotonic() + 5
+        while not file_responses and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        time.sleep(0.1)
+        self.assertTrue(file_responses[0].file.closed)
+
+    def test_not_found(self):
+        """
+        Unknown path returns 404
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/does-not-exist")
+        response = connection.getresponse()
+
+        self.assertEqual(response.status, 404)
+        connection.close()
+
+    def test_unknown_backend(self):
+        """
+        Unknown backends are rejected
+        :return:
+        """
+        with self.assertRaises(Exception):
+            HttpServer(router=router, backend="gevent")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import gzip
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+from fatihserver.server.request_handler import Response
+from server_helpers import ServerTestMixin
+
+router = HttpRouter()
+
+REPORT = "".join(f"line {i}: everything is fine\n" for i in range(2000))
+
+
+@router.get("/compression-test/report")
+def report():
+    response = Response(status_code=200, body=REPORT)
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/compression-test/small")
+def small():
+    response = Response(status_code=200, body="small")
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/compression-test/async-report")
+async def async_report():
+    response = Response(status_code=200, body=REPORT)
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/compression-test/binary")
+def binary():
+    response = Response(status_code=200, body=bytes(range(256)) * 100)
+    response.set_content_type("application/octet-stream")
+    return response
+
+
+class CompressionTestMixin(ServerTestMixin):
+    """
+    Response compression tests, run against both backends
+    """
+    router = router
+    server_options = {'compression_level': 6}
+
+    def get(self, path, accept_encoding=None):
+        headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+        self.connection.request("GET", path, headers=headers)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_gzip(self):
+        """
+        Large text responses are gzipped for clients that accept it
+        :return:
+        """
+        for path in ("/compression-test/report", "/compression-test/async-report"):
+            response, body = self.get(path, "gzip, deflate")
+
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+            self.assertEqual(int(response.getheader("Content-Length")), len(body))
+            self.assertEqual(gzip.decompress(body).decode(), REPORT)
+
+    def test_not_accepted(self):
+        """
+        Clients without (or refusing) gzip get the plain body
+        :return:
+        """
+        for accept_encoding in (None, "identity", "gzip;q=0", "br"):
+            response, body = self.get("/compression-test/report", accept_encoding)
+
+            self.assertIsNone(response.getheader("Content-Encoding"))
+            self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+            self.assertEqual(body.decode(), REPORT)
+
+    def test_not_worth_it(self):
+        """
+        Small and incompressible responses are not compressed
+        :return:
+        """
+        response, body = self.get("/compression-test/small", "gzip")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, b"small")
+
+        response, body = self.get("/compression-test/binary", "gzip")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, bytes(range(256)) * 100)
+
+
+class TestCompressionThreaded(CompressionTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestCompressionAsyncio(CompressionTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+class TestCompressionDisabled(CompressionTestMixin, unittest.TestCase):
+    backend = "threaded"
+    server_options = {'compression_level': 0}
+
+    def test_gzip(self):
+        """
+        compression_level=0 disables compression
+        :return:
+        """
+        response, body = self.get("/compression-test/report", "gzip")
+
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertIsNone(response.getheader("Vary"))
+        self.assertEqual(body.decode(), REPORT)
+
+    def test_not_accepted(self):
+        pass
+
+
+class TestCompressionPerServer(unittest.TestCase):
+    """
+    Compression options of one server do not change the other servers of the process
+    """
+
+    def test_two_servers(self):
+        servers = [HttpServer(router=router, host="127.0.0.1", port=0, backend="asyncio",
+                              compression_level=level, compression_min_size=size).create_server()
+                   for level, size in ((0, 100), (9, 2048))]
+        try:
+            self.assertEqual([(server.compression_level, server.compression_min_size) for server in servers],
+                             [(0, 100), (9, 2048)])
+        finally:
+            for server in servers:
+                server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
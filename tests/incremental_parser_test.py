@@ -0,0 +1,229 @@
+import unittest
+
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser, HttpParserError
+
+case0 = b"POST https://website.com/cgi-bin/process.cgi?lang=en&debug HTTP/1.1\r\n" \
+        b"User-Agent: Mozilla/4.0 (compatible; MSIE5.01; Windows NT)\r\n" \
+        b"Host: www.website.com:8080\r\n" \
+        b"Content-Type: application/json; charset=utf-8\r\n" \
+        b"Content-Length: 20\r\n" \
+        b"Cookie: session_id=abc; theme=dark\r\n" \
+        b"Connection: Keep-Alive\r\n" \
+        b"\r\n" \
+        b'{"licenseID": "abc"}'
+
+case1 = b"GET /index HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+class Test(unittest.TestCase):
+    """
+    Test class for IncrementalHttpRequestParser
+    """
+
+    def test_case0(self):
+        """
+        Request line, headers and body
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+        parser.feed(case0)
+        result = parser.next_request()
+
+        headers = result['headers']
+        self.assertEqual(result['method'], "POST")
+        self.assertEqual(result['path'], "/cgi-bin/process.cgi")
+        self.assertEqual(result['version'], "HTTP/1.1")
+        self.assertEqual(result['query_params'], {'lang': 'en', 'debug': ''})
+        self.assertEqual(headers['User-Agent'], "Mozilla/4.0 (compatible; MSIE5.01; Windows NT)")
+        self.assertEqual(headers['Host'], "www.website.com:8080")
+        self.assertEqual(headers['Cookie'], {'session_id': 'abc', 'theme': 'dark'})
+        self.assertEqual(result['body'], {'type': 'json', 'data': {'licenseID': 'abc'}})
+        self.assertEqual(result['raw_body'], '{"licenseID": "abc"}')
+        self.assertTrue(result['keep_alive'])
+
+    def test_header_case(self):
+        """
+        Content-Type is found whatever the case of its name (HTTP/2 proxies send lowercase names)
+        :return:
+        """
+        for name in (b"content-type", b"CONTENT-TYPE"):
+            parser = IncrementalHttpRequestParser()
+            parser.feed(b"POST /items HTTP/1.1\r\n" + name + b": Application/JSON\r\n"
+                        b"content-length: 10\r\n\r\n{\"id\": 42}")
+            result = parser.next_request()
+
+            self.assertEqual(result['headers']['Content-Type'], "Application/JSON")
+            self.assertEqual(result['body'], {'type': 'json', 'data': {'id': 42}})
+
+    def test_byte_by_byte(self):
+        """
+        The request is complete only after the last byte
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+
+        for i in range(len(case0) - 1):
+            parser.feed(memoryview(case0)[i:i + 1])
+            self.assertIs(parser.next_request(), parser.NEED_MORE_DATA)
+
+        parser.feed(case0[-1:])
+        self.assertEqual(parser.next_request()['path'], "/cgi-bin/process.cgi")
+
+    def test_pipelining(self):
+        """
+        One parser, several requests in the buffer
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+        parser.feed(case1 + case0 + case1[:10])
+
+        self.assertEqual(parser.next_request()['path'], "/index")
+        self.assertEqual(parser.next_request()['method'], "POST")
+        self.assertIs(parser.next_request(), parser.NEED_MORE_DATA)
+
+        parser.feed(case1[10:])
+        result = parser.next_request()
+        self.assertEqual(result['path'], "/index")
+        self.assertIsNone(result['body'])
+        self.assertIsNone(result['query_params'])
+
+    def test_connection_close(self):
+        """
+        Connection header and HTTP/1.0
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"
+                    b"GET / HTTP/1.0\r\n\r\n"
+                    b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+
+        self.assertFalse(parser.next_request()['keep_alive'])
+        self.assertFalse(parser.next_request()['keep_alive'])
+        self.assertTrue(parser.next_request()['keep_alive'])
+
+    def test_invalid(self):
+        """
+        Invalid request line, header line and Content-Length
+        :return:
+        """
+        for data in (b"GET\r\n\r\n",
+                     b"GET / HTTP/1.1\r\nHost\r\n\r\n",
+                     b"POST / HTTP/1.1\r\nContent-Length: length\r\n\r\n",
+                     "POST / HTTP/1.1\r\nContent-Length: \xb2\r\n\r\n".encode('latin-1')):
+            parser = IncrementalHttpRequestParser()
+            parser.feed(data)
+
+            with self.assertRaises(HttpParserError):
+                parser.next_request()
+
+    def test_chunked(self):
+        """
+        Chunked body, fed in small pieces
+        :return:
+        """
+        data = b"POST /upload HTTP/1.1\r\n" \
+               b"Content-Type: text/plain\r\n" \
+               b"Transfer-Encoding: chunked\r\n" \
+               b"\r\n" \
+               b"5;ext=1\r\nHello\r\n" \
+               b"7\r\n, World\r\n" \
+               b"0\r\n" \
+               b"Trailer: value\r\n" \
+               b"\r\n" + case1
+
+        parser = IncrementalHttpRequestParser()
+        result = parser.NEED_MORE_DATA
+        for i in range(0, len(data), 3):
+            parser.feed(data[i:i + 3])
+            if result is parser.NEED_MORE_DATA:
+                result = parser.next_request()
+
+        self.assertEqual(result['body'], {'type': 'text', 'data': 'Hello, World'})
+        self.assertEqual(parser.next_request()['path'], "/index")
+
+    def test_invalid_chunk_size(self):
+        """
+        Chunk sizes are hex digits only (optionally followed by extensions)
+        :return:
+        """
+        for size in (b"0x5", b"+5", b"-5", b"1_0", b" 5", b"5 ", b""):
+            parser = IncrementalHttpRequestParser()
+            parser.feed(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + size + b"\r\nHello\r\n0\r\n\r\n")
+
+            with self.assertRaises(HttpParserError):
+                parser.next_request()
+
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5 ;ext\r\nHello\r\n0\r\n\r\n")
+        self.assertEqual(parser.next_request()['raw_body'], "Hello")
+
+    def test_conflicting_content_length(self):
+        """
+        Different Content-Length values are rejected, repeated equal values are accepted
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"POST / HTTP/1.1\r\nContent-Length: 5\r\nContent-Length: 0\r\n\r\nHello")
+
+        with self.assertRaises(HttpParserError):
+            parser.next_request()
+
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"POST / HTTP/1.1\r\nContent-Type: text/plain\r\n"
+                    b"Content-Length: 5\r\nContent-Length: 5\r\n\r\nHello")
+        self.assertEqual(parser.next_request()['raw_body'], "Hello")
+
+    def test_large_body(self):
+        """
+        Bodies larger than the receive buffer are read completely
+        :return:
+        """
+        body = b"x" * 200000
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"POST / HTTP/1.1\r\nContent-Type: text/plain\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n")
+        parser.feed(body[:65536])
+        self.assertIs(parser.next_request(), parser.NEED_MORE_DATA)
+
+        parser.feed(body[65536:])
+        self.assertEqual(len(parser.next_request()['body']['data']), len(body))
+
+    def test_limits(self):
+        """
+        Too large heads (431), too large bodies (413), unsupported transfer codings (501)
+        :return:
+        """
+        parser = IncrementalHttpRequestParser(max_header_size=64, max_body_size=10)
+
+        for data, status_code in ((b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 100, 431),
+                                  (b"POST / HTTP/1.1\r\nContent-Length: 11\r\n\r\n", 413),
+                                  (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nb\r\n", 413),
+                                  (b"POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n", 501),
+                                  (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+                                   b"Content-Length: 1\r\n\r\n", 400)):
+            parser = IncrementalHttpRequestParser(max_header_size=64, max_body_size=10)
+            parser.feed(data)
+
+            with self.assertRaises(HttpParserError) as context:
+                parser.next_request()
+
+            self.assertEqual(context.exception.status_code, status_code)
+
+    def test_expect_continue(self):
+        """
+        `Expect: 100-continue` is reported until the body arrives
+        :return:
+        """
+        parser = IncrementalHttpRequestParser()
+        parser.feed(b"POST / HTTP/1.1\r\nContent-Length: 4\r\nExpect: 100-continue\r\n\r\n")
+
+        self.assertIs(parser.next_request(), parser.NEED_MORE_DATA)
+        self.assertTrue(parser.continue_expected)
+
+        parser.feed(b"body")
+        self.assertIsNotNone(parser.next_request())
+        self.assertFalse(parser.continue_expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
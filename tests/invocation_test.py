@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from fatihserver.framework.invocation import InvocationPlan
+from fatihserver.server.request_handler import Request, Session
+
+
+def parsed_request(path_params=None, cookies=None):
+    return {'method': 'GET',
+            'path': '/invocation-test',
+            'headers': {'Cookie': cookies} if cookies is not None else {},
+            'raw_body': None,
+            'body': None,
+            'query_params': None,
+            'path_params': path_params or {}}
+
+
+class TestInvocationPlan(unittest.TestCase):
+    """
+    Test class for InvocationPlan
+    """
+
+    def test_arguments(self):
+        """
+        Arguments are filled by name (path parameters) and by type hint
+        :return:
+        """
+        def route(user_id, request: Request, session: Session, other, *, keyword: Request):
+            return user_id, request, session, other, keyword
+
+        session = Session()
+        user_id, request, found_session, other, keyword = InvocationPlan(route, ["user_id"]).call(
+            parsed_request({"user_id": 7}, {"session_id": session.session_id}))
+
+        self.assertEqual(user_id, 7)
+        self.assertIsInstance(request, Request)
+        self.assertEqual(request.path_params, {"user_id": 7})
+        self.assertEqual(found_session.session_id, session.session_id)
+        self.assertTrue(found_session.exists)
+        self.assertIsNone(other)
+        self.assertIsInstance(keyword, Request)
+
+    def test_no_reflection_per_request(self):
+        """
+        The function is inspected when the plan is built, not when it is called
+        :return:
+        """
+        def route(request: Request):
+            return request.path
+
+        plan = InvocationPlan(route)
+
+        with mock.patch("inspect.signature") as signature, \
+                mock.patch("fatihserver.framework.invocation.get_type_hints") as type_hints:
+            for _ in range(3):
+                self.assertEqual(plan.call(parsed_request()), "/invocation-test")
+
+        signature.assert_not_called()
+        type_hints.assert_not_called()
+
+    def test_forward_reference(self):
+        """
+        Type hints that cannot be resolved yet are resolved on the first call
+        :return:
+        """
+        def route(request: "LaterRequest"):
+            return request
+
+        plan = InvocationPlan(route)
+        self.assertIsNone(plan.extractors)
+
+        globals()["LaterRequest"] = Request
+        try:
+            self.assertIsInstance(plan.call(parsed_request()), Request)
+        finally:
+            del globals()["LaterRequest"]
+
+
+if __name__ == '__main__':
+    unittest.main()
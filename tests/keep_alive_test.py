@@ -0,0 +1,99 @@
+import time
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import Response
+from server_helpers import ServerTestMixin, read_until_closed
+
+router = HttpRouter()
+
+
+@router.get("/keep-alive-test/one")
+def one():
+    response = Response(status_code=200, body="one")
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/keep-alive-test/two")
+def two():
+    response = Response(status_code=200, body="two")
+    response.set_content_type("text/plain")
+    return response
+
+
+def get(path, connection="keep-alive"):
+    return bytes(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: {connection}\r\n\r\n", 'ascii')
+
+
+class KeepAliveTestMixin(ServerTestMixin):
+    """
+    Persistent connection tests, run against both backends
+    """
+    router = router
+    server_options = {'keep_alive_timeout': 0.5, 'max_keep_alive_requests': 3}
+
+    def test_pipelining(self):
+        """
+        Pipelined requests are answered in order
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(get("/keep-alive-test/one") + get("/keep-alive-test/two", "close"))
+
+        data = read_until_closed(sock)
+
+        self.assertEqual(data.count(b"HTTP/1.1 200"), 2)
+        self.assertLess(data.index(b"one"), data.index(b"two"))
+        self.assertIn(b"Connection: keep-alive", data)
+        self.assertIn(b"Connection: close", data)
+
+    def test_max_requests(self):
+        """
+        The connection is closed after `max_keep_alive_requests` requests
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(get("/keep-alive-test/one") * 5)
+
+        data = read_until_closed(sock)
+
+        self.assertEqual(data.count(b"HTTP/1.1 200"), 3)
+
+    def test_idle_timeout(self):
+        """
+        Idle connections are closed after `keep_alive_timeout`
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(get("/keep-alive-test/one"))
+
+        start = time.monotonic()
+        data = read_until_closed(sock)
+
+        self.assertEqual(data.count(b"HTTP/1.1 200"), 1)
+        self.assertLess(time.monotonic() - start, 4)
+
+    def test_http10_closes(self):
+        """
+        HTTP/1.0 connections are closed unless the client asks for keep-alive
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(b"GET /keep-alive-test/one HTTP/1.0\r\n\r\n")
+
+        data = read_until_closed(sock)
+
+        self.assertIn(b"Connection: close", data)
+
+
+class TestKeepAliveThreaded(KeepAliveTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestKeepAliveAsyncio(KeepAliveTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import StreamingResponse
+from server_helpers import ServerTestMixin, text
+
+router = HttpRouter()
+
+
+@router.get("/methods-test/items/{item_id:int}")
+def get_item(item_id):
+    return text(f"item {item_id}")
+
+
+@router.put("/methods-test/items/{item_id:int}")
+def put_item(item_id):
+    return text(f"put {item_id}")
+
+
+@router.patch("/methods-test/items/{item_id:int}")
+async def patch_item(item_id):
+    return text(f"patch {item_id}")
+
+
+@router.delete("/methods-test/items/{item_id:int}")
+def delete_item(item_id):
+    return text(f"delete {item_id}")
+
+
+@router.post("/methods-test/items")
+def post_item():
+    return text("created", 201)
+
+
+@router.get("/methods-test/stream")
+def stream():
+    return StreamingResponse(iter(["a", "b"]), content_type="text/plain")
+
+
+@router.get("/methods-test/raises")
+def raises():
+    raise ValueError("route function failed")
+
+
+class MethodsTestMixin(ServerTestMixin):
+    """
+    Method routing tests, run against both backends
+    """
+    router = router
+
+    def request(self, method, path):
+        self.connection.request(method, path)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_methods(self):
+        """
+        Routes of every method are registered when they are decorated
+        :return:
+        """
+        for method, status, body in (("GET", 200, b"item 7"),
+                                     ("PUT", 200, b"put 7"),
+                                     ("PATCH", 200, b"patch 7"),
+                                     ("DELETE", 200, b"delete 7")):
+            response, data = self.request(method, "/methods-test/items/7")
+
+            self.assertEqual(response.status, status)
+            self.assertEqual(data, body)
+
+        response, data = self.request("POST", "/methods-test/items")
+        self.assertEqual(response.status, 201)
+        self.assertEqual(data, b"created")
+
+    def test_head(self):
+        """
+        HEAD runs the GET route and drops the body (on the same connection)
+        :return:
+        """
+        response, data = self.request("HEAD", "/methods-test/items/7")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Length"), "6")
+        self.assertEqual(data, b"")
+
+        response, data = self.request("HEAD", "/methods-test/stream")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data, b"")
+
+        response, data = self.request("GET", "/methods-test/items/8")
+        self.assertEqual(data, b"item 8")
+
+    def test_options_and_405(self):
+        """
+        OPTIONS and not allowed methods list the methods of the path
+        :return:
+        """
+        allow = "GET, HEAD, PUT, PATCH, DELETE, OPTIONS"
+
+        response, data = self.request("OPTIONS", "/methods-test/items/7")
+        self.assertEqual(response.status, 204)
+        self.assertEqual(response.getheader("Allow"), allow)
+        self.assertEqual(data, b"")
+
+        response, data = self.request("POST", "/methods-test/items/7")
+        self.assertEqual(response.status, 405)
+        self.assertEqual(response.getheader("Allow"), allow)
+
+        response, data = self.request("GET", "/methods-test/items")
+        self.assertEqual(response.status, 405)
+        self.assertEqual(response.getheader("Allow"), "POST, OPTIONS")
+
+        response, data = self.request("GET", "/methods-test/missing")
+        self.assertEqual(response.status, 404)
+
+    def test_errors(self):
+        """
+        Failing route functions return 500, unknown methods 501
+        :return:
+        """
+        response, data = self.request("GET", "/methods-test/raises")
+        self.assertEqual(response.status, 500)
+
+        response, data = self.request("BREW", "/methods-test/items/7")
+        self.assertEqual(response.status, 501)
+
+
+class TestMethodsThreaded(MethodsTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestMethodsAsyncio(MethodsTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,347 @@
+import asyncio
+import http.client
+import threading
+import time
+import unittest
+
+from fatihserver.framework.middlewares import Middleware
+from fatihserver.framework.router import HttpRouter, Route
+from fatihserver.server.request_handler import Request
+from server_helpers import ServerTestMixin, text
+
+
+def parsed(path="/", headers=None, query_params=None):
+    return {'method': 'GET', 'path': path, 'headers': headers or {}, 'raw_body': None, 'body': None,
+            'query_params': query_params, 'path_params': {}}
+
+
+class Recorder(Middleware):
+    """
+    Hook style middleware that records the order of the calls
+    """
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def before(self, request):
+        self.calls.append(f"{self.name}.before")
+
+    def after(self, request, response):
+        self.calls.append(f"{self.name}.after")
+        return response
+
+
+class AsyncHeader(Middleware):
+    """
+    Async hook style middleware that sets a header
+    """
+
+    async def after(self, request, response):
+        await asyncio.sleep(0)
+        response.set_header("X-Async", "1")
+        return response
+
+
+class Auth(Middleware):
+    """
+    Answers 401 without a token, attaches the user to the request
+    """
+
+    def before(self, request):
+        if request.headers.get("Authorization") != "token":
+            return text("unauthorized", 401)
+
+        request.user = "fatih"
+
+
+def timing(request, call_next):
+    response = call_next(request)
+    response.set_header("X-Timing", "1")
+    return response
+
+
+async def async_timing(request, call_next):
+    response = await call_next(request)
+    response.set_header("X-Async-Timing", "1")
+    return response
+
+
+class TestMiddlewareChain(unittest.TestCase):
+    """
+    Test class for composing middlewares
+    """
+
+    def test_order(self):
+        """
+        The first middleware is the outermost, route middlewares run inside the router ones
+        :return:
+        """
+        calls = []
+
+        def route():
+            calls.append("route")
+            return text("ok")
+
+        router = HttpRouter()
+        router.add_middleware(Recorder("a", calls))
+        router.add_middleware(Recorder("b", calls))
+        router.add_route("GET", "/", route, middlewares=[Recorder("c", calls)])
+        router.freeze()
+
+        router.match("/", "GET")[0].call(parsed())
+
+        self.assertEqual(calls, ["a.before", "b.before", "c.before", "route", "c.after", "b.after", "a.after"])
+
+    def test_short_circuit(self):
+        """
+        A response of `before` answers the request without calling the route
+        :return:
+        """
+        def user_name(request: Request):
+            return text(request.user)
+
+        route = Route("GET", "/", user_name, middlewares=[Auth()])
+
+        self.assertEqual(route.call(parsed()).status_code, 401)
+        self.assertEqual(route.call(parsed(headers={"Authorization": "token"})).body, "fatih")
+
+    def test_request_shared(self):
+        """
+        Middlewares and the route function get the same Request
+        :return:
+        """
+        def route(request: Request):
+            return request
+
+        def middleware(request, call_next):
+            self.assertIs(call_next(request), request)
+            return request
+
+        Route("GET", "/", route, middlewares=[middleware]).call(parsed())
+
+    def test_async(self):
+        """
+        Async middlewares and routes are composed into a coroutine
+        :return:
+        """
+        async def route():
+            return text("ok")
+
+        for func in (route, lambda: text("ok")):
+            handler = Route("GET", "/", func, middlewares=[async_timing, AsyncHeader(), Recorder("r", [])])
+            response = asyncio.run(handler.call(parsed()))
+
+            self.assertEqual(response.headers["X-Async"], "1")
+            self.assertEqual(response.headers["X-Async-Timing"], "1")
+
+    def test_sync_dispatch_over_async(self):
+        """
+        A plain wrap style middleware cannot wrap a coroutine route
+        :return:
+        """
+        async def route():
+            return text("ok")
+
+        with self.assertRaises(Exception):
+            Route("GET", "/", route, middlewares=[timing])
+
+    def test_super_dispatch(self):
+        """
+        The default dispatch passes the request on (subclasses can call super().dispatch())
+        :return:
+        """
+        class Header(Middleware):
+            def dispatch(self, request, call_next):
+                response = super().dispatch(request, call_next)
+                response.set_header("X-Header", "1")
+                return response
+
+        response = Route("GET", "/", lambda: text("ok"), middlewares=[Header()]).call(parsed())
+
+        self.assertEqual(response.headers["X-Header"], "1")
+        self.assertEqual(response.body, "ok")
+        self.assertEqual(Middleware().dispatch(parsed(), lambda request: "next"), "next")
+
+    def test_exclude(self):
+        """
+        Routes can opt out of router middlewares by instance or by class
+        :return:
+        """
+        calls = []
+        recorder = Recorder("a", calls)
+
+        router = HttpRouter()
+        router.add_middleware(recorder)
+        router.add_middleware(Auth())
+        router.add_route("GET", "/instance", lambda: text("ok"), exclude_middlewares=[recorder, Auth])
+        router.add_route("GET", "/class", lambda: text("ok"), exclude_middlewares=[Recorder])
+        router.freeze()
+
+        self.assertEqual(router.match("/instance", "GET")[0].call(parsed()).status_code, 200)
+        self.assertEqual(router.match("/class", "GET")[0].call(parsed()).status_code, 401)
+        self.assertEqual(calls, [])
+
+    def test_included(self):
+        """
+        Middlewares of a router run for the routes of the routers it includes
+        :return:
+        """
+        api = HttpRouter()
+        api.add_route("GET", "/status", lambda: text("ok"))
+
+        router = HttpRouter()
+        router.add_middleware(Auth())
+        router.include(api, prefix="/api")
+        router.freeze()
+
+        self.assertEqual(router.match("/api/status", "GET")[0].call(parsed()).status_code, 401)
+
+        with self.assertRaises(Exception):
+            router.add_middleware(Auth())
+
+    def test_included_twice(self):
+        """
+        A router included by two routers runs the middlewares of the router the request came through
+        :return:
+        """
+        calls = []
+
+        shared = HttpRouter()
+        shared.add_route("GET", "/x", lambda: text("x"))
+
+        routers = {}
+        for name in ("public", "admin"):
+            router = routers[name] = HttpRouter()
+            router.add_middleware(Recorder(name, calls))
+            router.include(shared, prefix="/s")
+            router.freeze()
+
+        for name in ("public", "admin"):
+            calls.clear()
+            routers[name].match("/s/x", "GET")[0].call(parsed())
+
+            self.assertEqual(calls, [f"{name}.before", f"{name}.after"])
+
+        calls.clear()
+        shared.match("/x", "GET")[0].call(parsed())
+        self.assertEqual(calls, [])
+
+    def test_no_middlewares(self):
+        """
+        Routes without middlewares call the invocation plan directly
+        :return:
+        """
+        route = Route("GET", "/", lambda: text("ok"))
+
+        self.assertEqual(route.call, route.plan.call)
+
+
+router = HttpRouter()
+router.add_middleware(Auth())
+
+
+@router.get("/middleware-test/user", middlewares=[timing])
+def user(request: Request):
+    return text(request.user)
+
+
+@router.get("/middleware-test/async", middlewares=[async_timing])
+async def async_user(request: Request):
+    return text(request.user)
+
+
+@router.get("/middleware-test/public", exclude_middlewares=[Auth])
+def public():
+    return text("public")
+
+
+@router.get("/middleware-test/page", middlewares=[async_timing])
+async def page(number: int):
+    return text(f"page {number}")
+
+
+@router.get("/middleware-test/slow", middlewares=[async_timing], exclude_middlewares=[Auth])
+def slow():
+    time.sleep(0.5)
+    return text("slow")
+
+
+class MiddlewareTestMixin(ServerTestMixin):
+    """
+    Middleware tests, run against both backends
+    """
+    router = router
+
+    def request(self, path, headers=None):
+        self.connection.request("GET", path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_middlewares(self):
+        """
+        Router and route middlewares run around sync and async routes
+        :return:
+        """
+        response, data = self.request("/middleware-test/user", {"Authorization": "token"})
+        self.assertEqual((response.status, data), (200, b"fatih"))
+        self.assertEqual(response.getheader("X-Timing"), "1")
+
+        response, data = self.request("/middleware-test/async", {"Authorization": "token"})
+        self.assertEqual((response.status, data), (200, b"fatih"))
+        self.assertEqual(response.getheader("X-Async-Timing"), "1")
+
+        response, data = self.request("/middleware-test/user")
+        self.assertEqual((response.status, data), (401, b"unauthorized"))
+
+        response, data = self.request("/middleware-test/public")
+        self.assertEqual((response.status, data), (200, b"public"))
+
+    def test_sync_route_concurrency(self):
+        """
+        Plain routes inside async middlewares do not run one at a time on the event loop
+        :return:
+        """
+        def get():
+            connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+            try:
+                connection.request("GET", "/middleware-test/slow")
+                response = connection.getresponse()
+                results.append((response.status, response.read(), response.getheader("X-Async-Timing")))
+            finally:
+                connection.close()
+
+        results = []
+        threads = [threading.Thread(target=get) for _ in range(4)]
+
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [(200, b"slow", "1")] * 4)
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_validation(self):
+        """
+        Invalid parameters are answered with 422 through async middlewares
+        :return:
+        """
+        response, data = self.request("/middleware-test/page?number=x", {"Authorization": "token"})
+        self.assertEqual(response.status, 422)
+
+        response, data = self.request("/middleware-test/page?number=2", {"Authorization": "token"})
+        self.assertEqual(data, b"page 2")
+
+
+class TestThreadedMiddlewares(MiddlewareTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestAsyncMiddlewares(MiddlewareTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
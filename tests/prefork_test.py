@@ -0,0 +1,134 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+
+APP = """
+import os
+
+from fatihserver.framework.app import App, set_log_level
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import Response
+
+set_log_level('WARNING')
+
+router = HttpRouter()
+
+
+@router.get("/pid")
+def pid():
+    response = Response(status_code=200, body=str(os.getpid()))
+    response.set_content_type("text/plain")
+    return response
+
+
+App(router=router, host="127.0.0.1", port={port}, graceful_timeout=1).run(workers=2, reuse_port={reuse_port})
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "pre-fork mode needs os.fork()")
+class PreforkTestMixin:
+    """
+    Pre-fork mode tests (the supervisor runs in a subprocess)
+    """
+    reuse_port = False
+
+    def setUp(self):
+        self.port = free_port()
+        self.process = subprocess.Popen([sys.executable, "-c", APP.format(port=self.port, reuse_port=self.reuse_port)],
+                                        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                self.get_pid()
+                return
+            except OSError:
+                time.sleep(0.1)
+
+        self.fail("Pre-fork server did not start")
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def get_pid(self):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/pid", headers={"Connection": "close"})
+        pid = int(connection.getresponse().read())
+        connection.close()
+
+        return pid
+
+    def test_requests_are_served_by_workers(self):
+        """
+        Workers (not the supervisor) answer the requests
+        :return:
+        """
+        self.assertNotEqual(self.get_pid(), self.process.pid)
+
+    def test_crashed_worker_is_restarted(self):
+        """
+        The supervisor restarts a killed worker
+        :return:
+        """
+        os.kill(self.get_pid(), signal.SIGKILL)
+        time.sleep(2)
+
+        pids = {self.get_pid() for _ in range(20)}
+        self.assertNotIn(self.process.pid, pids)
+
+    def test_graceful_shutdown(self):
+        """
+        SIGTERM stops the supervisor and its workers
+        :return:
+        """
+        self.process.send_signal(signal.SIGTERM)
+
+        self.assertEqual(self.process.wait(timeout=10), 0)
+
+
+class TestPreforkSharedSocket(PreforkTestMixin, unittest.TestCase):
+    reuse_port = False
+
+
+class TestPreforkReusePort(PreforkTestMixin, unittest.TestCase):
+    reuse_port = True
+
+
+class TestStopBeforeServe(unittest.TestCase):
+    """
+    A worker stopped (SIGTERM) before it started serving exits when it starts
+    """
+
+    def test_stop_before_serve(self):
+        for backend in ("threaded", "asyncio"):
+            with self.subTest(backend=backend):
+                server = HttpServer(router=HttpRouter(), host="127.0.0.1", port=0, backend=backend)
+                server.stop()
+
+                thread = threading.Thread(target=server.start, daemon=True)
+                thread.start()
+                thread.join(timeout=5)
+
+                self.assertFalse(thread.is_alive())
+                self.assertEqual(server.server.socket.fileno(), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
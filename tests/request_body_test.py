@@ -0,0 +1,231 @@
+import hashlib
+import time
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser
+from fatihserver.server.request_handler import Request, Response, RequestHandler
+from server_helpers import ServerTestMixin, read_until_closed
+
+router = HttpRouter()
+
+
+def sha_response(sha, file=None):
+    body = sha.hexdigest()
+    if file is not None:
+        # SpooledTemporaryFile is spilled to disk above the threshold
+        body += " disk" if file._rolled else " memory"
+
+    response = Response(status_code=200, body=body)
+    response.set_content_type("text/plain")
+    return response
+
+
+def stream_sha(request: Request):
+    sha = hashlib.sha256()
+    for chunk in request.stream():
+        sha.update(chunk)
+
+    return sha_response(sha)
+
+
+async def async_stream_sha(request: Request):
+    sha = hashlib.sha256()
+    async for chunk in request.stream():
+        sha.update(chunk)
+
+    return sha_response(sha)
+
+
+def spool_sha(request: Request):
+    with request.spool() as file:
+        return sha_response(hashlib.sha256(file.read()), file)
+
+
+async def async_spool_sha(request: Request):
+    with await request.aspool() as file:
+        return sha_response(hashlib.sha256(file.read()), file)
+
+
+async def ignore_body(request: Request):
+    response = Response(status_code=200, body="ignored")
+    response.set_content_type("text/plain")
+    return response
+
+
+router.add_route('POST', "/request-body-test/stream", stream_sha, stream=True)
+router.add_route('POST', "/request-body-test/async-stream", async_stream_sha, stream=True)
+router.add_route('POST', "/request-body-test/spool", spool_sha, stream=True)
+router.add_route('POST', "/request-body-test/async-spool", async_spool_sha, stream=True)
+router.add_route('POST', "/request-body-test/ignore", ignore_body, stream=True)
+
+
+@router.get("/request-body-test/next")
+def next_request():
+    response = Response(status_code=200, body="next")
+    response.set_content_type("text/plain")
+    return response
+
+
+def chunked(data, size=10000):
+    """
+    Encode data with the chunked transfer coding
+    :param data:
+    :param size:
+    :return:
+    """
+    encoded = b""
+    for i in range(0, len(data), size):
+        chunk = data[i:i + size]
+        encoded += b"%x\r\n" % len(chunk) + chunk + b"\r\n"
+
+    return encoded + b"0\r\n\r\n"
+
+
+class RequestBodyTestMixin(ServerTestMixin):
+    """
+    Streaming request body tests, run against both backends
+    """
+    router = router
+    server_options = {'spill_threshold': 1024}
+    stream_path = None
+    spool_path = None
+
+    data = bytes(range(256)) * 4000
+
+    def request(self, path, body, chunked_body=False):
+        """
+        Send a POST request and a pipelined GET request (closing the connection)
+        :param path:
+        :param body:
+        :param chunked_body:
+        :return:
+        """
+        if chunked_body:
+            head = b"Transfer-Encoding: chunked\r\n"
+            body = chunked(body)
+        else:
+            head = b"Content-Length: %d\r\n" % len(body)
+
+        sock = self.connect()
+
+        sock.sendall(b"POST " + path.encode() + b" HTTP/1.1\r\nHost: localhost\r\n" + head + b"\r\n")
+
+        # the body arrives in pieces
+        for i in range(0, len(body), 100000):
+            sock.sendall(body[i:i + 100000])
+            time.sleep(0.01)
+
+        sock.sendall(b"GET /request-body-test/next HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+        return read_until_closed(sock)
+
+    def test_stream(self):
+        """
+        The route function gets the body chunk by chunk
+        :return:
+        """
+        for chunked_body in (False, True):
+            data = self.request(self.stream_path, self.data, chunked_body)
+
+            self.assertIn(hashlib.sha256(self.data).hexdigest().encode(), data)
+            self.assertTrue(data.endswith(b"next"))
+
+    def test_spool(self):
+        """
+        Large bodies are spilled to a temporary file
+        :return:
+        """
+        data = self.request(self.spool_path, self.data)
+        self.assertIn(hashlib.sha256(self.data).hexdigest().encode() + b" disk", data)
+
+        data = self.request(self.spool_path, b"small")
+        self.assertIn(hashlib.sha256(b"small").hexdigest().encode() + b" memory", data)
+
+    def test_unread_body(self):
+        """
+        The body that the route function does not read is skipped
+        :return:
+        """
+        data = self.request("/request-body-test/ignore", self.data, True)
+
+        self.assertIn(b"ignored", data)
+        self.assertTrue(data.endswith(b"next"))
+
+    def test_expect_continue(self):
+        """
+        A client waiting for `100 Continue` is answered without it when the body is not read
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(b"POST /request-body-test/ignore HTTP/1.1\r\nHost: localhost\r\n"
+                     b"Content-Length: 1000000\r\nExpect: 100-continue\r\n\r\n")
+
+        data = read_until_closed(sock)
+
+        self.assertTrue(data.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertNotIn(b"100 Continue", data)
+        self.assertIn(b"Connection: close", data)
+
+
+class TestStreamBodyCallback(unittest.TestCase):
+    """
+    The routes are only checked before the body is read if a route streams its body
+    """
+
+    def test_callback(self):
+        """
+        Routers without streamed routes do not get the parser callback
+        :return:
+        """
+        plain = HttpRouter()
+        plain.add_route('POST', "/plain", next_request)
+
+        self.assertIsNone(RequestHandler(plain).stream_body_callback())
+        self.assertIsNotNone(RequestHandler(router).stream_body_callback())
+
+        included = HttpRouter()
+        included.include(router, prefix="/api")
+        included.freeze()
+        self.assertTrue(included.has_stream_routes)
+
+    def test_lookup(self):
+        """
+        The routes found by the callback are kept in the result of the request
+        :return:
+        """
+        handler = RequestHandler(router)
+        parser = IncrementalHttpRequestParser(stream_body=handler.stream_body_callback())
+        parser.feed(b"GET /request-body-test/next HTTP/1.1\r\nContent-Length: 2\r\n\r\nok")
+
+        result = parser.next_request()
+        table, params = result['lookup']
+
+        self.assertIs(table.route('GET').func, next_request)
+        self.assertEqual(result['raw_body'], "ok")
+
+
+class TestRequestBodyThreaded(RequestBodyTestMixin, unittest.TestCase):
+    backend = "threaded"
+    stream_path = "/request-body-test/stream"
+    spool_path = "/request-body-test/spool"
+
+
+class TestRequestBodyAsyncio(RequestBodyTestMixin, unittest.TestCase):
+    backend = "asyncio"
+    stream_path = "/request-body-test/async-stream"
+    spool_path = "/request-body-test/async-spool"
+
+    def test_plain_function(self):
+        """
+        Plain functions cannot wait on the event loop, they get the whole body at once
+        :return:
+        """
+        data = self.request("/request-body-test/stream", self.data, True)
+
+        self.assertIn(hashlib.sha256(self.data).hexdigest().encode(), data)
+        self.assertTrue(data.endswith(b"next"))
+
+
+if __name__ == '__main__':
+    unittest.main()
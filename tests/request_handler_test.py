@@ -0,0 +1,237 @@
+import asyncio
+import json
+import threading
+import unittest
+from dataclasses import dataclass
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.parsers.incremental_parser import IncrementalHttpRequestParser
+from fatihserver.server.request_handler import Request, RequestHandler, Response
+
+router = HttpRouter()
+
+
+@router.get("/request-handler-test/sync")
+def sync_index():
+    response = Response(status_code=200, body="sync")
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/request-handler-test/async")
+async def async_index():
+    await asyncio.sleep(0)
+
+    response = Response(status_code=200, body="async")
+    response.set_content_type("text/plain")
+    return response
+
+
+slow_route_started = threading.Event()
+slow_route_release = threading.Event()
+
+
+@router.get("/request-handler-test/limited", max_concurrency=1)
+def limited_index():
+    slow_route_started.set()
+    slow_route_release.wait(timeout=5)
+
+    response = Response(status_code=200, body="limited")
+    response.set_content_type("text/plain")
+    return response
+
+
+@router.get("/request-handler-test/users/{user_id:int}/posts/{slug}")
+def user_post(user_id, slug, request: Request):
+    response = Response(status_code=200, body=f"{user_id + 1} {slug} {request.path_params['slug']}")
+    response.set_content_type("text/plain")
+    return response
+
+
+@dataclass
+class Comment:
+    text: str
+    rating: int
+
+
+@router.get("/request-handler-test/search")
+def search(q: str, page: int = 1, ids: list[int] = None, exact: bool = False):
+    response = Response(status_code=200, body=f"{q} {page} {ids} {exact}")
+    response.set_content_type("text/plain")
+    return response
+
+
+def add_comment(comment: Comment, notify: bool = False):
+    response = Response(status_code=201, body=f"{comment.text} {comment.rating} {notify}")
+    response.set_content_type("text/plain")
+    return response
+
+
+router.add_route('POST', "/request-handler-test/comments", add_comment)
+
+
+@router.get("/request-handler-test/raises")
+def raising_index():
+    raise ValueError("route function failed")
+
+
+def make_handler(await_coroutines=False):
+    """
+    Create a RequestHandler without a socket
+    :param await_coroutines:
+    :return:
+    """
+    handler = RequestHandler(router, await_coroutines=await_coroutines)
+    handler.client_address = ('127.0.0.1', 0)
+    handler.setup()
+
+    return handler
+
+
+def parse(data):
+    parser = IncrementalHttpRequestParser()
+    parser.feed(data)
+    return parser.next_request()
+
+
+def get(path):
+    return parse(bytes(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n", 'ascii'))
+
+
+class TestRequestHandler(unittest.TestCase):
+    """
+    Test class for RequestHandler.process
+    """
+
+    def test_sync_handler(self):
+        """
+        Plain route functions are executed directly
+        :return:
+        """
+        response = make_handler().process(get("/request-handler-test/sync"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, "sync")
+
+    def test_coroutine_handler_threaded(self):
+        """
+        Coroutine route functions run on the shared event loop (threaded server)
+        :return:
+        """
+        response = make_handler().process(get("/request-handler-test/async"))
+
+        self.assertIsInstance(response, Response)
+        self.assertEqual(response.body, "async")
+
+    def test_coroutine_handler_event_loop(self):
+        """
+        Coroutine route functions are returned as awaitables (event-loop server)
+        :return:
+        """
+        response = make_handler(await_coroutines=True).process(get("/request-handler-test/async"))
+
+        self.assertFalse(isinstance(response, Response))
+        response = asyncio.run(response)
+
+        self.assertIsInstance(response, Response)
+        self.assertEqual(response.body, "async")
+
+    def test_concurrency_limit(self):
+        """
+        Requests over the route's concurrency limit get 503 right away
+        :return:
+        """
+        responses = []
+        thread = threading.Thread(
+            target=lambda: responses.append(make_handler().process(get("/request-handler-test/limited"))))
+        thread.start()
+        self.assertTrue(slow_route_started.wait(timeout=5))
+
+        # the slot is taken by the thread
+        response = make_handler().process(get("/request-handler-test/limited"))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+        slow_route_release.set()
+        thread.join(timeout=5)
+        self.assertEqual(responses[0].status_code, 200)
+
+        # and it is released afterwards
+        response = make_handler().process(get("/request-handler-test/limited"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_raising_handler_does_not_block(self):
+        """
+        A raising route function does not leave anything locked
+        :return:
+        """
+        handler = make_handler()
+
+        for _ in range(2):
+            response = handler.process(get("/request-handler-test/raises"))
+            self.assertNotEqual(response.status_code, 200)
+
+        response = handler.process(get("/request-handler-test/sync"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_path_parameters(self):
+        """
+        Path parameters are converted and passed by name
+        :return:
+        """
+        response = make_handler().process(get("/request-handler-test/users/41/posts/hello"))
+        self.assertEqual(response.body, "42 hello hello")
+
+        response = make_handler().process(get("/request-handler-test/users/abc/posts/hello"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_typed_parameters(self):
+        """
+        Query parameters and JSON bodies are converted to the type hints
+        :return:
+        """
+        response = make_handler().process(get("/request-handler-test/search?q=router&page=2&ids=1,2&exact=true"))
+        self.assertEqual(response.body, "router 2 [1, 2] True")
+
+        response = make_handler().process(get("/request-handler-test/search?q=router"))
+        self.assertEqual(response.body, "router 1 None False")
+
+        body = b'{"text": "nice", "rating": 5}'
+        response = make_handler().process(parse(b"POST /request-handler-test/comments?notify=1 HTTP/1.1\r\n"
+                                                b"Content-Type: application/json\r\n"
+                                                b"Content-Length: %d\r\n\r\n%s" % (len(body), body)))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.body, "nice 5 True")
+
+    def test_invalid_parameters(self):
+        """
+        Invalid parameters are answered with 422 and every error
+        :return:
+        """
+        response = make_handler().process(get("/request-handler-test/search?page=x&ids=1,y"))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.headers["Content-Type"], "application/json")
+        self.assertEqual([error["loc"] for error in json.loads(response.body)["detail"]],
+                         [["query", "q"], ["query", "page"], ["query", "ids", 1]])
+
+        body = b'{"text": "nice", "rating": "five"}'
+        response = make_handler().process(parse(b"POST /request-handler-test/comments HTTP/1.1\r\n"
+                                                b"Content-Type: application/json\r\n"
+                                                b"Content-Length: %d\r\n\r\n%s" % (len(body), body)))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(json.loads(response.body)["detail"][0]["loc"], ["body", "rating"])
+
+    def test_bad_request(self):
+        """
+        GET requests must not have a body
+        :return:
+        """
+        response = make_handler().process(parse(b"GET /request-handler-test/sync HTTP/1.1\r\n"
+                                                b"Content-Length: 4\r\n\r\nbody"))
+
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
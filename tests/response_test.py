@@ -0,0 +1,216 @@
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+from fatihserver.server.request_handler import Response, STATUS_LINES, status_line, HttpResult, Session, \
+    CannedResponse
+from server_helpers import ServerTestMixin
+
+router = HttpRouter()
+
+LARGE_BODY = bytes(range(256)) * 4096
+
+
+@router.get("/response-test/large")
+def large():
+    response = Response(status_code=200, body=LARGE_BODY)
+    response.set_content_type("application/octet-stream")
+    return response
+
+
+class TestResponse(unittest.TestCase):
+    """
+    Test class for serializing responses
+    """
+
+    def test_head(self):
+        """
+        The status line and every header line end with CRLF, an empty line ends the head
+        :return:
+        """
+        response = Response(status_code=200, body="Hello", headers={"X-Test": "1"}, session=None)
+        data = response.as_bytes()
+
+        head, body = data.split(b"\r\n\r\n", 1)
+        lines = head.split(b"\r\n")
+
+        self.assertEqual(lines[0], b"HTTP/1.1 200 OK")
+        self.assertIn(b"X-Test: 1", lines)
+        self.assertIn(b"Content-Length: 5", lines)
+        self.assertNotIn(b"\n", b"".join(lines))
+        self.assertEqual(body, b"Hello")
+
+    def test_status_lines(self):
+        """
+        Status lines of the standard codes come from the table, unknown codes still get one
+        :return:
+        """
+        self.assertEqual(STATUS_LINES[404], b"HTTP/1.1 404 Not Found\r\n")
+        self.assertEqual(status_line(413), b"HTTP/1.1 413 Content Too Large\r\n")
+        self.assertEqual(status_line(422), b"HTTP/1.1 422 Unprocessable Content\r\n")
+        self.assertEqual(status_line(599), b"HTTP/1.1 599 Unknown\r\n")
+        self.assertTrue(Response(status_code=429).as_bytes().startswith(b"HTTP/1.1 429 Too Many Requests\r\n"))
+
+    def test_buffers(self):
+        """
+        Binary bodies are passed on without a copy, responses without a body are a single buffer
+        :return:
+        """
+        body = bytearray(b"binary")
+        buffers = Response(status_code=200, body=body).as_buffers()
+
+        self.assertEqual(len(buffers), 2)
+        self.assertIs(buffers[1], body)
+
+        self.assertEqual(len(Response(status_code=204).as_buffers()), 1)
+
+        response = Response(status_code=200, body="Hello")
+        response.head_only = True
+        buffers = response.as_buffers()
+
+        self.assertEqual(len(buffers), 1)
+        self.assertIn(b"Content-Length: 5\r\n", buffers[0])
+
+
+class TestCannedResponse(unittest.TestCase):
+    """
+    Test class for the canned error responses of HttpResult
+    """
+
+    def tearDown(self):
+        HttpResult.compile()
+
+    def test_shared(self):
+        """
+        Error responses are shared and do not create sessions
+        :return:
+        """
+        sessions = len(Session.STORE)
+
+        self.assertIs(HttpResult.r404(), HttpResult.r404())
+        self.assertIs(HttpResult.r405("GET, OPTIONS"), HttpResult.r405("GET, OPTIONS"))
+        self.assertIsNone(HttpResult.r500().session)
+        self.assertEqual(len(Session.STORE), sessions)
+
+    def test_encoded(self):
+        """
+        The bytes are prepared for both `Connection` values and HEAD requests
+        :return:
+        """
+        response = HttpResult.r503()
+
+        self.assertEqual(response.as_buffers(True), [b"HTTP/1.1 503 Service Unavailable\r\n"
+                                                     b"Content-Type: text/plain\r\n"
+                                                     b"Retry-After: 1\r\n"
+                                                     b"Content-Length: 19\r\n"
+                                                     b"Connection: keep-alive\r\n\r\n"
+                                                     b"Service Unavailable"])
+        self.assertIn(b"Connection: close\r\n", response.as_buffers(False)[0])
+        self.assertTrue(response.head_response.as_bytes().endswith(b"\r\n\r\n"))
+        self.assertIn(b"Content-Length: 19\r\n", response.head_response.as_bytes())
+
+        options = HttpResult.options("GET, HEAD, OPTIONS").as_bytes()
+        self.assertIn(b"Allow: GET, HEAD, OPTIONS\r\n", options)
+        self.assertNotIn(b"Content-Length", options)
+
+    def test_immutable(self):
+        """
+        Canned responses cannot be changed, their copies can
+        :return:
+        """
+        response = HttpResult.r404()
+
+        with self.assertRaises(Exception):
+            response.set_header("X-Test", "1")
+
+        with self.assertRaises(Exception):
+            response.body = "changed"
+
+        copy = response.copy()
+        copy.set_header("X-Test", "1")
+
+        self.assertNotIsInstance(copy, CannedResponse)
+        self.assertEqual((copy.status_code, copy.body), (404, "Not Found"))
+        self.assertIn(b"X-Test: 1\r\n", copy.as_bytes())
+
+    def test_error_pages(self):
+        """
+        Custom error bodies are compiled into the canned responses
+        :return:
+        """
+        HttpResult.compile({404: "<h1>Nothing here</h1>", 500: (b'{"error": "internal"}', "application/json")})
+
+        self.assertTrue(HttpResult.r404().as_bytes().endswith(b"Content-Type: text/html\r\n"
+                                                                b"Content-Length: 21\r\n"
+                                                                b"Connection: keep-alive\r\n\r\n"
+                                                                b"<h1>Nothing here</h1>"))
+        self.assertEqual(HttpResult.r500().headers['Content-Type'], "application/json")
+        self.assertEqual(HttpResult.r400().body, "Bad Request")
+
+        with self.assertRaises(Exception):
+            HttpResult.compile({200: "OK"})
+
+    def test_error_pages_reset(self):
+        """
+        A server without error pages does not keep the pages of a previous server
+        :return:
+        """
+        try:
+            HttpServer(router=HttpRouter(), error_pages={404: "<h1>Nothing here</h1>"}).prepare()
+            self.assertEqual(HttpResult.r404().body, "<h1>Nothing here</h1>")
+
+            HttpServer(router=HttpRouter()).prepare()
+            self.assertEqual(HttpResult.r404().content_type, "text/plain")
+        finally:
+            HttpResult.compile()
+
+
+class ResponseTestMixin(ServerTestMixin):
+    """
+    Large responses are written with sendmsg() (threaded) or writelines() (asyncio)
+    """
+    router = router
+    server_options = {'compression_level': 0, 'error_pages': {404: "<h1>Nothing here</h1>"}}
+
+    def tearDown(self):
+        super().tearDown()
+
+        HttpResult.compile()
+
+    def test_large_body(self):
+        """
+        The body arrives complete, and the connection can be reused
+        :return:
+        """
+        for _ in range(2):
+            self.connection.request("GET", "/response-test/large")
+            response = self.connection.getresponse()
+
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), LARGE_BODY)
+
+    def test_error_page(self):
+        """
+        Canned error responses keep the connection alive, HEAD gets only the head
+        :return:
+        """
+        for method, body in (("GET", b"<h1>Nothing here</h1>"), ("HEAD", b""), ("GET", b"<h1>Nothing here</h1>")):
+            self.connection.request(method, "/response-test/missing")
+            response = self.connection.getresponse()
+
+            self.assertEqual(response.status, 404)
+            self.assertEqual(response.getheader("Content-Length"), "21")
+            self.assertIsNone(response.getheader("Set-Cookie"))
+            self.assertEqual(response.read(), body)
+
+
+class TestResponseThreaded(ResponseTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestResponseAsyncio(ResponseTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
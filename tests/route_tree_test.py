@@ -0,0 +1,65 @@
+import unittest
+
+from fatihserver.framework.route_tree import RouteTree
+
+
+class TestRouteTree(unittest.TestCase):
+    """
+    Test class for RouteTree
+    """
+
+    def setUp(self):
+        self.tree = RouteTree()
+        for path in ("/", "/users", "/users/me", "/users/{id:int}", "/users/{name}",
+                     "/users/{id:int}/posts/{slug}", "/prices/{value:float}", "/files/{rest:path}"):
+            self.tree.insert(path, path)
+
+    def test_static(self):
+        """
+        Paths without parameters match exactly
+        :return:
+        """
+        self.assertEqual(self.tree.match("/"), ("/", {}))
+        self.assertEqual(self.tree.match("/users"), ("/users", {}))
+        self.assertEqual(self.tree.match("/users/"), (None, None))
+        self.assertEqual(self.tree.match("/missing"), (None, None))
+
+    def test_parameters(self):
+        """
+        Parameters are converted, static segments and typed parameters win
+        :return:
+        """
+        self.assertEqual(self.tree.match("/users/me"), ("/users/me", {}))
+        self.assertEqual(self.tree.match("/users/42"), ("/users/{id:int}", {"id": 42}))
+        self.assertEqual(self.tree.match("/users/fatih"), ("/users/{name}", {"name": "fatih"}))
+        self.assertEqual(self.tree.match("/users/42/posts/hello%20world"),
+                         ("/users/{id:int}/posts/{slug}", {"id": 42, "slug": "hello world"}))
+        self.assertEqual(self.tree.match("/users/fatih/posts/hello"), (None, None))
+        self.assertEqual(self.tree.match("/prices/9.5"), ("/prices/{value:float}", {"value": 9.5}))
+        self.assertEqual(self.tree.match("/prices/nan"), (None, None))
+        self.assertEqual(self.tree.match("/files/css/site.css"), ("/files/{rest:path}", {"rest": "css/site.css"}))
+        self.assertEqual(self.tree.match("/files/"), (None, None))
+
+    def test_invalid_patterns(self):
+        """
+        Invalid patterns fail when they are registered
+        :return:
+        """
+        for path in ("/users/{id:uuid}", "/users/{id", "/files/{rest:path}/edit", "/users/x{id}"):
+            with self.assertRaises(Exception):
+                self.tree.insert(path, path)
+
+    def test_replace(self):
+        """
+        A path registered again replaces the route
+        :return:
+        """
+        count = len(self.tree)
+        self.tree.insert("/users/{id:int}", "new")
+
+        self.assertEqual(len(self.tree), count)
+        self.assertEqual(self.tree.match("/users/1"), ("new", {"id": 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
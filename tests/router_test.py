@@ -0,0 +1,191 @@
+import http.client
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.http_server import HttpServer
+from server_helpers import start_server, stop_server, text
+
+
+class TestHttpRouter(unittest.TestCase):
+    """
+    Test class for independent and included routers
+    """
+
+    def test_independent_routers(self):
+        """
+        Routes of a router are not visible in other routers
+        :return:
+        """
+        first = HttpRouter()
+        second = HttpRouter()
+        first.add_route("GET", "/router-test/first", lambda: text("first"))
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.exist("/router-test/first", "GET")[0])
+        self.assertFalse(second.exist("/router-test/first", "GET")[0])
+
+    def test_include(self):
+        """
+        Included routes are mounted under the prefix when the router is frozen
+        :return:
+        """
+        users = HttpRouter()
+        users.add_route("GET", "/", lambda: text("users"))
+        users.add_route("GET", "/{user_id:int}", lambda user_id: text(f"user {user_id}"))
+
+        api = HttpRouter()
+        api.add_route("GET", "/status", lambda: text("ok"))
+        api.include(users, prefix="/users")
+
+        router = HttpRouter()
+        router.add_route("GET", "/", lambda: text("index"))
+        router.include(api, prefix="/api")
+
+        self.assertEqual(router.match("/api/status", "GET"), (None, None))
+
+        router.freeze()
+
+        self.assertTrue(router.exist("/", "GET")[0])
+        self.assertTrue(router.exist("/api/status", "GET")[0])
+        self.assertTrue(router.exist("/api/users", "GET")[0])
+        self.assertEqual(router.match("/api/users/42", "GET")[1], {'user_id': 42})
+        self.assertFalse(router.exist("/status", "GET")[0])
+        self.assertFalse(router.exist("/api/users/", "GET")[0])
+
+    def test_frozen(self):
+        """
+        Routes and routers cannot be added after the router is frozen
+        :return:
+        """
+        router = HttpRouter()
+        router.add_route("GET", "/router-test/a", lambda: text("a"))
+        router.freeze()
+        router.freeze()
+
+        with self.assertRaises(Exception):
+            router.add_route("GET", "/router-test/b", lambda: text("b"))
+
+        with self.assertRaises(Exception):
+            router.include(HttpRouter(), prefix="/b")
+
+        with self.assertRaises(TypeError):
+            router.METHOD_TABLES["/router-test/a"].routes["POST"] = None
+
+        self.assertTrue(router.exist("/router-test/a", "GET")[0])
+        self.assertFalse(router.exist("/router-test/b", "GET")[0])
+
+    def test_include_frozen(self):
+        """
+        A frozen router can be included, its routes (and its included routes) are mounted once
+        :return:
+        """
+        items = HttpRouter()
+        items.add_route("GET", "/x", lambda: text("x"))
+
+        api = HttpRouter()
+        api.add_route("GET", "/y", lambda: text("y"))
+        api.include(items, prefix="/b")
+        api.freeze()
+
+        router = HttpRouter()
+        router.include(api, prefix="/a")
+        router.freeze()
+
+        self.assertTrue(router.exist("/a/b/x", "GET")[0])
+        self.assertTrue(router.exist("/a/y", "GET")[0])
+        self.assertFalse(router.exist("/b/x", "GET")[0])
+
+        self.assertTrue(api.exist("/b/x", "GET")[0])
+        self.assertEqual(list(api.METHOD_TABLES), ["/y"])
+
+    def test_invalid_include(self):
+        """
+        Prefixes must be paths without parameters, conflicting routes fail when frozen
+        :return:
+        """
+        router = HttpRouter()
+
+        for prefix in ("api", "/api/", "/{version}"):
+            with self.assertRaises(Exception):
+                router.include(HttpRouter(), prefix=prefix)
+
+        with self.assertRaises(Exception):
+            router.include(router)
+
+        sub_router = HttpRouter()
+        sub_router.add_route("GET", "/items", lambda: text("sub"))
+        router.add_route("GET", "/api/items", lambda: text("own"))
+        router.include(sub_router, prefix="/api")
+
+        with self.assertRaises(Exception):
+            router.freeze()
+
+    def test_routes(self):
+        """
+        routes() returns the paths of every method
+        :return:
+        """
+        router = HttpRouter()
+        for method in ("GET", "POST", "PATCH", "PUT", "DELETE"):
+            router.add_route(method, f"/router-test/{method.lower()}", lambda: text("ok"))
+
+        self.assertEqual([list(paths) for paths in router.routes()],
+                         [["/router-test/get"], ["/router-test/post"], ["/router-test/patch"],
+                          ["/router-test/put"], ["/router-test/delete"]])
+
+
+def name_route(name):
+    def route():
+        return text(name)
+
+    return route
+
+
+class TestTwoServers(unittest.TestCase):
+    """
+    Two servers with their own routers in one process
+    """
+
+    def setUp(self):
+        self.servers = []
+        self.threads = []
+
+        for name in ("public", "admin"):
+            api = HttpRouter()
+            api.add_route("GET", "/name", name_route(name))
+
+            router = HttpRouter()
+            router.include(api, prefix=f"/{name}")
+
+            server = HttpServer(router=router, host="127.0.0.1", port=0)
+            self.threads.append(start_server(server))
+            self.servers.append(server)
+
+    def tearDown(self):
+        for server, thread in zip(self.servers, self.threads):
+            stop_server(server, thread)
+
+    def request(self, server, path):
+        connection = http.client.HTTPConnection("127.0.0.1", server.server.server_address[1], timeout=5)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def test_routes(self):
+        """
+        Each server answers with the routes of its own router
+        :return:
+        """
+        public, admin = self.servers
+
+        self.assertEqual(self.request(public, "/public/name"), (200, b"public"))
+        self.assertEqual(self.request(admin, "/admin/name"), (200, b"admin"))
+        self.assertEqual(self.request(public, "/admin/name")[0], 404)
+        self.assertEqual(self.request(admin, "/public/name")[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
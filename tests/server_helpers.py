@@ -0,0 +1,108 @@
+"""
+Helpers of the tests that run a server (shared by the *_test.py modules)
+
+ServerTestMixin starts `router` on a free port before each test and stops it
+afterwards. Mixins of tests that run against both backends set `backend` in
+their subclasses:
+
+    class StaticFilesTestMixin(ServerTestMixin):
+        router = router
+
+    class TestStaticFilesThreaded(StaticFilesTestMixin, unittest.TestCase):
+        backend = "threaded"
+"""
+
+import http.client
+import socket
+import threading
+import time
+
+from fatihserver.server.http_server import HttpServer
+from fatihserver.server.request_handler import Response
+
+# seconds to wait for a server to bind its socket
+STARTUP_TIMEOUT = 10
+
+
+def text(body, status_code=200):
+    response = Response(status_code=status_code, body=body)
+    response.set_content_type("text/plain")
+    return response
+
+
+def read_until_closed(sock):
+    """
+    Read everything until the server closes the connection
+    :param sock:
+    :return:
+    """
+    data = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+def start_server(server, timeout=STARTUP_TIMEOUT):
+    """
+    Start the server in a background thread and wait until it is bound
+    :param server: HttpServer
+    :param timeout: seconds to wait
+    :return: thread of the server
+    """
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + timeout
+    while server.server is None:
+        if not thread.is_alive():
+            raise Exception("Server stopped before it was started (see the log)")
+
+        if time.monotonic() > deadline:
+            raise Exception(f"Server was not started in {timeout} seconds")
+
+        time.sleep(0.01)
+
+    return thread
+
+
+def stop_server(server, thread):
+    """
+    Stop a server started by start_server()
+    :param server:
+    :param thread:
+    :return:
+    """
+    server.stop()
+    thread.join(timeout=5)
+
+
+class ServerTestMixin:
+    """
+    Runs `router` with `backend` and `server_options` during each test
+    (`self.port`, an http.client connection `self.connection` and `connect()` for raw sockets)
+    """
+    router = None
+    backend = "threaded"
+    server_options = {}
+
+    def setUp(self):
+        self.server = HttpServer(router=self.router, host="127.0.0.1", port=0, backend=self.backend,
+                                 **self.server_options)
+        self.thread = start_server(self.server)
+        self.port = self.server.server.server_address[1]
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        stop_server(self.server, self.thread)
+
+    def connect(self):
+        """
+        Raw socket connected to the server (closed after the test)
+        :return:
+        """
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        self.addCleanup(sock.close)
+        return sock
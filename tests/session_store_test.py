@@ -0,0 +1,272 @@
+import threading
+import unittest
+from unittest import mock
+
+from fatihserver.server.request_handler import Session, LazySession
+from fatihserver.server.session_store import MemorySessionStore
+
+
+class Clock:
+    """
+    Clock of the tests (the time only changes when it is advanced)
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class TestMemorySessionStore(unittest.TestCase):
+    """
+    Test class for the in-memory session store
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+
+    def store(self, **kwargs):
+        return MemorySessionStore(clock=self.clock, **kwargs)
+
+    def test_get(self):
+        """
+        Sessions are found by their id until they are deleted
+        :return:
+        """
+        store = self.store()
+        entry = store.create("a", {"user": "fatih"})
+
+        self.assertIs(store.get("a"), entry)
+        self.assertEqual(entry['data'], {"user": "fatih"})
+        self.assertIn("a", store)
+        self.assertIsNone(store.get("b"))
+
+        self.assertTrue(store.delete("a"))
+        self.assertFalse(store.delete("a"))
+        self.assertEqual(len(store), 0)
+
+    def test_idle_timeout(self):
+        """
+        Using a session resets its idle timeout
+        :return:
+        """
+        store = self.store(idle_timeout=10, absolute_timeout=None)
+        store.create("a")
+        store.create("b")
+
+        self.clock.advance(8)
+        self.assertIsNotNone(store.get("a"))
+
+        self.clock.advance(8)
+        self.assertIsNotNone(store.get("a"))
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(len(store), 1)
+
+    def test_absolute_timeout(self):
+        """
+        Sessions expire after the absolute timeout even if they are used
+        :return:
+        """
+        store = self.store(idle_timeout=10, absolute_timeout=25)
+        store.create("a")
+
+        for _ in range(3):
+            self.clock.advance(8)
+            self.assertIsNotNone(store.get("a"))
+
+        self.clock.advance(8)
+        self.assertIsNone(store.get("a"))
+
+    def test_max_entries(self):
+        """
+        The least recently used session is evicted when the store is full
+        :return:
+        """
+        store = self.store(max_entries=3)
+        for session_id in "abc":
+            store.create(session_id)
+
+        store.get("a")
+        store.create("d")
+
+        self.assertEqual(len(store), 3)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(set(store.entries), {"a", "c", "d"})
+
+        with self.assertRaises(Exception):
+            self.store(max_entries=0)
+
+    def test_sweep(self):
+        """
+        The sweep removes the expired sessions, used sessions get a new deadline
+        :return:
+        """
+        store = self.store(idle_timeout=10, absolute_timeout=None)
+        for i in range(100):
+            store.create(str(i))
+
+        self.clock.advance(5)
+        store.get("7")
+        self.assertEqual(store.sweep(), 0)
+
+        self.clock.advance(6)
+        self.assertEqual(store.sweep(), 99)
+        self.assertEqual(list(store.entries), ["7"])
+        self.assertEqual(len(store.deadlines), 1)
+
+        self.clock.advance(10)
+        self.assertEqual(store.sweep(), 1)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.deadlines, [])
+
+    def test_evicted_deadlines(self):
+        """
+        Deadlines of evicted sessions do not accumulate
+        :return:
+        """
+        store = self.store(max_entries=10)
+        for i in range(1000):
+            store.create(str(i))
+
+        store.sweep()
+
+        self.assertEqual(len(store), 10)
+        self.assertLessEqual(len(store.deadlines), 2 * 10 + 64)
+
+    def test_sweeper(self):
+        """
+        The background thread sweeps the store
+        :return:
+        """
+        swept = threading.Event()
+
+        class Store(MemorySessionStore):
+            def sweep(self):
+                swept.set()
+                return super().sweep()
+
+        store = Store()
+        store.start_sweeper(0.01)
+        try:
+            self.assertTrue(swept.wait(5))
+        finally:
+            store.stop_sweeper()
+
+        self.assertIsNone(store._sweeper)
+
+    def test_shared_sweeper(self):
+        """
+        The sweeper of a store used by two servers runs until both of them stop
+        :return:
+        """
+        store = self.store()
+        store.start_sweeper(60)
+        store.start_sweeper(60)
+        sweeper = store._sweeper
+
+        store.stop_sweeper()
+        self.assertTrue(sweeper.is_alive())
+
+        store.stop_sweeper()
+        self.assertFalse(sweeper.is_alive())
+        self.assertIsNone(store._sweeper)
+
+    def test_create_existing(self):
+        """
+        Creating a session with the id of an existing session does not replace it
+        :return:
+        """
+        store = self.store()
+        entry = store.create("a", {"user": "fatih"})
+
+        self.assertIsNone(store.create("a"))
+        self.assertIs(store.get("a"), entry)
+
+    def test_threads(self):
+        """
+        Sessions can be created and used from several threads
+        :return:
+        """
+        store = self.store(max_entries=500)
+
+        def work(n):
+            for i in range(1000):
+                session_id = f"{n}-{i}"
+                store.create(session_id)
+                store.get(session_id)
+                store.get(f"{n}-{i // 2}")
+                store.sweep()
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(store), 500)
+
+
+class TestSessionWithStore(unittest.TestCase):
+    """
+    Sessions use the store of the Session class
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.default = Session.STORE
+        Session.STORE = MemorySessionStore(idle_timeout=10, clock=self.clock)
+
+    def tearDown(self):
+        Session.STORE = self.default
+
+    def test_expired(self):
+        """
+        An expired session reads empty, the next write creates a new session
+        :return:
+        """
+        session = LazySession()
+        session["user"] = "fatih"
+        session_id = session.session_id
+
+        self.assertTrue(Session.check_session_id_is_valid(session_id))
+
+        self.clock.advance(11)
+        session = LazySession(session_id)
+
+        self.assertIsNone(session.get("user"))
+        self.assertFalse(Session.check_session_id_is_valid(session_id))
+
+        session["user"] = "fatih"
+        self.assertTrue(session.created)
+        self.assertNotEqual(session.session_id, session_id)
+
+    def test_session_id_collision(self):
+        """
+        A new session gets another id if the generated id is in use
+        :return:
+        """
+        Session.STORE.create("taken", {"user": "fatih"})
+
+        with mock.patch.object(Session, 'generate_session_id', side_effect=["taken", "free"]):
+            session = Session()
+
+        self.assertEqual(session.session_id, "free")
+        self.assertEqual(Session.STORE.get("taken")['data'], {"user": "fatih"})
+
+    def test_session_id(self):
+        """
+        Session ids are random
+        :return:
+        """
+        session_ids = {Session.generate_session_id() for _ in range(100)}
+
+        self.assertEqual(len(session_ids), 100)
+        self.assertGreaterEqual(min(map(len, session_ids)), 43)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import Response, Session, LazySession
+from server_helpers import ServerTestMixin, text
+
+router = HttpRouter()
+
+
+@router.get("/session-test/hello")
+def hello():
+    return text("hello")
+
+
+@router.get("/session-test/read")
+def read(session: Session):
+    return text(str(session.get("visits", 0)))
+
+
+@router.get("/session-test/visit")
+async def visit(session: Session):
+    session["visits"] = session.get("visits", 0) + 1
+    return text(str(session["visits"]))
+
+
+class TestLazySession(unittest.TestCase):
+    """
+    Test class for sessions that are created when they are written to
+    """
+
+    def test_read(self):
+        """
+        Reading a missing session does not create it
+        :return:
+        """
+        sessions = len(Session.STORE)
+
+        for session_id in (None, "unknown"):
+            session = LazySession(session_id)
+
+            self.assertIsNone(session.get("user"))
+            self.assertNotIn("user", session)
+            self.assertFalse(session.exists)
+            with self.assertRaises(KeyError):
+                session["user"]
+
+        self.assertEqual(len(Session.STORE), sessions)
+
+    def test_write(self):
+        """
+        The first write creates the session, an existing session is not created again
+        :return:
+        """
+        session = LazySession()
+        session["user"] = "fatih"
+
+        self.assertTrue(session.created)
+        self.assertEqual(Session.get_session(session.session_id)["data"], {"user": "fatih"})
+
+        existing = LazySession(session.session_id)
+        existing["cart"] = [1]
+
+        self.assertFalse(existing.created)
+        self.assertEqual(existing.session_id, session.session_id)
+        self.assertEqual(session.data, {"user": "fatih", "cart": [1]})
+
+        del existing["cart"]
+        self.assertNotIn("cart", session)
+
+    def test_of_request(self):
+        """
+        The session of a request is created once, from the `session_id` cookie
+        :return:
+        """
+        result = {'headers': {'Cookie': {'session_id': 'abc'}}}
+
+        session = LazySession.of_request(result)
+
+        self.assertIs(LazySession.of_request(result), session)
+        self.assertEqual(session.session_id, 'abc')
+        self.assertIsNone(LazySession.of_request({'headers': None}).session_id)
+
+    def test_response(self):
+        """
+        Responses do not have a session unless it is given
+        :return:
+        """
+        self.assertNotIn(b"Set-Cookie", Response(status_code=200, body="ok").as_bytes())
+
+        session = Session()
+        self.assertIn(f"Set-Cookie: session_id={session.session_id}".encode(),
+                      Response(status_code=200, body="ok", session=session).as_bytes())
+
+
+class SessionTestMixin(ServerTestMixin):
+    """
+    Session cookies of the responses, run against both backends
+    """
+    router = router
+
+    def request(self, path, cookie=None):
+        self.connection.request("GET", path, headers={"Cookie": cookie} if cookie else {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_no_session(self):
+        """
+        Routes that do not write to the session (and errors) do not create one
+        :return:
+        """
+        sessions = len(Session.STORE)
+
+        for path in ("/session-test/hello", "/session-test/read", "/session-test/missing"):
+            response, _ = self.request(path)
+            self.assertIsNone(response.getheader("Set-Cookie"))
+
+        self.assertEqual(len(Session.STORE), sessions)
+
+    def test_session(self):
+        """
+        The first write sends the cookie, the next requests use the session
+        :return:
+        """
+        response, data = self.request("/session-test/visit")
+        cookie = response.getheader("Set-Cookie")
+
+        self.assertEqual(data, b"1")
+        self.assertTrue(cookie.startswith("session_id="))
+
+        session_id = cookie.split(";")[0]
+
+        response, data = self.request("/session-test/visit", session_id)
+        self.assertEqual(data, b"2")
+        self.assertIsNone(response.getheader("Set-Cookie"))
+
+        response, data = self.request("/session-test/read", session_id)
+        self.assertEqual(data, b"2")
+
+
+class TestSessionThreaded(SessionTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestSessionAsyncio(SessionTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
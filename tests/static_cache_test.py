@@ -0,0 +1,117 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from fatihserver.framework.static_cache import StaticFileCache
+
+
+class TestStaticFileCache(unittest.TestCase):
+    """
+    Test class for StaticFileCache
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_inline(self):
+        """
+        Small files are kept in memory, large files are not
+        :return:
+        """
+        cache = StaticFileCache(inline_size=10)
+
+        small = cache.get(self.write("small.css", b"small"))
+        large = cache.get(self.write("large.js", b"large" * 10))
+
+        self.assertEqual(small.data, b"small")
+        self.assertEqual(small.content_type, "text/css")
+        self.assertIsNone(large.data)
+        self.assertEqual(large.size, 50)
+
+    def test_lru(self):
+        """
+        Least recently used entries are evicted when the budget is exceeded
+        :return:
+        """
+        cache = StaticFileCache(max_size=2 * (StaticFileCache.ENTRY_OVERHEAD + 100), inline_size=100)
+        paths = [self.write(f"{i}.txt", b"x" * 100) for i in range(3)]
+
+        cache.get(paths[0])
+        cache.get(paths[1])
+        cache.get(paths[0])
+        cache.get(paths[2])
+
+        self.assertEqual(list(cache.entries), [paths[0], paths[2]])
+        self.assertLessEqual(cache.used, cache.max_size)
+
+    def test_invalidation(self):
+        """
+        Changed, replaced and deleted files are picked up
+        :return:
+        """
+        cache = StaticFileCache()
+        path = self.write("index.html", b"one")
+        self.assertEqual(cache.get(path).data, b"one")
+
+        # same size, different mtime
+        with open(path, 'wb') as f:
+            f.write(b"two")
+        os.utime(path, ns=(0, 10 ** 9))
+        self.assertEqual(cache.get(path).data, b"two")
+
+        # replaced (new inode)
+        os.replace(self.write("new.html", b"three"), path)
+        self.assertEqual(cache.get(path).data, b"three")
+
+        os.remove(path)
+        self.assertIsNone(cache.get(path))
+        self.assertEqual(cache.used, 0)
+
+    def test_not_a_file(self):
+        """
+        Directories are not served
+        :return:
+        """
+        self.assertIsNone(StaticFileCache().get(self.dir))
+
+    def test_gzip_concurrent(self):
+        """
+        First requests that compress a file concurrently count its gzip variant once
+        :return:
+        """
+        cache = StaticFileCache()
+        entry = cache.get(self.write("style.css", b"body { color: red; }" * 100))
+        used = cache.used
+
+        # both requests compress before either of them stores the result
+        barrier = threading.Barrier(2)
+        compress = gzip.compress
+
+        def compress_together(*args, **kwargs):
+            barrier.wait(timeout=5)
+            return compress(*args, **kwargs)
+
+        with mock.patch.object(gzip, 'compress', compress_together):
+            threads = [threading.Thread(target=cache.gzip, args=(entry,)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertIsNotNone(entry.gzip_data)
+        self.assertEqual(cache.used, used + len(entry.gzip_data))
+
+
+if __name__ == '__main__':
+    unittest.main()
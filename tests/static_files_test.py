@@ -0,0 +1,411 @@
+import gzip
+import http.client
+import os
+import shutil
+import tempfile
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.framework.static_files import StaticFiles
+from fatihserver.server.request_handler import FileResponse
+from server_helpers import ServerTestMixin
+
+router = HttpRouter()
+
+# static paths are relative to the working directory
+working_dir = None
+temp_dir = None
+
+LARGE = os.urandom(3 * 1024 * 1024 + 17)
+CSS = b"body { color: red; }\n"
+SCRIPT = b"".join(b"console.log(%d);\n" % i for i in range(20000))
+
+
+def setUpModule():
+    global working_dir, temp_dir
+
+    working_dir = os.getcwd()
+    temp_dir = tempfile.mkdtemp()
+    os.chdir(temp_dir)
+
+    os.mkdir("static-files-test")
+    with open("static-files-test/large.bin", "wb") as f:
+        f.write(LARGE)
+    with open("static-files-test/style.css", "wb") as f:
+        f.write(CSS)
+    with open("static-files-test/app.js", "wb") as f:
+        f.write(SCRIPT)
+    open("static-files-test/empty.txt", "wb").close()
+
+    static = StaticFiles()
+    static.add_static_dir(directory="static-files-test")
+    router.add_static_route(static)
+
+
+def tearDownModule():
+    os.chdir(working_dir)
+    shutil.rmtree(temp_dir)
+
+
+class StaticFilesTestMixin(ServerTestMixin):
+    """
+    Static file tests, run against both backends
+    """
+    router = router
+
+    def test_files(self):
+        """
+        Files are sent completely, one after another on the same connection
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path, data, content_type in (("/static-files-test/large.bin", LARGE, None),
+                                         ("/static-files-test/style.css", CSS, "text/css"),
+                                         ("/static-files-test/empty.txt", b"", "text/plain"),
+                                         ("/static-files-test/large.bin", LARGE, None)):
+            connection.request("GET", path)
+            response = connection.getresponse()
+
+            self.assertEqual(response.status, 200)
+            self.assertEqual(int(response.getheader("Content-Length")), len(data))
+            if content_type is not None:
+                self.assertEqual(response.getheader("Content-Type"), content_type)
+            self.assertEqual(response.read(), data)
+
+        connection.close()
+
+    def test_not_found(self):
+        """
+        Unknown files and files outside of the static directory return 404
+        :return:
+        """
+        with open("secret.txt", "wb") as f:
+            f.write(b"secret")
+
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path in ("/static-files-test/missing.css",
+                     "/static-files-test/../secret.txt",
+                     "/static-files-test/"):
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+
+            self.assertEqual(response.status, 404)
+
+        connection.close()
+
+    def test_conditional_get(self):
+        """
+        Revalidation with If-None-Match / If-Modified-Since returns 304 without a body
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path in ("/static-files-test/style.css", "/static-files-test/large.bin"):
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+
+            etag = response.getheader("ETag")
+            last_modified = response.getheader("Last-Modified")
+            self.assertTrue(etag.startswith('"'))
+
+            for headers in ({"If-None-Match": etag},
+                            {"If-None-Match": f'"other", W/{etag}'},
+                            {"If-Modified-Since": last_modified}):
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+
+                self.assertEqual(response.status, 304)
+                self.assertEqual(response.getheader("ETag"), etag)
+                self.assertEqual(response.read(), b"")
+
+            # If-None-Match takes precedence over If-Modified-Since
+            connection.request("GET", path, headers={"If-None-Match": '"other"',
+                                                     "If-Modified-Since": last_modified})
+            response = connection.getresponse()
+
+            self.assertEqual(response.status, 200)
+            self.assertGreater(len(response.read()), 0)
+
+        connection.request("GET", "/static-files-test/style.css",
+                           headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})
+        response = connection.getresponse()
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), CSS)
+        connection.close()
+
+    def test_gzip(self):
+        """
+        Compressible files are sent gzipped to clients that accept it
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path, data in (("/static-files-test/app.js", SCRIPT),
+                           ("/static-files-test/style.css", CSS * 100)):
+            if path.endswith(".css"):
+                with open("static-files-test/style.css", "wb") as f:
+                    f.write(data)
+                self.addCleanup(self.restore_css)
+
+            connection.request("GET", path, headers={"Accept-Encoding": "br, gzip"})
+            response = connection.getresponse()
+            body = response.read()
+
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+            self.assertEqual(int(response.getheader("Content-Length")), len(body))
+            self.assertLess(len(body), len(data))
+            self.assertEqual(gzip.decompress(body), data)
+
+            # the gzip variant has its own ETag
+            etag = response.getheader("ETag")
+            connection.request("GET", path, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 304)
+
+            for headers in ({}, {"Accept-Encoding": "gzip;q=0"}):
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+
+                self.assertIsNone(response.getheader("Content-Encoding"))
+                self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+                self.assertNotEqual(response.getheader("ETag"), etag)
+                self.assertEqual(response.read(), data)
+
+        # incompressible files are sent as they are
+        connection.request("GET", "/static-files-test/large.bin", headers={"Accept-Encoding": "gzip"})
+        response = connection.getresponse()
+
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(response.read(), LARGE)
+        connection.close()
+
+    def test_gzip_evicted(self):
+        """
+        The file itself is sent if its gzip file is removed (evicted) before it is opened
+        :return:
+        """
+        self.addCleanup(router.STATIC_CACHE.clear)
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        connection.request("GET", "/static-files-test/app.js", headers={"Accept-Encoding": "gzip"})
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+
+        # the entry still describes the gzip file (gzip() returned before the eviction)
+        entry = next(entry for entry in router.STATIC_CACHE.entries.values() if entry.path.endswith("app.js"))
+        os.remove(entry.gzip_path)
+
+        connection.request("GET", "/static-files-test/app.js", headers={"Accept-Encoding": "gzip"})
+        response = connection.getresponse()
+
+        self.assertEqual(response.status, 200)
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(response.getheader("ETag"), entry.etag)
+        self.assertEqual(response.read(), SCRIPT)
+        connection.close()
+
+    def test_ranges(self):
+        """
+        Range requests are answered with the requested parts of the file
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        size = len(LARGE)
+
+        for range_header, start, end in (("bytes=0-99", 0, 100),
+                                         ("bytes=1000000-", 1000000, size),
+                                         ("bytes=-500", size - 500, size),
+                                         ("bytes=100-199, 150-299", 100, 300),
+                                         ("bytes=10-20000000", 10, size)):
+            connection.request("GET", "/static-files-test/large.bin", headers={"Range": range_header})
+            response = connection.getresponse()
+
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.getheader("Content-Range"), f"bytes {start}-{end - 1}/{size}")
+            self.assertEqual(response.read(), LARGE[start:end])
+
+        # small (inlined) files are sent from the file too
+        connection.request("GET", "/static-files-test/style.css", headers={"Range": "bytes=5-9"})
+        response = connection.getresponse()
+
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.read(), CSS[5:10])
+        connection.close()
+
+    def test_multiple_ranges(self):
+        """
+        Several ranges are sent as multipart/byteranges
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/static-files-test/large.bin", headers={"Range": "bytes=0-9,-10,1000-1999"})
+        response = connection.getresponse()
+        body = response.read()
+
+        self.assertEqual(response.status, 206)
+        content_type = response.getheader("Content-Type")
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        self.assertEqual(int(response.getheader("Content-Length")), len(body))
+
+        boundary = content_type.split("boundary=")[1].encode()
+        parts = body.split(b"--" + boundary)
+
+        # preamble, 3 parts, epilogue
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(parts[4], b"--\r\n")
+
+        size = len(LARGE)
+        for part, (start, end) in zip(parts[1:4], ((0, 10), (1000, 2000), (size - 10, size))):
+            head, data = part.split(b"\r\n\r\n", 1)
+            self.assertIn(f"Content-Range: bytes {start}-{end - 1}/{size}".encode(), head)
+            self.assertEqual(data, LARGE[start:end] + b"\r\n")
+
+        connection.close()
+
+    def test_if_range(self):
+        """
+        Ranges are only sent if If-Range matches the current version, unsatisfiable ranges return 416
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/static-files-test/large.bin")
+        response = connection.getresponse()
+        response.read()
+
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+
+        for if_range, status in ((etag, 206),
+                                 (last_modified, 206),
+                                 ('"old"', 200),
+                                 (f"W/{etag}", 200),
+                                 ("Thu, 01 Jan 1970 00:00:00 GMT", 200)):
+            connection.request("GET", "/static-files-test/large.bin",
+                               headers={"Range": "bytes=0-9", "If-Range": if_range})
+            response = connection.getresponse()
+            body = response.read()
+
+            self.assertEqual(response.status, status)
+            self.assertEqual(body, LARGE[:10] if status == 206 else LARGE)
+
+        for range_header, status in (("bytes=%d-" % len(LARGE), 416),
+                                     ("bytes=-0", 416),
+                                     ("bytes=9-0", 200),
+                                     ("items=0-9", 200)):
+            connection.request("GET", "/static-files-test/large.bin", headers={"Range": range_header})
+            response = connection.getresponse()
+            response.read()
+
+            self.assertEqual(response.status, status)
+            if status == 416:
+                self.assertEqual(response.getheader("Content-Range"), f"bytes */{len(LARGE)}")
+
+        connection.close()
+
+    def test_methods(self):
+        """
+        Static files answer HEAD without the body, other methods get 405
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for path, size in (("/static-files-test/large.bin", len(LARGE)), ("/static-files-test/style.css", len(CSS))):
+            connection.request("HEAD", path)
+            response = connection.getresponse()
+
+            self.assertEqual(response.status, 200)
+            self.assertEqual(int(response.getheader("Content-Length")), size)
+            self.assertEqual(response.read(), b"")
+
+        connection.request("POST", "/static-files-test/style.css", body=b"x")
+        response = connection.getresponse()
+        response.read()
+
+        self.assertEqual(response.status, 405)
+        self.assertEqual(response.getheader("Allow"), "GET, HEAD, OPTIONS")
+
+        # the connection is still usable
+        connection.request("GET", "/static-files-test/style.css")
+        self.assertEqual(connection.getresponse().read(), CSS)
+        connection.close()
+
+    @staticmethod
+    def restore_css():
+        with open("static-files-test/style.css", "wb") as f:
+            f.write(CSS)
+
+    def test_changed_files(self):
+        """
+        New and changed files are served without a restart
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for i in range(2):
+            with open("static-files-test/new.txt", "wb") as f:
+                f.write(b"version %d" % i)
+            os.utime("static-files-test/new.txt", ns=(0, i * 10 ** 9))
+
+            connection.request("GET", "/static-files-test/new.txt")
+            self.assertEqual(connection.getresponse().read(), b"version %d" % i)
+
+        connection.close()
+
+
+class TestStaticFilesThreaded(StaticFilesTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestStaticFilesAsyncio(StaticFilesTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+class TestFileResponse(unittest.TestCase):
+    """
+    Test class for FileResponse
+    """
+
+    def test_mmap_slices(self):
+        """
+        The mmap fallback yields the requested part of the file
+        :return:
+        """
+        response = FileResponse(os.path.join(temp_dir, "static-files-test/large.bin"), offset=10, length=600000)
+
+        data = b"".join(bytes(part) for part in response.mmap_slices())
+        response.close()
+
+        self.assertEqual(data, LARGE[10:600010])
+
+    def test_ranges(self):
+        """
+        Multiple ranges are buffered by as_bytes() and rejected outside of the file
+        :return:
+        """
+        path = os.path.join(temp_dir, "static-files-test/large.bin")
+
+        response = FileResponse(path, status_code=206, content_type="video/mp4", ranges=[(0, 3), (100, 2)])
+        data = response.as_bytes()
+        response.close()
+
+        head, body = data.split(b"\r\n\r\n", 1)
+        self.assertIn(b"HTTP/1.1 206 Partial Content", head)
+        self.assertIn(b"Content-Length: %d" % len(body), head)
+        self.assertIn(b"Content-Type: video/mp4\r\nContent-Range: bytes 100-101/", body)
+        self.assertIn(LARGE[100:102], body)
+
+        with self.assertRaises(OSError):
+            FileResponse(path, offset=len(LARGE) - 1, length=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
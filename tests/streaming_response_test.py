@@ -0,0 +1,117 @@
+import asyncio
+import http.client
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import StreamingResponse
+from server_helpers import ServerTestMixin, read_until_closed
+
+router = HttpRouter()
+
+
+@router.get("/streaming-response-test/csv")
+def csv_export():
+    def rows():
+        yield "id,name\n"
+        for i in range(1000):
+            yield f"{i},user{i}\n"
+
+    return StreamingResponse(rows(), content_type="text/csv")
+
+
+@router.get("/streaming-response-test/async")
+async def async_progress():
+    async def events():
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield f"data: {i}\n\n".encode()
+
+    return StreamingResponse(events(), content_type="text/event-stream")
+
+
+@router.get("/streaming-response-test/broken")
+def broken():
+    def rows():
+        yield "first\n"
+        raise ValueError("generator failed")
+
+    return StreamingResponse(rows(), content_type="text/plain")
+
+
+EXPECTED_CSV = "id,name\n" + "".join(f"{i},user{i}\n" for i in range(1000))
+
+
+class StreamingResponseTestMixin(ServerTestMixin):
+    """
+    Streaming response tests, run against both backends
+    """
+    router = router
+
+    def test_generator(self):
+        """
+        Generators are sent chunked and the connection is kept alive
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        for _ in range(2):
+            connection.request("GET", "/streaming-response-test/csv")
+            response = connection.getresponse()
+
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader("Transfer-Encoding"), "chunked")
+            self.assertIsNone(response.getheader("Content-Length"))
+            self.assertEqual(response.read().decode(), EXPECTED_CSV)
+
+        connection.close()
+
+    def test_async_generator(self):
+        """
+        Async generators are sent chunked
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/streaming-response-test/async")
+        response = connection.getresponse()
+
+        self.assertEqual(response.read(), b"data: 0\n\ndata: 1\n\ndata: 2\n\n")
+        connection.close()
+
+    def test_http10(self):
+        """
+        HTTP/1.0 clients get the raw body, the connection is closed after it
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(b"GET /streaming-response-test/csv HTTP/1.0\r\n\r\n")
+
+        data = read_until_closed(sock)
+
+        self.assertNotIn(b"Transfer-Encoding", data)
+        self.assertTrue(data.endswith(EXPECTED_CSV.encode()))
+
+    def test_broken_generator(self):
+        """
+        A failing generator aborts the response (without the last chunk)
+        :return:
+        """
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request("GET", "/streaming-response-test/broken")
+        response = connection.getresponse()
+
+        with self.assertRaises(http.client.IncompleteRead):
+            response.read()
+
+        connection.close()
+
+
+class TestStreamingResponseThreaded(StreamingResponseTestMixin, unittest.TestCase):
+    backend = "threaded"
+
+
+class TestStreamingResponseAsyncio(StreamingResponseTestMixin, unittest.TestCase):
+    backend = "asyncio"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fatihserver.framework.validation import ValidationError, converter
+
+
+@dataclass
+class Item:
+    name: str
+    count: int = 1
+
+
+@dataclass
+class Order:
+    customer: str
+    items: list[Item]
+    express: bool = False
+    note: Optional[str] = None
+    tags: list[str] = field(default_factory=list)
+
+
+class TestConverters(unittest.TestCase):
+    """
+    Test class for the parameter converters
+    """
+
+    def assertInvalid(self, hint, value, *errors):
+        with self.assertRaises(ValidationError) as context:
+            converter(hint)(value)
+
+        self.assertEqual([error['loc'] for error in context.exception.errors], list(errors))
+
+    def test_scalars(self):
+        """
+        Query strings and JSON values are converted to the type hint
+        :return:
+        """
+        self.assertEqual(converter(int)("-42"), -42)
+        self.assertEqual(converter(int)(7), 7)
+        self.assertEqual(converter(float)("2.5"), 2.5)
+        self.assertEqual(converter(float)(3), 3.0)
+        self.assertEqual(converter(str)("text"), "text")
+        self.assertIs(converter(bool)("Yes"), True)
+        self.assertIs(converter(bool)("0"), False)
+        self.assertIsNone(converter(Optional[int])(None))
+
+        for hint, value in ((int, "4.2"), (int, True), (int, " 1"), (float, "nan"), (float, "abc"),
+                            (str, 5), (bool, "maybe")):
+            self.assertInvalid(hint, value, [])
+
+    def test_lists(self):
+        """
+        Lists are JSON arrays or comma separated strings, errors have the index
+        :return:
+        """
+        self.assertEqual(converter(list[int])("1,2,3"), [1, 2, 3])
+        self.assertEqual(converter(list[int])(""), [])
+        self.assertEqual(converter(list[float])([1, "2.5"]), [1.0, 2.5])
+        self.assertInvalid(list[int], "1,x,3,y", [1], [3])
+
+    def test_dataclass(self):
+        """
+        Dataclasses are built recursively with all errors collected
+        :return:
+        """
+        order = converter(Order)({"customer": "fatih", "items": [{"name": "book", "count": "2"}, {"name": "pen"}],
+                                  "express": True, "unknown": 1})
+
+        self.assertEqual(order, Order(customer="fatih", items=[Item("book", 2), Item("pen")], express=True))
+        self.assertInvalid(Order, {"items": [{"count": "x"}]}, ["customer"], ["items", 0, "name"],
+                           ["items", 0, "count"])
+        self.assertInvalid(Order, [], [])
+
+    def test_unsupported(self):
+        """
+        Unsupported hints have no converter, the converters are cached
+        :return:
+        """
+        self.assertIsNone(converter(dict))
+        self.assertIsNone(converter(int | str))
+        self.assertIs(converter(list[int]), converter(list[int]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import unittest
+
+from fatihserver.framework.router import HttpRouter
+from fatihserver.server.request_handler import Response, HttpResult
+from fatihserver.server.tcp import PooledTCPServer
+from server_helpers import ServerTestMixin
+
+router = HttpRouter()
+
+
+@router.get("/worker-pool-test")
+def index():
+    response = Response(status_code=200, body="pooled")
+    response.set_content_type("text/plain")
+    return response
+
+
+REQUEST = b"GET /worker-pool-test HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+class TestWorkerPool(ServerTestMixin, unittest.TestCase):
+    """
+    Test class for the "pool" backend
+    """
+    router = router
+    backend = "pool"
+    server_options = {'min_workers': 1, 'max_workers': 1, 'queue_size': 1, 'keep_alive_timeout': 2,
+                      'error_pages': {503: "<h1>Busy</h1>"}}
+
+    def tearDown(self):
+        super().tearDown()
+
+        HttpResult.compile()
+
+    def test_request(self):
+        """
+        Requests are served by the pool
+        :return:
+        """
+        sock = self.connect()
+        sock.sendall(REQUEST)
+
+        self.assertIn(b"pooled", sock.recv(65536))
+
+    def test_queue_full(self):
+        """
+        When every worker is busy and the queue is full, we get the 503 error page + Retry-After
+        :return:
+        """
+        # keep-alive connection holds the only worker
+        busy = self.connect()
+        busy.sendall(REQUEST)
+        self.assertIn(b"pooled", busy.recv(65536))
+
+        # waits in the queue
+        queued = self.connect()
+        queued.sendall(REQUEST)
+        time.sleep(0.2)
+
+        # queue is full
+        rejected = self.connect()
+        rejected.sendall(REQUEST)
+        data = rejected.recv(65536)
+
+        self.assertTrue(data.startswith(b"HTTP/1.1 503"))
+        self.assertIn(b"Retry-After: 1", data)
+        self.assertIn(b"Connection: close", data)
+        self.assertTrue(data.endswith(b"<h1>Busy</h1>"))
+
+        # the queued connection is served when the worker is free
+        busy.close()
+        self.assertIn(b"pooled", queued.recv(65536))
+
+    def test_invalid_pool_size(self):
+        """
+        min_workers cannot be bigger than max_workers
+        :return:
+        """
+        with self.assertRaises(Exception):
+            PooledTCPServer(("127.0.0.1", 0), None, min_workers=4, max_workers=2)
+
+
+if __name__ == '__main__':
+    unittest.main()